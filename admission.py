@@ -0,0 +1,201 @@
+import math
+import time
+import threading
+import logging
+from collections import deque
+from functools import wraps
+
+from flask import Response, session, jsonify
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Limites d'admission des générations, par worker (surchargées par init_admission)
+ADMISSION_CONFIG = {
+    'max_concurrent': 6,
+    'max_per_user': 2,
+    'max_queue': 4,
+    # Mode threads : chaque génération, en cours ou en file, occupe un thread
+    # du worker ; reserved_threads restent libres pour les pages et callbacks
+    'worker_threads': None,
+    'reserved_threads': 4,
+    'queue_timeout': 10.0,
+    'min_retry_after': 1,
+    'max_retry_after': 60
+}
+
+class AdmissionRejected(Exception):
+    """Requête refusée : file pleine ou attente trop longue"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Limite de flux simultanés (globale et par utilisateur) avec file bornée
+
+    Les requêtes au-delà des limites attendent dans une file de taille fixe,
+    au plus queue_timeout secondes ; une file pleine est refusée aussitôt.
+    """
+
+    def __init__(self, max_concurrent, max_per_user, max_queue, queue_timeout):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.active_by_user = {}
+        self.waiting = 0
+        self.counters = {'admitted': 0, 'rejected_queue_full': 0, 'rejected_timeout': 0}
+        self.wait_times = deque(maxlen=500)
+        self.hold_time = None
+        self._condition = threading.Condition()
+
+    def can_enter(self, user_id):
+        return (self.active < self.max_concurrent
+                and self.active_by_user.get(user_id, 0) < self.max_per_user)
+
+    def acquire(self, user_id):
+        """Attend une place ; retourne le temps d'attente en secondes"""
+        started = time.monotonic()
+        with self._condition:
+            if not self.can_enter(user_id):
+                if self.waiting >= self.max_queue:
+                    self.counters['rejected_queue_full'] += 1
+                    raise AdmissionRejected('queue_full', self.retry_after())
+                self.waiting += 1
+                try:
+                    deadline = started + self.queue_timeout
+                    while not self.can_enter(user_id):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.counters['rejected_timeout'] += 1
+                            raise AdmissionRejected('queue_timeout', self.retry_after())
+                        self._condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.active_by_user[user_id] = self.active_by_user.get(user_id, 0) + 1
+            self.counters['admitted'] += 1
+            waited = time.monotonic() - started
+            self.wait_times.append(waited)
+            return waited
+
+    def release(self, user_id, held):
+        with self._condition:
+            self.active -= 1
+            remaining = self.active_by_user.get(user_id, 1) - 1
+            if remaining:
+                self.active_by_user[user_id] = remaining
+            else:
+                self.active_by_user.pop(user_id, None)
+            # Moyenne glissante de la durée d'occupation d'une place
+            self.hold_time = held if self.hold_time is None else 0.8 * self.hold_time + 0.2 * held
+            self._condition.notify_all()
+
+    def retry_after(self):
+        """Délai conseillé : temps estimé pour écouler la file actuelle"""
+        hold = self.hold_time or ADMISSION_CONFIG['min_retry_after']
+        estimate = math.ceil(hold * (self.waiting + 1) / max(self.max_concurrent, 1))
+        return min(max(estimate, ADMISSION_CONFIG['min_retry_after']), ADMISSION_CONFIG['max_retry_after'])
+
+    def stats(self):
+        with self._condition:
+            waits = sorted(self.wait_times)
+            return {
+                'active': self.active,
+                'queue_depth': self.waiting,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'wait_p50_ms': round(waits[len(waits) // 2] * 1000) if waits else None,
+                'wait_p95_ms': round(waits[min(len(waits) - 1, int(0.95 * len(waits)))] * 1000) if waits else None,
+                'hold_avg_ms': round(self.hold_time * 1000) if self.hold_time is not None else None,
+                **self.counters
+            }
+
+_controller = {'instance': None}
+
+def get_controller():
+    if _controller['instance'] is None:
+        _controller['instance'] = AdmissionController(
+            ADMISSION_CONFIG['max_concurrent'], ADMISSION_CONFIG['max_per_user'],
+            ADMISSION_CONFIG['max_queue'], ADMISSION_CONFIG['queue_timeout']
+        )
+    return _controller['instance']
+
+def run_admitted(f, *args, **kwargs):
+    """Exécute f dans une place d'admission, libérée en fin de flux
+
+    Pour une réponse en flux (SSE), la place reste occupée jusqu'à la
+    fermeture de la réponse, c'est-à-dire la fin de la génération.
+    """
+    controller = get_controller()
+    user_id = str(session.get('user_id'))
+    try:
+        waited = controller.acquire(user_id)
+    except AdmissionRejected as e:
+        logger.info(f"Génération refusée pour {user_id}: {e.reason}")
+        response = jsonify({'error': 'too_many_requests', 'reason': e.reason, 'retry_after': e.retry_after})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+
+    admitted_at = time.monotonic()
+    released = []
+
+    def release():
+        if not released:
+            released.append(True)
+            controller.release(user_id, time.monotonic() - admitted_at)
+
+    try:
+        rv = f(*args, **kwargs)
+    except Exception:
+        release()
+        raise
+    if isinstance(rv, Response):
+        rv.headers['X-Queue-Wait-Ms'] = str(round(waited * 1000))
+        if rv.is_streamed:
+            rv.call_on_close(release)
+            return rv
+    release()
+    return rv
+
+def admission_required(f):
+    """Décorateur : admet la requête avant la vue (voir run_admitted)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        return run_admitted(f, *args, **kwargs)
+    return decorated_function
+
+def admission_stats():
+    return get_controller().stats()
+
+def init_admission(app):
+    """Configure les limites d'admission des générations"""
+    ADMISSION_CONFIG['max_concurrent'] = app.config.get('GENERATION_MAX_CONCURRENT', ADMISSION_CONFIG['max_concurrent'])
+    ADMISSION_CONFIG['max_per_user'] = app.config.get('GENERATION_MAX_PER_USER', ADMISSION_CONFIG['max_per_user'])
+    ADMISSION_CONFIG['max_queue'] = app.config.get('GENERATION_MAX_QUEUE', ADMISSION_CONFIG['max_queue'])
+    ADMISSION_CONFIG['queue_timeout'] = app.config.get('GENERATION_QUEUE_TIMEOUT', ADMISSION_CONFIG['queue_timeout'])
+    ADMISSION_CONFIG['worker_threads'] = app.config.get('GUNICORN_THREADS', ADMISSION_CONFIG['worker_threads'])
+    ADMISSION_CONFIG['reserved_threads'] = app.config.get('GENERATION_RESERVED_THREADS', ADMISSION_CONFIG['reserved_threads'])
+    fit_thread_budget()
+    _controller['instance'] = None
+
+def fit_thread_budget():
+    """Mode threads : générations en cours + file d'attente bornées par les
+    threads du worker moins la réserve (file réduite d'abord)"""
+    threads = ADMISSION_CONFIG['worker_threads']
+    if not threads:
+        return
+    budget = max(1, threads - ADMISSION_CONFIG['reserved_threads'])
+    concurrent, queue = ADMISSION_CONFIG['max_concurrent'], ADMISSION_CONFIG['max_queue']
+    if concurrent + queue <= budget:
+        return
+    ADMISSION_CONFIG['max_concurrent'] = min(concurrent, budget)
+    ADMISSION_CONFIG['max_queue'] = budget - ADMISSION_CONFIG['max_concurrent']
+    logger.warning(
+        f"Admission réduite à {ADMISSION_CONFIG['max_concurrent']} générations + "
+        f"{ADMISSION_CONFIG['max_queue']} en file ({threads} threads, {ADMISSION_CONFIG['reserved_threads']} réservés)"
+    )
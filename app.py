@@ -1,5 +1,26 @@
 from flask import Flask
+from metrics import init_metrics
 from routes import init_routes
+from http_client import init_http_client
+from circuit_breaker import init_circuit_breakers
+from rate_limits import init_rate_limits
+from user_cache import init_user_cache
+from baserow_writer import init_write_behind
+from repo_cache import init_repo_cache
+from prefetch import init_prefetch
+from chat_providers import init_chat_providers
+from model_router import init_model_router
+from chat_store import init_chat_store
+from blob_store import init_blob_store
+from response_cache import init_response_cache
+from uploads import init_uploads
+from admission import init_admission
+from static_pages import init_static_pages
+from fragment_cache import init_fragment_cache
+from fast_start import init_fast_start
+from token_vault import init_token_vault
+from repo_snapshots import init_repo_snapshots
+from chat import init_chat_routes
 import os
 import logging
 
@@ -33,6 +54,155 @@ app.config['BASEROW_TABLE_ID'] = os.environ.get('BASEROW_TABLE_ID')
 app.config['OAUTH_REDIRECT_BASE'] = os.environ.get('OAUTH_REDIRECT_BASE', 'http://localhost:5000')
 app.config['DASHBOARD_URL'] = os.environ.get('DASHBOARD_URL', 'http://localhost:5000/dashboard')
 
+# Mode de service (voir gunicorn.conf.py) : en mode gevent, un worker sert
+# des centaines de requêtes en attente ; pools et limites sont élargis
+app.config['WORKER_MODE'] = os.environ.get('WORKER_MODE', 'threads')
+cooperative = app.config['WORKER_MODE'] == 'gevent'
+
+# Métriques Prometheus (/metrics), agrégées entre workers via METRICS_DIR
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR', 'data/metrics')
+app.config['METRICS_FLUSH_INTERVAL'] = float(os.environ.get('METRICS_FLUSH_INTERVAL', 10))
+# Sans METRICS_TOKEN, /metrics répond 403
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+# Configuration du client HTTP sortant (pools keep-alive par hôte)
+app.config['HTTP_POOL_CONNECTIONS'] = int(os.environ.get('HTTP_POOL_CONNECTIONS', 4))
+app.config['HTTP_POOL_MAXSIZE'] = int(os.environ.get('HTTP_POOL_MAXSIZE', 200 if cooperative else 20))
+app.config['HTTP_CONNECT_TIMEOUT'] = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3.05))
+app.config['HTTP_READ_TIMEOUT'] = float(os.environ.get('HTTP_READ_TIMEOUT', 15))
+app.config['HTTP_MAX_RETRIES'] = int(os.environ.get('HTTP_MAX_RETRIES', 2))
+app.config['HTTP_BACKOFF_FACTOR'] = float(os.environ.get('HTTP_BACKOFF_FACTOR', 0.3))
+
+# Cache des lignes utilisateur Baserow (SQLite optionnel pour partager entre workers)
+app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 300))
+app.config['USER_CACHE_MAX_ENTRIES'] = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 5000))
+app.config['USER_ROW_ID_TTL'] = int(os.environ.get('USER_ROW_ID_TTL', 7 * 24 * 3600))
+app.config['USER_CACHE_SQLITE_PATH'] = os.environ.get('USER_CACHE_SQLITE_PATH')
+
+# Écriture différée des métadonnées de connexion (mise à jour groupée Baserow)
+app.config['BASEROW_WRITE_BEHIND'] = os.environ.get('BASEROW_WRITE_BEHIND', 'true').lower() == 'true'
+app.config['BASEROW_FLUSH_INTERVAL'] = float(os.environ.get('BASEROW_FLUSH_INTERVAL', 5))
+app.config['BASEROW_MAX_PENDING_ROWS'] = int(os.environ.get('BASEROW_MAX_PENDING_ROWS', 1000))
+
+# Récupération des dépôts (pagination complète, pages en parallèle)
+app.config['REPOS_MAX_COUNT'] = int(os.environ.get('REPOS_MAX_COUNT', 2000))
+app.config['REPOS_PAGE_WORKERS'] = int(os.environ.get('REPOS_PAGE_WORKERS', 4))
+app.config['REPOS_PAGE_SIZE'] = int(os.environ.get('REPOS_PAGE_SIZE', 30))
+
+# Cache des listes de dépôts (revalidation conditionnelle ETag / Last-Modified)
+app.config['REPO_CACHE_FRESH_SECONDS'] = int(os.environ.get('REPO_CACHE_FRESH_SECONDS', 60))
+app.config['REPO_CACHE_STALE_SECONDS'] = int(os.environ.get('REPO_CACHE_STALE_SECONDS', 600))
+app.config['REPO_CACHE_FULL_REFRESH_SECONDS'] = int(os.environ.get('REPO_CACHE_FULL_REFRESH_SECONDS', 3600))
+app.config['REPO_CACHE_MAX_ENTRIES'] = int(os.environ.get('REPO_CACHE_MAX_ENTRIES', 2000))
+app.config['REPO_CACHE_SQLITE_PATH'] = os.environ.get('REPO_CACHE_SQLITE_PATH')
+
+# Préchargement des dépôts après connexion OAuth
+app.config['PREFETCH_ENABLED'] = os.environ.get('PREFETCH_ENABLED', 'true').lower() == 'true'
+app.config['PREFETCH_WORKERS'] = int(os.environ.get('PREFETCH_WORKERS', 2))
+app.config['PREFETCH_MAX_PENDING'] = int(os.environ.get('PREFETCH_MAX_PENDING', 100))
+app.config['PREFETCH_WAIT_TIMEOUT'] = float(os.environ.get('PREFETCH_WAIT_TIMEOUT', 5))
+
+# Vue agrégée multi-plateformes : délai avant rendu partiel
+app.config['AGGREGATE_TIMEOUT'] = float(os.environ.get('AGGREGATE_TIMEOUT', 4))
+
+# Disjoncteurs par dépendance (Baserow, hôtes Git, modèles) et échéance
+# par requête entrante, respectée par tous les appels sortants
+app.config['BREAKER_WINDOW'] = float(os.environ.get('BREAKER_WINDOW', 30))
+app.config['BREAKER_MIN_REQUESTS'] = int(os.environ.get('BREAKER_MIN_REQUESTS', 10))
+app.config['BREAKER_FAILURE_RATE'] = float(os.environ.get('BREAKER_FAILURE_RATE', 0.5))
+app.config['BREAKER_OPEN_SECONDS'] = float(os.environ.get('BREAKER_OPEN_SECONDS', 15))
+app.config['REQUEST_DEADLINE'] = float(os.environ.get('REQUEST_DEADLINE', 25))
+
+# Budgets d'appels vers GitHub / GitLab / Bitbucket (en-têtes de quota) ;
+# le préchargement s'arrête quand il ne reste que la réserve interactive
+app.config['RATE_LIMIT_BURST'] = int(os.environ.get('RATE_LIMIT_BURST', 20))
+app.config['RATE_LIMIT_MAX_RATE'] = float(os.environ.get('RATE_LIMIT_MAX_RATE', 20))
+app.config['RATE_LIMIT_BACKGROUND_RESERVE'] = float(os.environ.get('RATE_LIMIT_BACKGROUND_RESERVE', 0.2))
+
+# Callback OAuth : échéance globale et appels parallèles
+app.config['OAUTH_CALLBACK_DEADLINE'] = float(os.environ.get('OAUTH_CALLBACK_DEADLINE', 10))
+app.config['OAUTH_CALLBACK_WORKERS'] = int(os.environ.get('OAUTH_CALLBACK_WORKERS', 8))
+
+# Chat Forge (génération en flux SSE)
+app.config['CHAT_PROVIDER'] = os.environ.get('CHAT_PROVIDER', 'gemini')
+app.config['CHAT_HEARTBEAT_INTERVAL'] = float(os.environ.get('CHAT_HEARTBEAT_INTERVAL', 15))
+app.config['GEMINI_API_KEY'] = os.environ.get('GEMINI_API_KEY')
+app.config['GEMINI_MODEL'] = os.environ.get('GEMINI_MODEL', 'gemini-2.5-pro')
+app.config['CHAT_CONTEXT_TURNS'] = int(os.environ.get('CHAT_CONTEXT_TURNS', 20))
+
+# Routage des modèles : chaîne de fournisseurs par modèle de l'interface (JSON),
+# ex. {"Gemini 2.5 Pro": ["gemini"], "default": ["gemini"]} (le fournisseur
+# "fake" ne sert qu'en développement et aux mesures)
+app.config['CHAT_MODEL_ROUTES'] = os.environ.get('CHAT_MODEL_ROUTES')
+app.config['CHAT_HEDGE_ENABLED'] = os.environ.get('CHAT_HEDGE_ENABLED', 'true').lower() == 'true'
+app.config['CHAT_HEDGE_DEFAULT_DELAY'] = float(os.environ.get('CHAT_HEDGE_DEFAULT_DELAY', 2.0))
+app.config['FAKE_PROVIDER_FIRST_TOKEN_DELAY'] = float(os.environ.get('FAKE_PROVIDER_FIRST_TOKEN_DELAY', 0.2))
+app.config['FAKE_PROVIDER_CHUNK_DELAY'] = float(os.environ.get('FAKE_PROVIDER_CHUNK_DELAY', 0.05))
+
+# Admission des générations (par worker) : au-delà, file bornée puis 429
+app.config['GENERATION_MAX_CONCURRENT'] = int(os.environ.get('GENERATION_MAX_CONCURRENT', 300 if cooperative else 6))
+app.config['GENERATION_MAX_PER_USER'] = int(os.environ.get('GENERATION_MAX_PER_USER', 2))
+app.config['GENERATION_MAX_QUEUE'] = int(os.environ.get('GENERATION_MAX_QUEUE', 500 if cooperative else 4))
+# Mode threads : en cours + file <= GUNICORN_THREADS - GENERATION_RESERVED_THREADS (ajusté au démarrage)
+app.config['GUNICORN_THREADS'] = None if cooperative else int(os.environ.get('GUNICORN_THREADS', 16))
+app.config['GENERATION_RESERVED_THREADS'] = int(os.environ.get('GENERATION_RESERVED_THREADS', 4))
+app.config['GENERATION_QUEUE_TIMEOUT'] = float(os.environ.get('GENERATION_QUEUE_TIMEOUT', 10))
+
+# Historique des conversations (shards SQLite en WAL, purge différée)
+app.config['CHAT_STORE_DIR'] = os.environ.get('CHAT_STORE_DIR', 'data/conversations')
+app.config['CHAT_STORE_SHARDS'] = int(os.environ.get('CHAT_STORE_SHARDS', 8))
+app.config['CHAT_COMPACTION_INTERVAL'] = int(os.environ.get('CHAT_COMPACTION_INTERVAL', 300))
+
+# Fichiers joints : lecture en flux, limites et stockage adressé par contenu
+app.config['BLOB_STORE_DIR'] = os.environ.get('BLOB_STORE_DIR', 'data/blobs')
+app.config['UPLOAD_SPOOL_THRESHOLD'] = int(os.environ.get('UPLOAD_SPOOL_THRESHOLD', 1024 * 1024))
+app.config['UPLOAD_MAX_FILE_SIZE'] = int(os.environ.get('UPLOAD_MAX_FILE_SIZE', 20 * 1024 * 1024))
+app.config['UPLOAD_MAX_REQUEST_SIZE'] = int(os.environ.get('UPLOAD_MAX_REQUEST_SIZE', 50 * 1024 * 1024))
+app.config['UPLOAD_MAX_FILES'] = int(os.environ.get('UPLOAD_MAX_FILES', 10))
+
+# Cache des réponses du modèle (LRU mémoire borné en octets + niveau disque)
+app.config['RESPONSE_CACHE_ENABLED'] = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+app.config['RESPONSE_CACHE_MAX_BYTES'] = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+app.config['RESPONSE_CACHE_DISK_TTL'] = int(os.environ.get('RESPONSE_CACHE_DISK_TTL', 7 * 24 * 3600))
+app.config['RESPONSE_CACHE_DISK_MAX_ROWS'] = int(os.environ.get('RESPONSE_CACHE_DISK_MAX_ROWS', 20000))
+app.config['RESPONSE_CACHE_SQLITE_PATH'] = os.environ.get('RESPONSE_CACHE_SQLITE_PATH', 'data/response_cache.db')
+
+# Pages publiques sans contexte : rendues une fois, compressées (gzip, brotli)
+# et servies avec ETag ; STATIC_PAGES_AUTO_RELOAD les re-rend si le template change
+app.config['STATIC_PAGES_ENABLED'] = os.environ.get('STATIC_PAGES_ENABLED', 'true').lower() == 'true'
+app.config['STATIC_PAGES_MAX_AGE'] = int(os.environ.get('STATIC_PAGES_MAX_AGE', 3600))
+app.config['STATIC_PAGES_AUTO_RELOAD'] = os.environ.get('STATIC_PAGES_AUTO_RELOAD', os.environ.get('FLASK_DEBUG', 'false')).lower() in ('1', 'true')
+
+# Cache des fragments de la grille des dépôts (cartes et grilles rendues)
+app.config['FRAGMENT_CACHE_ENABLED'] = os.environ.get('FRAGMENT_CACHE_ENABLED', 'true').lower() == 'true'
+app.config['FRAGMENT_CACHE_MAX_BYTES'] = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+
+# Coffre des tokens OAuth (chiffré, partagé entre workers) et renouvellement
+# proactif ; TOKEN_VAULT_KEY : clés Fernet séparées par des virgules.
+# Seule source des tokens : TOKEN_VAULT_PATH doit être sur un volume persistant
+# (sinon reconnexion OAuth de tous les utilisateurs à chaque redéploiement) ;
+# TOKEN_VAULT_BASEROW_COPY=true recopie les tokens en clair dans Baserow (retour arrière)
+app.config['TOKEN_VAULT_PATH'] = os.environ.get('TOKEN_VAULT_PATH', 'data/token_vault.db')
+app.config['TOKEN_VAULT_KEY'] = os.environ.get('TOKEN_VAULT_KEY')
+app.config['TOKEN_REFRESH_MARGIN'] = int(os.environ.get('TOKEN_REFRESH_MARGIN', 600))
+app.config['TOKEN_REFRESH_INTERVAL'] = int(os.environ.get('TOKEN_REFRESH_INTERVAL', 60))
+app.config['TOKEN_VAULT_BASEROW_COPY'] = os.environ.get('TOKEN_VAULT_BASEROW_COPY', 'false').lower() == 'true'
+
+# Instantanés des dépôts (contexte Forge) : archive par commit dans le stockage
+# adressé par contenu, mise à jour incrémentale quand la branche avance
+app.config['REPO_SNAPSHOTS_ENABLED'] = os.environ.get('REPO_SNAPSHOTS_ENABLED', 'true').lower() == 'true'
+app.config['REPO_SNAPSHOTS_SQLITE_PATH'] = os.environ.get('REPO_SNAPSHOTS_SQLITE_PATH', 'data/repo_snapshots.db')
+app.config['REPO_SNAPSHOTS_HEAD_TTL'] = int(os.environ.get('REPO_SNAPSHOTS_HEAD_TTL', 120))
+app.config['REPO_SNAPSHOTS_MAX_FILE_SIZE'] = int(os.environ.get('REPO_SNAPSHOTS_MAX_FILE_SIZE', 512 * 1024))
+app.config['REPO_SNAPSHOTS_MAX_ARCHIVE_BYTES'] = int(os.environ.get('REPO_SNAPSHOTS_MAX_ARCHIVE_BYTES', 200 * 1024 * 1024))
+app.config['REPO_CONTEXT_MAX_BYTES'] = int(os.environ.get('REPO_CONTEXT_MAX_BYTES', 200 * 1024))
+
+# Démarrage rapide : cache de bytecode Jinja sur disque et compilation des
+# templates au chargement (une seule fois dans le maître avec GUNICORN_PRELOAD)
+app.config['JINJA_BYTECODE_CACHE_DIR'] = os.environ.get('JINJA_BYTECODE_CACHE_DIR', 'data/jinja_cache')
+app.config['EAGER_TEMPLATES'] = os.environ.get('EAGER_TEMPLATES', 'true').lower() == 'true'
+
 # Vérification de la configuration
 required_vars = ['SECRET_KEY', 'GITHUB_CLIENT_ID', 'GITHUB_CLIENT_SECRET', 
                  'GITLAB_CLIENT_ID', 'GITLAB_CLIENT_SECRET',
@@ -43,8 +213,29 @@ missing_vars = [var for var in required_vars if not os.environ.get(var)]
 if missing_vars:
     logger.warning(f"Variables d'environnement manquantes: {missing_vars}")
 
-# Initialiser les routes
+# Initialiser le client HTTP, les caches et les routes
+init_metrics(app)
+init_http_client(app)
+init_circuit_breakers(app)
+init_rate_limits(app)
+init_user_cache(app)
+init_write_behind(app)
+init_repo_cache(app)
+init_prefetch(app)
+init_chat_providers(app)
+init_model_router(app)
+init_chat_store(app)
+init_blob_store(app)
+init_uploads(app)
+init_response_cache(app)
+init_static_pages(app)
+init_fragment_cache(app)
+init_token_vault(app)
+init_repo_snapshots(app)
 init_routes(app)
+init_admission(app)
+init_chat_routes(app)
+init_fast_start(app)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,170 @@
+import os
+import time
+import atexit
+import threading
+import logging
+from collections import OrderedDict
+
+from http_client import http_patch
+from circuit_breaker import UpstreamUnavailable
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Configuration de l'écriture différée (surchargée par init_write_behind)
+WRITE_BEHIND_CONFIG = {
+    'enabled': True,
+    'flush_interval': 5,
+    'max_pending_rows': 1000,
+    'batch_size': 200,
+    'base_url': None,
+    'token': None
+}
+
+# Champs de connexion qui peuvent être écrits en différé
+LOGIN_METADATA_FIELDS = ('Derniere_Connexion', 'Est_Actif')
+
+# Tokens OAuth, écrits avec les métadonnées seulement si TOKEN_VAULT_BASEROW_COPY
+TOKEN_FIELDS = ('Access_Token', 'Refresh_Token')
+
+# Mises à jour en attente, fusionnées par id de ligne
+_pending = OrderedDict()
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_flusher = {'thread': None, 'pid': None}
+
+def init_write_behind(app):
+    """Configure la file d'écriture différée vers Baserow"""
+    WRITE_BEHIND_CONFIG['enabled'] = app.config.get('BASEROW_WRITE_BEHIND', WRITE_BEHIND_CONFIG['enabled'])
+    WRITE_BEHIND_CONFIG['flush_interval'] = app.config.get('BASEROW_FLUSH_INTERVAL', WRITE_BEHIND_CONFIG['flush_interval'])
+    WRITE_BEHIND_CONFIG['max_pending_rows'] = app.config.get('BASEROW_MAX_PENDING_ROWS', WRITE_BEHIND_CONFIG['max_pending_rows'])
+    WRITE_BEHIND_CONFIG['base_url'] = app.config.get('BASEROW_API_URL')
+    WRITE_BEHIND_CONFIG['token'] = app.config.get('BASEROW_TOKEN')
+
+def get_headers():
+    return {
+        'Authorization': f"Token {WRITE_BEHIND_CONFIG['token']}",
+        'Content-Type': 'application/json'
+    }
+
+def ensure_flusher():
+    """Démarre le thread de vidage dans le processus courant (après fork)"""
+    if _flusher['pid'] == os.getpid() and _flusher['thread'] and _flusher['thread'].is_alive():
+        return
+    with _lock:
+        if _flusher['pid'] == os.getpid() and _flusher['thread'] and _flusher['thread'].is_alive():
+            return
+        thread = threading.Thread(target=flush_loop, name='baserow-write-behind', daemon=True)
+        _flusher['thread'] = thread
+        _flusher['pid'] = os.getpid()
+        thread.start()
+
+def enqueue_row_update(row_id, fields):
+    """Ajoute une mise à jour différée ; retourne False si la file est pleine"""
+    if not WRITE_BEHIND_CONFIG['enabled'] or not WRITE_BEHIND_CONFIG['base_url']:
+        return False
+    with _lock:
+        if row_id in _pending:
+            _pending[row_id].update(fields)
+        elif len(_pending) >= WRITE_BEHIND_CONFIG['max_pending_rows']:
+            _wakeup.set()
+            return False
+        else:
+            _pending[row_id] = dict(fields)
+    ensure_flusher()
+    return True
+
+def pending_count():
+    return len(_pending)
+
+def take_batch():
+    with _lock:
+        batch = []
+        while _pending and len(batch) < WRITE_BEHIND_CONFIG['batch_size']:
+            row_id, fields = _pending.popitem(last=False)
+            batch.append((row_id, fields))
+        return batch
+
+def requeue(batch):
+    """Remet des mises à jour en file sans écraser des valeurs plus récentes"""
+    with _lock:
+        for row_id, fields in batch:
+            if row_id in _pending:
+                merged = dict(fields)
+                merged.update(_pending[row_id])
+                _pending[row_id] = merged
+            elif len(_pending) < WRITE_BEHIND_CONFIG['max_pending_rows']:
+                _pending[row_id] = fields
+            else:
+                logger.error(f"File d'écriture Baserow pleine, mise à jour perdue pour la ligne {row_id}")
+
+def flush_batch(batch):
+    """Envoie un lot via l'endpoint de mise à jour groupée de Baserow"""
+    items = []
+    for row_id, fields in batch:
+        item = dict(fields)
+        item['id'] = row_id
+        items.append(item)
+
+    try:
+        response = http_patch(
+            f"{WRITE_BEHIND_CONFIG['base_url']}batch/",
+            headers=get_headers(),
+            json={'items': items}
+        )
+    except UpstreamUnavailable as e:
+        # Disjoncteur ouvert : on garde la file pour le cycle suivant
+        logger.warning(f"Écriture groupée Baserow reportée: {str(e)}")
+        requeue(batch)
+        return False
+    except Exception as e:
+        logger.error(f"Exception écriture groupée Baserow: {str(e)}")
+        requeue(batch)
+        return False
+
+    if response.status_code == 200:
+        return True
+    if response.status_code == 429 or response.status_code >= 500:
+        logger.error(f"Erreur écriture groupée Baserow: {response.status_code}, nouvel essai au prochain cycle")
+        requeue(batch)
+        return False
+
+    # Erreur du lot (ex. une ligne supprimée) : on repasse ligne par ligne
+    logger.error(f"Erreur écriture groupée Baserow: {response.status_code} - {response.text}")
+    for row_id, fields in batch:
+        try:
+            row_response = http_patch(
+                f"{WRITE_BEHIND_CONFIG['base_url']}{row_id}/",
+                headers=get_headers(),
+                json=fields
+            )
+            if row_response.status_code != 200:
+                logger.error(f"Erreur mise à jour différée ligne {row_id}: {row_response.status_code}")
+        except Exception as e:
+            logger.error(f"Exception mise à jour différée ligne {row_id}: {str(e)}")
+    return False
+
+def flush_pending():
+    """Vide toute la file (appelé périodiquement et à l'arrêt du worker)"""
+    while True:
+        batch = take_batch()
+        if not batch:
+            return
+        if not flush_batch(batch):
+            return
+
+def flush_loop():
+    while True:
+        _wakeup.wait(WRITE_BEHIND_CONFIG['flush_interval'])
+        _wakeup.clear()
+        started = time.time()
+        flush_pending()
+        elapsed = time.time() - started
+        if elapsed > WRITE_BEHIND_CONFIG['flush_interval']:
+            logger.warning(f"Vidage de la file Baserow lent: {elapsed:.2f}s")
+
+@atexit.register
+def flush_on_shutdown():
+    if _pending and _flusher['pid'] == os.getpid():
+        logger.info(f"Vidage de {len(_pending)} mises à jour Baserow avant arrêt")
+        flush_pending()
@@ -0,0 +1,112 @@
+"""Mesure du démarrage à froid des workers gunicorn
+
+Lance gunicorn (gunicorn.conf.py, un seul worker) dans plusieurs
+configurations et mesure :
+  - boot    : lancement du maître -> première réponse 200
+  - respawn : arrêt brutal du worker -> première réponse du nouveau worker
+  - first   : latence de la première requête d'une page lourde
+
+Usage : python bench_startup.py [--path /] [--runs 3]
+Linux uniquement (les workers sont retrouvés via /proc).
+"""
+import os
+import sys
+import time
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+import urllib.error
+
+CONFIGURATIONS = [
+    ('sans préchargement', {'GUNICORN_PRELOAD': 'false', 'EAGER_TEMPLATES': 'false'}, False),
+    ('préchargement, cache bytecode froid', {'GUNICORN_PRELOAD': 'true', 'EAGER_TEMPLATES': 'true'}, True),
+    ('préchargement, cache bytecode chaud', {'GUNICORN_PRELOAD': 'true', 'EAGER_TEMPLATES': 'true'}, False),
+]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for_response(url, timeout=60):
+    """Attend la première réponse 200 ; retourne (instant, durée de la requête)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                response.read()
+                if response.status == 200:
+                    return time.monotonic(), time.monotonic() - started
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.01)
+    raise RuntimeError(f"pas de réponse de {url}")
+
+def worker_pids(master_pid):
+    try:
+        with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+            return [int(pid) for pid in f.read().split()]
+    except OSError:
+        return []
+
+def run_once(env, path):
+    port = free_port()
+    env = dict(os.environ, **env, WEB_CONCURRENCY='1', GUNICORN_BIND=f"127.0.0.1:{port}")
+    url = f"http://127.0.0.1:{port}{path}"
+    started = time.monotonic()
+    master = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'app:app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        ready, first = wait_for_response(url)
+        boot = ready - started
+
+        pids = worker_pids(master.pid)
+        respawn = None
+        if pids:
+            killed = time.monotonic()
+            os.kill(pids[0], signal.SIGKILL)
+            while worker_pids(master.pid) == pids:
+                time.sleep(0.005)
+            ready, _ = wait_for_response(url)
+            respawn = ready - killed
+        return boot, respawn, first
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=30)
+
+def median(values):
+    values = sorted(v for v in values if v is not None)
+    return values[len(values) // 2] if values else None
+
+def fmt(seconds):
+    return f"{seconds * 1000:7.0f} ms" if seconds is not None else '      n/a'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', default='/', help="page demandée (défaut: /)")
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    cache_dir = tempfile.mkdtemp(prefix='jinja-cache-')
+    try:
+        print(f"{'configuration':40} {'boot':>10} {'respawn':>10} {'first':>10}")
+        for label, env, cold_cache in CONFIGURATIONS:
+            results = []
+            for _ in range(args.runs):
+                if cold_cache:
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+                results.append(run_once(dict(env, JINJA_BYTECODE_CACHE_DIR=cache_dir), args.path))
+            boot, respawn, first = (median(column) for column in zip(*results))
+            print(f"{label:40} {fmt(boot):>10} {fmt(respawn):>10} {fmt(first):>10}")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import hashlib
+import logging
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Configuration du stockage de contenus (surchargée par init_blob_store)
+BLOB_STORE_CONFIG = {
+    'directory': 'data/blobs'
+}
+
+class BlobStore:
+    """Stockage adressé par contenu : un fichier par empreinte SHA-256
+
+    Un contenu déjà présent n'est jamais réécrit ; l'écriture passe par un
+    fichier temporaire du même répertoire puis un renommage atomique, ce qui
+    rend les écritures concurrentes du même contenu sans danger.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, digest):
+        return os.path.join(self.directory, digest[:2], digest[2:4], digest)
+
+    def has(self, digest):
+        return os.path.exists(self.path_for(digest))
+
+    def size(self, digest):
+        return os.path.getsize(self.path_for(digest))
+
+    def put_file(self, digest, fileobj):
+        """Copie un fichier déjà haché ; retourne False si le contenu existait"""
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                shutil.copyfileobj(fileobj, tmp, 1024 * 1024)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return True
+
+    def put_bytes(self, data):
+        """Stocke un contenu en mémoire et retourne son empreinte"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def open(self, digest):
+        return open(self.path_for(digest), 'rb')
+
+    def read(self, digest, limit=None):
+        with self.open(digest) as blob:
+            return blob.read(limit if limit is not None else -1)
+
+_store = {'instance': None}
+
+def init_blob_store(app):
+    """Configure le stockage adressé par contenu"""
+    BLOB_STORE_CONFIG['directory'] = app.config.get('BLOB_STORE_DIR', BLOB_STORE_CONFIG['directory'])
+    _store['instance'] = None
+
+def get_blob_store():
+    if _store['instance'] is None:
+        _store['instance'] = BlobStore(BLOB_STORE_CONFIG['directory'])
+    return _store['instance']
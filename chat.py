@@ -0,0 +1,398 @@
+from flask import Response, request, session, jsonify
+import json
+import time
+import queue
+import threading
+import logging
+import uuid
+
+from routes import login_required, find_session_repository
+from admission import admission_required, run_admitted, admission_stats
+from chat_providers import ProviderError
+from metrics import observe
+from model_router import get_routed_provider, router_stats
+from chat_store import get_chat_store, ConversationNotFound
+from blob_store import get_blob_store
+from response_cache import response_key, get_cached_response, cache_response, replay_chunks, response_cache_stats
+from uploads import parse_multipart_stream, store_uploads, close_uploads, attachment_context, UploadError
+from repo_snapshots import get_snapshot, repository_context
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Configuration du chat (surchargée par init_chat_routes)
+CHAT_CONFIG = {
+    'heartbeat_interval': 15,
+    'queue_size': 256,
+    'max_prompt_length': 100000,
+    'context_turns': 20
+}
+
+def sse_event(payload):
+    """Sérialise un événement SSE au format attendu par l'interface Forge"""
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def estimate_tokens(text):
+    # Approximation usuelle : ~4 caractères par token
+    return max(1, len(text) // 4)
+
+def produce_chunks(provider, prompt, history, chunks, cancel_event):
+    """Thread producteur : pousse les fragments du fournisseur dans la file"""
+    def put(item):
+        # File bornée : on attend le consommateur sans ignorer une annulation
+        while not cancel_event.is_set():
+            try:
+                chunks.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        generator = provider.stream(prompt, history, cancel_event)
+        try:
+            for text in generator:
+                if not put(('CHUNK', text)):
+                    return
+        finally:
+            generator.close()
+        put(('END', None))
+    except ProviderError as e:
+        put(('ERROR', str(e)))
+    except Exception as e:
+        logger.error(f"Exception fournisseur {provider.name}: {str(e)}")
+        put(('ERROR', 'Erreur du fournisseur de modèle'))
+
+def stream_generation(provider, prompt, history=None, on_complete=None):
+    """Pipeline de génération : fournisseur -> file -> événements SSE
+
+    Chaque fragment est transmis dès sa réception, un battement est émis
+    quand le fournisseur reste silencieux, et la fermeture du générateur
+    (déconnexion du client) annule la génération en amont.
+    """
+    request_id = uuid.uuid4().hex[:12]
+    chunks = queue.Queue(maxsize=CHAT_CONFIG['queue_size'])
+    cancel_event = threading.Event()
+    producer = threading.Thread(
+        target=produce_chunks,
+        args=(provider, prompt, history, chunks, cancel_event),
+        name=f"chat-{request_id}",
+        daemon=True
+    )
+
+    started = time.monotonic()
+    first_token_at = None
+    response_parts = []
+    completed = False
+
+    producer.start()
+    try:
+        while True:
+            try:
+                kind, value = chunks.get(timeout=CHAT_CONFIG['heartbeat_interval'])
+            except queue.Empty:
+                yield sse_event({'type': 'HEARTBEAT'})
+                continue
+
+            if kind == 'CHUNK':
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                response_parts.append(value)
+                yield sse_event({'type': 'CHUNK', 'text': value})
+            elif kind == 'ERROR':
+                yield sse_event({'type': 'ERROR', 'text': value})
+                return
+            else:
+                completed = True
+                stats = generation_stats(started, first_token_at, ''.join(response_parts))
+                logger.info(
+                    f"Génération {request_id} ({provider.name}): ttft={stats['ttft_ms']}ms, "
+                    f"{stats['tokens']} tokens, {stats['tokens_per_second']} tokens/s"
+                )
+                model = getattr(provider, 'model', provider.name)
+                if first_token_at is not None:
+                    observe('chat_ttft_seconds', first_token_at - started, model=model)
+                observe('chat_generation_seconds', time.monotonic() - started, model=model)
+                if on_complete:
+                    on_complete(''.join(response_parts), stats)
+                yield sse_event({'type': 'END', 'stats': stats})
+                return
+    finally:
+        # Client parti ou fin normale : on arrête le producteur dans tous les cas
+        cancel_event.set()
+        if not completed:
+            logger.info(f"Génération {request_id} interrompue après {len(response_parts)} fragments")
+
+def replay_generation(text):
+    """Rejoue une réponse en cache sous forme d'événements CHUNK puis END"""
+    started = time.monotonic()
+    for chunk in replay_chunks(text):
+        yield sse_event({'type': 'CHUNK', 'text': chunk})
+    stats = generation_stats(started, started, text)
+    stats['cached'] = True
+    yield sse_event({'type': 'END', 'stats': stats})
+
+def provider_model(provider):
+    return f"{provider.name}:{getattr(provider, 'model', '')}"
+
+def cached_generation(provider, prompt, history, file_hashes=None, full_prompt=None, regenerate=False):
+    """Réponse rejouée depuis le cache si elle existe, générée et mise en cache sinon"""
+    key = response_key(provider_model(provider), prompt, history, file_hashes)
+    if not regenerate:
+        text = get_cached_response(key)
+        if text is not None:
+            logger.info(f"Réponse servie depuis le cache ({key[:12]})")
+            return replay_generation(text)
+
+    def on_complete(text, stats):
+        # Réponse d'un fournisseur de secours : jamais servie sous la clé du modèle demandé
+        if getattr(provider, 'served_by_fallback', False):
+            logger.info(f"Réponse de secours ({provider.served_by}) non mise en cache")
+            return
+        cache_response(key, text)
+
+    return stream_generation(provider, full_prompt or prompt, history, on_complete=on_complete)
+
+def generation_stats(started, first_token_at, text):
+    """Temps jusqu'au premier token et débit de la génération"""
+    finished = time.monotonic()
+    tokens = estimate_tokens(text) if text else 0
+    streaming_time = finished - (first_token_at or finished)
+    return {
+        'ttft_ms': round((first_token_at - started) * 1000) if first_token_at else None,
+        'duration_ms': round((finished - started) * 1000),
+        'tokens': tokens,
+        'tokens_per_second': round(tokens / streaming_time, 1) if streaming_time > 0 else None
+    }
+
+def conversation_context(conversation_id):
+    """Derniers tours de la conversation, transmis au fournisseur comme contexte"""
+    if not conversation_id:
+        return []
+    try:
+        turns, _ = get_chat_store().get_turns(session['user_id'], conversation_id, limit=CHAT_CONFIG['context_turns'])
+        return turns
+    except ConversationNotFound:
+        return []
+    except Exception as e:
+        logger.error(f"Erreur lecture du contexte {conversation_id}: {str(e)}")
+        return []
+
+def repository_prompt(app, repository, prompt):
+    """Prompt précédé du contexte du dépôt choisi, et l'empreinte qui le
+    distingue dans le cache des réponses ; (prompt, None) si l'instantané
+    n'est pas encore prêt (sa construction est alors lancée)"""
+    if not repository:
+        return prompt, None
+    repo, access_token = find_session_repository(app, repository)
+    if not repo or not access_token:
+        return prompt, None
+    snapshot = get_snapshot(repo, access_token)
+    if snapshot is None:
+        logger.info(f"Instantané {repository} en construction, génération sans contexte du dépôt")
+        return prompt, None
+    return repository_context(snapshot, prompt) + '\n\n' + prompt, f"repo:{snapshot.key}@{snapshot.sha}"
+
+def encode_list_cursor(cursor):
+    return f"{cursor[0]!r}|{cursor[1]}" if cursor else None
+
+def decode_list_cursor(raw):
+    if not raw:
+        return None
+    updated_at, conversation_id = raw.split('|', 1)
+    return float(updated_at), conversation_id
+
+def sse_response(events):
+    """Réponse SSE non bufferisée (ni par Flask, ni par un proxy nginx)"""
+    return Response(
+        events,
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+def init_chat_routes(app):
+    """Initialise les routes du chat Forge"""
+
+    CHAT_CONFIG['heartbeat_interval'] = app.config.get('CHAT_HEARTBEAT_INTERVAL', CHAT_CONFIG['heartbeat_interval'])
+    CHAT_CONFIG['context_turns'] = app.config.get('CHAT_CONTEXT_TURNS', CHAT_CONFIG['context_turns'])
+
+    @app.route('/api/gemini/chat/message', methods=['POST'])
+    @login_required
+    @admission_required
+    def chat_message():
+        """Génère une réponse en flux SSE (CHUNK / END / ERROR)"""
+        data = request.get_json(silent=True) or {}
+        prompt = (data.get('prompt') or '').strip()
+
+        if not prompt:
+            return jsonify({'error': 'empty_prompt'}), 400
+        if len(prompt) > CHAT_CONFIG['max_prompt_length']:
+            return jsonify({'error': 'prompt_too_long'}), 413
+
+        try:
+            provider = get_routed_provider(data.get('model'))
+        except ProviderError as e:
+            logger.error(f"Fournisseur de chat indisponible: {str(e)}")
+            return sse_response(iter([sse_event({'type': 'ERROR', 'text': str(e)})]))
+
+        history = conversation_context(data.get('conversation_id'))
+        full_prompt, snapshot_hash = repository_prompt(app, data.get('repository'), prompt)
+        return sse_response(cached_generation(
+            provider, prompt, history, [snapshot_hash] if snapshot_hash else None, full_prompt,
+            regenerate=bool(data.get('regenerate'))
+        ))
+    
+    @app.route('/api/gemini/chat/message_with_files', methods=['POST'])
+    @login_required
+    def chat_message_with_files():
+        """Génère une réponse en flux SSE à partir d'un prompt et de fichiers
+        
+        Le corps multipart est lu directement depuis le flux d'entrée (jamais
+        via request.files) : la mémoire utilisée reste constante quelle que
+        soit la taille des fichiers. La place d'admission n'est prise qu'une
+        fois l'envoi lu et vérifié (un envoi lent n'occupe pas de place).
+        """
+        try:
+            fields, uploads = parse_multipart_stream(
+                request.stream, request.headers.get('Content-Type'), request.content_length
+            )
+        except UploadError as e:
+            logger.info(f"Envoi de fichiers refusé: {e.code}")
+            return jsonify({'error': e.code}), e.status
+        
+        try:
+            prompt = (fields.get('prompt') or '').strip()
+            conversation_id = fields.get('conversation_id')
+            if not prompt:
+                return jsonify({'error': 'empty_prompt'}), 400
+            if len(prompt) > CHAT_CONFIG['max_prompt_length']:
+                return jsonify({'error': 'prompt_too_long'}), 413
+            if not conversation_id:
+                return jsonify({'error': 'missing_conversation_id'}), 400
+            
+            try:
+                attachments = store_uploads(get_blob_store(), get_chat_store(), session['user_id'], conversation_id, uploads)
+            except ConversationNotFound:
+                return jsonify({'error': 'not_found'}), 404
+        finally:
+            close_uploads(uploads)
+        
+        try:
+            provider = get_routed_provider(fields.get('model'))
+        except ProviderError as e:
+            logger.error(f"Fournisseur de chat indisponible: {str(e)}")
+            return sse_response(iter([sse_event({'type': 'ERROR', 'text': str(e)})]))
+        
+        def generate():
+            history = conversation_context(conversation_id)
+            full_prompt, snapshot_hash = repository_prompt(app, fields.get('repository'), prompt)
+            full_prompt = attachment_context(get_blob_store(), full_prompt, attachments)
+            file_hashes = [attachment['sha256'] for attachment in attachments]
+            if snapshot_hash:
+                file_hashes.append(snapshot_hash)
+            return sse_response(cached_generation(
+                provider, prompt, history, file_hashes, full_prompt,
+                regenerate=fields.get('regenerate') in ('1', 'true')
+            ))
+
+        return run_admitted(generate)
+    
+    @app.route('/api/gemini/chat/cache-stats')
+    @login_required
+    def chat_cache_stats():
+        """Compteurs du cache des réponses (hits mémoire / disque, misses)"""
+        return jsonify(response_cache_stats())
+    
+    @app.route('/api/gemini/chat/admission-stats')
+    @login_required
+    def chat_admission_stats():
+        """Flux en cours, profondeur de la file d'attente et temps d'attente"""
+        return jsonify(admission_stats())
+    
+    @app.route('/api/gemini/chat/router-stats')
+    @login_required
+    def chat_router_stats():
+        """Latences observées par fournisseur (p50 / p95 du premier token, erreurs)"""
+        return jsonify(router_stats())
+    
+    @app.route('/api/gemini/chat/save', methods=['POST'])
+    @login_required
+    def chat_save():
+        """Ajoute un tour (prompt + réponse) à la conversation"""
+        data = request.get_json(silent=True) or {}
+        conversation_id = data.get('conversation_id')
+        prompt = data.get('prompt')
+        ai_response = data.get('ai_response')
+        
+        if not conversation_id or not prompt or ai_response is None:
+            return jsonify({'error': 'missing_fields'}), 400
+        
+        try:
+            turn_id = get_chat_store().append_turn(session['user_id'], conversation_id, prompt, ai_response)
+        except ConversationNotFound:
+            return jsonify({'error': 'not_found'}), 404
+        except Exception as e:
+            logger.error(f"Erreur sauvegarde conversation {conversation_id}: {str(e)}")
+            return jsonify({'error': 'storage_error'}), 500
+        
+        return jsonify({'success': True, 'turn_id': turn_id})
+    
+    @app.route('/api/gemini/chat/history/<conversation_id>')
+    @login_required
+    def chat_history(conversation_id):
+        """Tours d'une conversation, paginés à rebours (paramètre before)"""
+        try:
+            # Borne basse : LIMIT -1 vaut « sans limite » pour SQLite
+            limit = max(1, min(int(request.args.get('limit', 100)), 500))
+            before = request.args.get('before', type=int)
+            turns, next_before = get_chat_store().get_turns(session['user_id'], conversation_id, limit, before)
+        except ValueError:
+            return jsonify({'error': 'invalid_limit'}), 400
+        except ConversationNotFound:
+            return jsonify({'error': 'not_found'}), 404
+        
+        history = [{
+            'id': turn['id'],
+            'created_at': turn['created_at'],
+            'messages': [
+                {'role': 'user', 'text': turn['prompt']},
+                {'role': 'model', 'text': turn['response']}
+            ]
+        } for turn in turns]
+        return jsonify({'history': history, 'next_before': next_before})
+    
+    @app.route('/api/gemini/chat/list')
+    @login_required
+    def chat_list():
+        """Conversations de l'utilisateur, plus récentes d'abord"""
+        try:
+            limit = max(1, min(int(request.args.get('limit', 30)), 100))
+        except ValueError:
+            return jsonify({'error': 'invalid_limit'}), 400
+        try:
+            cursor = decode_list_cursor(request.args.get('cursor'))
+        except ValueError:
+            return jsonify({'error': 'invalid_cursor'}), 400
+        
+        chats, next_cursor = get_chat_store().list_conversations(session['user_id'], limit, cursor)
+        return jsonify({'chats': chats, 'next_cursor': encode_list_cursor(next_cursor)})
+    
+    @app.route('/api/gemini/chat/delete/<conversation_id>', methods=['DELETE'])
+    @login_required
+    def chat_delete(conversation_id):
+        """Supprime une conversation (pierre tombale, purge différée)"""
+        try:
+            get_chat_store().delete_conversation(session['user_id'], conversation_id)
+        except ConversationNotFound:
+            return jsonify({'error': 'not_found'}), 404
+        return jsonify({'success': True})
+    
+    @app.route('/api/gemini/chat/delete_all', methods=['DELETE'])
+    @login_required
+    def chat_delete_all():
+        """Supprime toutes les conversations de l'utilisateur"""
+        deleted = get_chat_store().delete_all(session['user_id'])
+        return jsonify({'success': True, 'deleted': deleted})
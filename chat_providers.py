@@ -0,0 +1,125 @@
+import json
+import threading
+import logging
+
+from http_client import http_post
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Fournisseurs enregistrés, par nom
+PROVIDERS = {}
+
+class ProviderError(Exception):
+    """Erreur remontée par un fournisseur de modèle"""
+
+class ChatProvider:
+    """Interface d'un fournisseur de génération en flux
+
+    stream() est un générateur de fragments de texte ; il doit s'arrêter
+    dès que cancel_event est levé (client déconnecté ou arrêt demandé).
+    """
+
+    name = 'base'
+
+    def stream(self, prompt, history, cancel_event):
+        raise NotImplementedError
+
+class FakeChatProvider(ChatProvider):
+    """Fournisseur local pour les tests : latence et texte injectables"""
+
+    name = 'fake'
+
+    def __init__(self, text=None, first_token_delay=0.0, chunk_delay=0.0, chunk_size=12, fail_after=None):
+        self.text = text
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.fail_after = fail_after
+
+    def stream(self, prompt, history, cancel_event):
+        text = self.text or f"Réponse simulée à : {prompt}"
+        if cancel_event.wait(self.first_token_delay):
+            return
+        for count, start in enumerate(range(0, len(text), self.chunk_size)):
+            if self.fail_after is not None and count >= self.fail_after:
+                raise ProviderError('échec simulé')
+            if count and cancel_event.wait(self.chunk_delay):
+                return
+            yield text[start:start + self.chunk_size]
+
+class GeminiChatProvider(ChatProvider):
+    """Génération en flux via l'API Gemini (streamGenerateContent, SSE)"""
+
+    name = 'gemini'
+    api_url = 'https://generativelanguage.googleapis.com/v1beta/models'
+
+    def __init__(self, api_key, model='gemini-2.5-pro', read_timeout=60):
+        self.api_key = api_key
+        self.model = model
+        self.read_timeout = read_timeout
+
+    def build_contents(self, prompt, history):
+        contents = []
+        for turn in history or []:
+            contents.append({'role': 'user', 'parts': [{'text': turn['prompt']}]})
+            contents.append({'role': 'model', 'parts': [{'text': turn['response']}]})
+        contents.append({'role': 'user', 'parts': [{'text': prompt}]})
+        return contents
+
+    def stream(self, prompt, history, cancel_event):
+        if not self.api_key:
+            raise ProviderError('GEMINI_API_KEY non configurée')
+
+        response = http_post(
+            f"{self.api_url}/{self.model}:streamGenerateContent",
+            params={'alt': 'sse'},
+            # Clé en en-tête : l'URL (query comprise) apparaît dans les messages d'erreur journalisés
+            headers={'x-goog-api-key': self.api_key},
+            json={'contents': self.build_contents(prompt, history)},
+            stream=True,
+            timeout=(3.05, self.read_timeout)
+        )
+        # Une annulation ferme la connexion même pendant une lecture bloquante
+        watcher = threading.Thread(target=close_on_cancel, args=(response, cancel_event), daemon=True)
+        watcher.start()
+        try:
+            if response.status_code != 200:
+                raise ProviderError(f"Gemini {response.status_code}: {response.text[:200]}")
+            for line in response.iter_lines(decode_unicode=True):
+                if cancel_event.is_set():
+                    return
+                if not line or not line.startswith('data: '):
+                    continue
+                data = json.loads(line[6:])
+                for candidate in data.get('candidates', []):
+                    for part in candidate.get('content', {}).get('parts', []):
+                        if part.get('text'):
+                            yield part['text']
+        finally:
+            # Fermer la connexion interrompt la génération côté fournisseur
+            response.close()
+
+def close_on_cancel(response, cancel_event):
+    cancel_event.wait()
+    response.close()
+
+def register_provider(name, provider):
+    PROVIDERS[name] = provider
+
+def get_provider(name):
+    provider = PROVIDERS.get(name)
+    if provider is None:
+        raise ProviderError(f"Fournisseur inconnu: {name}")
+    return provider
+
+def init_chat_providers(app):
+    """Enregistre les fournisseurs configurés"""
+    register_provider('gemini', GeminiChatProvider(
+        app.config.get('GEMINI_API_KEY'),
+        app.config.get('GEMINI_MODEL', 'gemini-2.5-pro')
+    ))
+    register_provider('fake', FakeChatProvider(
+        first_token_delay=app.config.get('FAKE_PROVIDER_FIRST_TOKEN_DELAY', 0.2),
+        chunk_delay=app.config.get('FAKE_PROVIDER_CHUNK_DELAY', 0.05)
+    ))
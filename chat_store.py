@@ -0,0 +1,313 @@
+import os
+import time
+import zlib
+import sqlite3
+import threading
+import logging
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Configuration du stockage des conversations (surchargée par init_chat_store)
+CHAT_STORE_CONFIG = {
+    'directory': 'data/conversations',
+    'shards': 8,
+    'compaction_interval': 300,
+    'compaction_batch': 200
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_by_conversation ON turns (conversation_id, id);
+CREATE TABLE IF NOT EXISTS conversations (
+    conversation_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    turn_count INTEGER NOT NULL DEFAULT 0,
+    deleted_at REAL
+);
+CREATE INDEX IF NOT EXISTS live_conversations_by_user
+    ON conversations (user_id, updated_at DESC, conversation_id DESC)
+    WHERE deleted_at IS NULL;
+CREATE TABLE IF NOT EXISTS attachments (
+    conversation_id TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    filename TEXT,
+    content_type TEXT,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (conversation_id, sha256)
+);
+CREATE INDEX IF NOT EXISTS deleted_conversations
+    ON conversations (deleted_at)
+    WHERE deleted_at IS NOT NULL;
+"""
+
+class ConversationNotFound(Exception):
+    """Conversation absente, supprimée ou appartenant à un autre utilisateur"""
+
+class ConversationStore:
+    """Historique des conversations, réparti en shards SQLite (WAL)
+
+    Les tours sont uniquement ajoutés (jamais réécrits) ; chaque shard tient
+    un index des conversations vivantes par utilisateur et date de mise à
+    jour, ce qui rend /list proportionnel à la page demandée. Une
+    suppression pose une pierre tombale ; les tours correspondants sont
+    purgés en arrière-plan par compact().
+    """
+
+    def __init__(self, directory, shards=8):
+        self.directory = directory
+        self.shards = shards
+        self._local = threading.local()
+        os.makedirs(directory, exist_ok=True)
+        for shard in range(shards):
+            self.connection(shard).executescript(SCHEMA)
+
+    def shard_for(self, user_id):
+        return zlib.crc32(str(user_id).encode('utf-8')) % self.shards
+
+    def connection(self, shard):
+        # Connexions par thread et par processus (jamais partagées après fork)
+        connections = getattr(self._local, 'connections', None)
+        if connections is None or self._local.pid != os.getpid():
+            connections = {}
+            self._local.connections = connections
+            self._local.pid = os.getpid()
+        conn = connections.get(shard)
+        if conn is None:
+            conn = sqlite3.connect(
+                os.path.join(self.directory, f"shard_{shard:03d}.db"),
+                timeout=10,
+                isolation_level=None
+            )
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            connections[shard] = conn
+        return conn
+
+    def append_turn(self, user_id, conversation_id, prompt, response, title=None):
+        """Ajoute un tour à une conversation (créée au premier tour)"""
+        user_id = str(user_id)
+        now = time.time()
+        conn = self.connection(self.shard_for(user_id))
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                "SELECT user_id, deleted_at FROM conversations WHERE conversation_id = ?",
+                (conversation_id,)
+            ).fetchone()
+            if row and row[0] != user_id:
+                raise ConversationNotFound(conversation_id)
+            if row and row[1] is not None:
+                # Identifiant réutilisé après suppression : on repart de zéro
+                conn.execute("DELETE FROM turns WHERE conversation_id = ?", (conversation_id,))
+                conn.execute("DELETE FROM attachments WHERE conversation_id = ?", (conversation_id,))
+                conn.execute("DELETE FROM conversations WHERE conversation_id = ?", (conversation_id,))
+                row = None
+
+            cursor = conn.execute(
+                "INSERT INTO turns (conversation_id, prompt, response, created_at) VALUES (?, ?, ?, ?)",
+                (conversation_id, prompt, response, now)
+            )
+            if row:
+                conn.execute(
+                    "UPDATE conversations SET updated_at = ?, turn_count = turn_count + 1 WHERE conversation_id = ?",
+                    (now, conversation_id)
+                )
+            else:
+                conn.execute(
+                    "INSERT INTO conversations (conversation_id, user_id, title, created_at, updated_at, turn_count) "
+                    "VALUES (?, ?, ?, ?, ?, 1)",
+                    (conversation_id, user_id, title or default_title(prompt), now, now)
+                )
+            conn.execute('COMMIT')
+            return cursor.lastrowid
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def list_conversations(self, user_id, limit=30, cursor=None):
+        """Conversations vivantes, plus récentes d'abord (pagination par clé)"""
+        user_id = str(user_id)
+        conn = self.connection(self.shard_for(user_id))
+        if cursor:
+            updated_at, conversation_id = cursor
+            rows = conn.execute(
+                "SELECT conversation_id, title, updated_at, turn_count FROM conversations "
+                "WHERE user_id = ? AND deleted_at IS NULL "
+                "AND (updated_at < ? OR (updated_at = ? AND conversation_id < ?)) "
+                "ORDER BY updated_at DESC, conversation_id DESC LIMIT ?",
+                (user_id, updated_at, updated_at, conversation_id, limit + 1)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT conversation_id, title, updated_at, turn_count FROM conversations "
+                "WHERE user_id = ? AND deleted_at IS NULL "
+                "ORDER BY updated_at DESC, conversation_id DESC LIMIT ?",
+                (user_id, limit + 1)
+            ).fetchall()
+
+        chats = [
+            {'id': row[0], 'title': row[1], 'updated_at': row[2], 'turns': row[3]}
+            for row in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = (last[2], last[0])
+        return chats, next_cursor
+
+    def get_turns(self, user_id, conversation_id, limit=100, before=None):
+        """Derniers tours d'une conversation (ordre chronologique), avant un id"""
+        user_id = str(user_id)
+        conn = self.connection(self.shard_for(user_id))
+        row = conn.execute(
+            "SELECT user_id FROM conversations WHERE conversation_id = ? AND deleted_at IS NULL",
+            (conversation_id,)
+        ).fetchone()
+        if not row or row[0] != user_id:
+            raise ConversationNotFound(conversation_id)
+
+        if before:
+            rows = conn.execute(
+                "SELECT id, prompt, response, created_at FROM turns "
+                "WHERE conversation_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (conversation_id, before, limit + 1)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT id, prompt, response, created_at FROM turns "
+                "WHERE conversation_id = ? ORDER BY id DESC LIMIT ?",
+                (conversation_id, limit + 1)
+            ).fetchall()
+
+        has_more = len(rows) > limit
+        turns = [
+            {'id': r[0], 'prompt': r[1], 'response': r[2], 'created_at': r[3]}
+            for r in reversed(rows[:limit])
+        ]
+        next_before = turns[0]['id'] if has_more and turns else None
+        return turns, next_before
+
+    def delete_conversation(self, user_id, conversation_id):
+        """Pose une pierre tombale sur une conversation"""
+        user_id = str(user_id)
+        cursor = self.connection(self.shard_for(user_id)).execute(
+            "UPDATE conversations SET deleted_at = ? "
+            "WHERE conversation_id = ? AND user_id = ? AND deleted_at IS NULL",
+            (time.time(), conversation_id, user_id)
+        )
+        if cursor.rowcount == 0:
+            raise ConversationNotFound(conversation_id)
+
+    def delete_all(self, user_id):
+        """Pose une pierre tombale sur toutes les conversations d'un utilisateur"""
+        user_id = str(user_id)
+        cursor = self.connection(self.shard_for(user_id)).execute(
+            "UPDATE conversations SET deleted_at = ? WHERE user_id = ? AND deleted_at IS NULL",
+            (time.time(), user_id)
+        )
+        return cursor.rowcount
+
+    def add_attachment(self, user_id, conversation_id, sha256, filename, content_type, size):
+        """Rattache un contenu à une conversation ; False s'il y était déjà"""
+        user_id = str(user_id)
+        conn = self.connection(self.shard_for(user_id))
+        row = conn.execute(
+            "SELECT user_id FROM conversations WHERE conversation_id = ? AND deleted_at IS NULL",
+            (conversation_id,)
+        ).fetchone()
+        if row and row[0] != user_id:
+            raise ConversationNotFound(conversation_id)
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO attachments "
+            "(conversation_id, sha256, user_id, filename, content_type, size, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (conversation_id, sha256, user_id, filename, content_type, size, time.time())
+        )
+        return cursor.rowcount == 1
+
+    def compact(self, batch=200):
+        """Purge les tours des conversations supprimées, par petits lots"""
+        purged = 0
+        for shard in range(self.shards):
+            conn = self.connection(shard)
+            while True:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    # Lecture dans la transaction : un identifiant réutilisé
+                    # entre-temps par append_turn n'est plus une pierre tombale
+                    ids = [row[0] for row in conn.execute(
+                        "SELECT conversation_id FROM conversations WHERE deleted_at IS NOT NULL LIMIT ?",
+                        (batch,)
+                    ).fetchall()]
+                    if not ids:
+                        conn.execute('COMMIT')
+                        break
+                    placeholders = ','.join('?' * len(ids))
+                    conn.execute(f"DELETE FROM turns WHERE conversation_id IN ({placeholders})", ids)
+                    conn.execute(f"DELETE FROM attachments WHERE conversation_id IN ({placeholders})", ids)
+                    conn.execute(
+                        f"DELETE FROM conversations WHERE deleted_at IS NOT NULL AND conversation_id IN ({placeholders})",
+                        ids
+                    )
+                    conn.execute('COMMIT')
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    raise
+                purged += len(ids)
+        return purged
+
+def default_title(prompt):
+    title = (prompt or '').strip().replace('\n', ' ')
+    return (title[:40] + '...') if len(title) > 40 else (title or 'New chat')
+
+_store = {'instance': None}
+_compactor = {'thread': None, 'pid': None}
+_compactor_lock = threading.Lock()
+
+def init_chat_store(app):
+    """Configure le stockage des conversations"""
+    CHAT_STORE_CONFIG['directory'] = app.config.get('CHAT_STORE_DIR', CHAT_STORE_CONFIG['directory'])
+    CHAT_STORE_CONFIG['shards'] = app.config.get('CHAT_STORE_SHARDS', CHAT_STORE_CONFIG['shards'])
+    CHAT_STORE_CONFIG['compaction_interval'] = app.config.get('CHAT_COMPACTION_INTERVAL', CHAT_STORE_CONFIG['compaction_interval'])
+    _store['instance'] = None
+
+def get_chat_store():
+    """Instance du stockage, créée à la première utilisation dans le worker"""
+    if _store['instance'] is None:
+        _store['instance'] = ConversationStore(CHAT_STORE_CONFIG['directory'], CHAT_STORE_CONFIG['shards'])
+    ensure_compactor()
+    return _store['instance']
+
+def ensure_compactor():
+    """Démarre le thread de compaction dans le processus courant"""
+    if _compactor['pid'] == os.getpid() and _compactor['thread'] and _compactor['thread'].is_alive():
+        return
+    with _compactor_lock:
+        if _compactor['pid'] == os.getpid() and _compactor['thread'] and _compactor['thread'].is_alive():
+            return
+        thread = threading.Thread(target=compaction_loop, name='chat-compaction', daemon=True)
+        _compactor['thread'] = thread
+        _compactor['pid'] = os.getpid()
+        thread.start()
+
+def compaction_loop():
+    while True:
+        time.sleep(CHAT_STORE_CONFIG['compaction_interval'])
+        try:
+            purged = _store['instance'].compact(CHAT_STORE_CONFIG['compaction_batch'])
+            if purged:
+                logger.info(f"Compaction des conversations: {purged} conversations purgées")
+        except Exception as e:
+            logger.error(f"Erreur compaction des conversations: {str(e)}")
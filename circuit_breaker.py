@@ -0,0 +1,103 @@
+import time
+import threading
+import logging
+from collections import deque
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Réglages des disjoncteurs (surchargés par init_circuit_breakers)
+BREAKER_CONFIG = {
+    'window': 30,
+    'min_requests': 10,
+    'failure_rate': 0.5,
+    'open_seconds': 15,
+    'half_open_probes': 1
+}
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class UpstreamUnavailable(Exception):
+    """Dépendance indisponible sans qu'aucun appel réseau n'ait été tenté"""
+
+class CircuitOpen(UpstreamUnavailable):
+    def __init__(self, name):
+        super().__init__(f"disjoncteur {name} ouvert")
+        self.name = name
+
+class CircuitBreaker:
+    """Disjoncteur d'une dépendance : fermé, ouvert, semi-ouvert
+
+    Fermé, il mesure le taux d'échec sur une fenêtre glissante et s'ouvre
+    au-delà du seuil ; ouvert, il refuse immédiatement ; après open_seconds
+    il laisse passer une sonde dont le résultat le referme ou le rouvre.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self.outcomes = deque()
+        self.opened_at = 0.0
+        self.probes = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < BREAKER_CONFIG['open_seconds']:
+                    raise CircuitOpen(self.name)
+                self.state = HALF_OPEN
+                self.probes = 0
+                logger.info(f"Disjoncteur {self.name} semi-ouvert")
+            if self.state == HALF_OPEN:
+                if self.probes >= BREAKER_CONFIG['half_open_probes']:
+                    raise CircuitOpen(self.name)
+                self.probes += 1
+
+    def record(self, success):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if success:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                    logger.info(f"Disjoncteur {self.name} refermé")
+                else:
+                    self.trip(now)
+                return
+
+            self.outcomes.append((now, success))
+            while self.outcomes and self.outcomes[0][0] < now - BREAKER_CONFIG['window']:
+                self.outcomes.popleft()
+            if self.state == CLOSED and len(self.outcomes) >= BREAKER_CONFIG['min_requests']:
+                failures = sum(1 for _, ok in self.outcomes if not ok)
+                if failures / len(self.outcomes) >= BREAKER_CONFIG['failure_rate']:
+                    self.trip(now)
+
+    def trip(self, now):
+        self.state = OPEN
+        self.opened_at = now
+        self.outcomes.clear()
+        logger.warning(f"Disjoncteur {self.name} ouvert pour {BREAKER_CONFIG['open_seconds']}s")
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(name):
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+def breaker_states():
+    return {name: breaker.state for name, breaker in list(_breakers.items())}
+
+def init_circuit_breakers(app):
+    """Configure les seuils des disjoncteurs"""
+    BREAKER_CONFIG['window'] = app.config.get('BREAKER_WINDOW', BREAKER_CONFIG['window'])
+    BREAKER_CONFIG['min_requests'] = app.config.get('BREAKER_MIN_REQUESTS', BREAKER_CONFIG['min_requests'])
+    BREAKER_CONFIG['failure_rate'] = app.config.get('BREAKER_FAILURE_RATE', BREAKER_CONFIG['failure_rate'])
+    BREAKER_CONFIG['open_seconds'] = app.config.get('BREAKER_OPEN_SECONDS', BREAKER_CONFIG['open_seconds'])
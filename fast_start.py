@@ -0,0 +1,46 @@
+import os
+import time
+import logging
+
+from jinja2 import FileSystemBytecodeCache
+
+from static_pages import warm_static_pages
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Démarrage rapide des workers (surchargé par init_fast_start)
+FAST_START_CONFIG = {
+    'bytecode_cache_dir': 'data/jinja_cache',
+    'eager_templates': True
+}
+
+def compile_templates(app):
+    """Compile tous les templates (depuis le cache de bytecode s'il est à jour)"""
+    count = 0
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+        count += 1
+    return count
+
+def init_fast_start(app):
+    """Cache de bytecode Jinja sur disque et compilation anticipée des templates
+
+    Appelé en dernier : avec GUNICORN_PRELOAD, le maître fait ce travail une
+    seule fois et les workers en héritent au fork (mémoire partagée en
+    copie sur écriture, voir gunicorn.conf.py).
+    """
+    FAST_START_CONFIG['bytecode_cache_dir'] = app.config.get('JINJA_BYTECODE_CACHE_DIR', FAST_START_CONFIG['bytecode_cache_dir'])
+    FAST_START_CONFIG['eager_templates'] = app.config.get('EAGER_TEMPLATES', FAST_START_CONFIG['eager_templates'])
+
+    directory = FAST_START_CONFIG['bytecode_cache_dir']
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+    if FAST_START_CONFIG['eager_templates']:
+        started = time.perf_counter()
+        count = compile_templates(app)
+        pages = warm_static_pages(app)
+        logger.info(f"Démarrage rapide: {count} templates compilés, {pages} pages statiques rendues "
+                    f"en {(time.perf_counter() - started) * 1000:.0f} ms")
@@ -0,0 +1,99 @@
+import json
+import hashlib
+import threading
+import logging
+
+from flask import render_template
+from markupsafe import Markup
+
+from metrics import inc
+from response_cache import BoundedLRU
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Configuration du cache de fragments (surchargée par init_fragment_cache)
+FRAGMENT_CACHE_CONFIG = {
+    'enabled': True,
+    'max_bytes': 16 * 1024 * 1024,
+    'max_entries': 20000
+}
+
+# Couleur des pastilles de langage (table précalculée, sinon gris)
+LANGUAGE_COLORS = {
+    'Python': '#3572A5',
+    'JavaScript': '#F7DF1E',
+    'TypeScript': '#3178C6',
+    'HTML': '#E34F26',
+    'CSS': '#563D7C',
+    'Java': '#B07219',
+    'PHP': '#4F5D95'
+}
+DEFAULT_LANGUAGE_COLOR = '#6B7280'
+
+CARD_TEMPLATE = '_repo_card.html'
+
+# Cartes (plateforme, id, updated_at) et grilles (empreinte de la liste), par worker
+_fragments = {'cache': None, 'template': None}
+_fragments_lock = threading.Lock()
+
+def language_color(language):
+    return LANGUAGE_COLORS.get(language, DEFAULT_LANGUAGE_COLOR)
+
+def card_key(repo):
+    return (repo.get('platform'), repo.get('id'), repo.get('updated_at'))
+
+def grid_digest(repositories):
+    """Empreinte d'une liste de dépôts : mêmes cartes, même ordre -> même grille"""
+    material = json.dumps([card_key(repo) for repo in repositories], default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+def card_template(app):
+    """Template d'une carte ; en rechargement auto, une modification vide le cache"""
+    template = _fragments['template']
+    if template is None or (app.jinja_env.auto_reload and not template.is_up_to_date):
+        with _fragments_lock:
+            template = _fragments['template']
+            if template is None or (app.jinja_env.auto_reload and not template.is_up_to_date):
+                template = app.jinja_env.get_template(CARD_TEMPLATE)
+                _fragments['template'] = template
+                _fragments['cache'] = BoundedLRU(FRAGMENT_CACHE_CONFIG['max_bytes'], FRAGMENT_CACHE_CONFIG['max_entries'])
+    return template
+
+def render_card(template, cache, repo):
+    key = ('card',) + card_key(repo)
+    html = cache.get(key)
+    if html is None:
+        inc('fragment_cache_total', fragment='card', result='miss')
+        html = template.render(repo=repo)
+        cache.set(key, html)
+    else:
+        inc('fragment_cache_total', fragment='card', result='hit')
+    return html
+
+def render_repo_cards(app, repositories):
+    """Cartes de la grille des dépôts : une liste inchangée ne passe pas par
+    Jinja, et seules les cartes nouvelles ou modifiées sont rendues"""
+    if not FRAGMENT_CACHE_CONFIG['enabled']:
+        return Markup(render_template('_repo_cards.html', repositories=repositories))
+
+    template = card_template(app)
+    cache = _fragments['cache']
+    key = ('grid', grid_digest(repositories))
+    html = cache.get(key)
+    if html is None:
+        inc('fragment_cache_total', fragment='grid', result='miss')
+        html = '\n'.join(render_card(template, cache, repo) for repo in repositories)
+        cache.set(key, html)
+    else:
+        inc('fragment_cache_total', fragment='grid', result='hit')
+    return Markup(html)
+
+def init_fragment_cache(app):
+    """Configure le cache de fragments et enregistre le filtre language_color"""
+    FRAGMENT_CACHE_CONFIG['enabled'] = app.config.get('FRAGMENT_CACHE_ENABLED', FRAGMENT_CACHE_CONFIG['enabled'])
+    FRAGMENT_CACHE_CONFIG['max_bytes'] = app.config.get('FRAGMENT_CACHE_MAX_BYTES', FRAGMENT_CACHE_CONFIG['max_bytes'])
+    app.add_template_filter(language_color)
+    with _fragments_lock:
+        _fragments['template'] = None
+        _fragments['cache'] = None
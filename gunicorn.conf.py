@@ -0,0 +1,57 @@
+import gc
+import os
+
+# Mode de service (WORKER_MODE) :
+#   - 'threads' (défaut) : workers gthread, un thread par requête en cours
+#   - 'gevent'           : workers coopératifs, chaque requête en attente
+#                          d'E/S (Baserow, hôtes Git, API des modèles) ne
+#                          coûte qu'un greenlet ; un worker en sert des centaines
+worker_mode = os.environ.get('WORKER_MODE', 'threads')
+
+if worker_mode == 'gevent':
+    # Patch au plus tôt (avant le chargement de l'application, même en
+    # preload) : requests, threading, queue et socket deviennent coopératifs
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+if worker_mode == 'gevent':
+    worker_class = 'gevent'
+    workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+else:
+    worker_class = 'gthread'
+    workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+    threads = int(os.environ.get('GUNICORN_THREADS', 16))
+
+# Préchargement (GUNICORN_PRELOAD, défaut) : le maître importe l'application,
+# compile les templates et rend les pages statiques une seule fois ; les
+# workers en héritent au fork et répondent dès leur démarrage. L'état par
+# processus (sessions HTTP, SQLite, threads de fond) est recréé après fork.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+if preload_app:
+    # Pas de collecte pendant le chargement : les objets du maître restent
+    # compacts et ne sont plus touchés après le gel (copie sur écriture)
+    gc.disable()
+
+def when_ready(server):
+    if preload_app:
+        # Objets chargés -> génération permanente : le ramasse-miettes des
+        # workers ne les parcourt plus, leurs pages restent partagées
+        gc.freeze()
+        gc.enable()
+
+def worker_exit(server, worker):
+    # Dernier instantané des métriques : /metrics le cumule ensuite avec
+    # ceux des autres workers terminés (retired.json)
+    try:
+        from metrics import flush_on_exit
+        flush_on_exit()
+    except Exception as e:
+        server.log.warning(f"Métriques du worker {worker.pid} non écrites: {e}")
@@ -0,0 +1,173 @@
+import os
+import time
+import threading
+import contextvars
+import logging
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import record_upstream, upstream_name, inc
+from circuit_breaker import get_breaker, UpstreamUnavailable
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Configuration du client HTTP sortant (surchargée par init_http_client)
+HTTP_CONFIG = {
+    'pool_connections': 4,
+    'pool_maxsize': 20,
+    'connect_timeout': 3.05,
+    'read_timeout': 15,
+    'max_retries': 2,
+    'backoff_factor': 0.3,
+    # Pas de 429 : rate_limits le traite (budget, Retry-After) au lieu d'un
+    # sommeil sans borne dans urllib3
+    'retry_statuses': (500, 502, 503, 504)
+}
+
+# Seules les méthodes idempotentes sont rejouées automatiquement
+# (un échange de code OAuth en POST ne doit jamais être rejoué)
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+# Échéance de la requête entrante en cours (temps monotone), ou None
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+class DeadlineExceeded(UpstreamUnavailable):
+    """Échéance de la requête entrante atteinte avant l'appel sortant"""
+
+# Sessions par (processus, hôte) : chaque worker gunicorn a ses propres pools
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def init_http_client(app):
+    """Charge la configuration du client HTTP depuis l'application"""
+    HTTP_CONFIG['pool_connections'] = app.config.get('HTTP_POOL_CONNECTIONS', HTTP_CONFIG['pool_connections'])
+    HTTP_CONFIG['pool_maxsize'] = app.config.get('HTTP_POOL_MAXSIZE', HTTP_CONFIG['pool_maxsize'])
+    HTTP_CONFIG['connect_timeout'] = app.config.get('HTTP_CONNECT_TIMEOUT', HTTP_CONFIG['connect_timeout'])
+    HTTP_CONFIG['read_timeout'] = app.config.get('HTTP_READ_TIMEOUT', HTTP_CONFIG['read_timeout'])
+    HTTP_CONFIG['max_retries'] = app.config.get('HTTP_MAX_RETRIES', HTTP_CONFIG['max_retries'])
+    HTTP_CONFIG['backoff_factor'] = app.config.get('HTTP_BACKOFF_FACTOR', HTTP_CONFIG['backoff_factor'])
+    close_sessions()
+
+def build_session():
+    """Construit une session avec pool keep-alive et retry avec backoff"""
+    retry = Retry(
+        total=HTTP_CONFIG['max_retries'],
+        connect=HTTP_CONFIG['max_retries'],
+        read=HTTP_CONFIG['max_retries'],
+        status=HTTP_CONFIG['max_retries'],
+        backoff_factor=HTTP_CONFIG['backoff_factor'],
+        status_forcelist=HTTP_CONFIG['retry_statuses'],
+        allowed_methods=IDEMPOTENT_METHODS,
+        raise_on_status=False,
+        # Backoff court uniquement : un Retry-After de plusieurs minutes
+        # dépasserait l'échéance de la requête entrante
+        respect_retry_after_header=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_CONFIG['pool_connections'],
+        pool_maxsize=HTTP_CONFIG['pool_maxsize'],
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def get_session(url):
+    """Retourne la session du worker courant pour l'hôte de l'URL"""
+    parts = urlsplit(url)
+    key = (os.getpid(), parts.scheme, parts.netloc)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = build_session()
+                _sessions[key] = session
+    return session
+
+def close_sessions():
+    """Ferme toutes les sessions ouvertes (rechargement de config, arrêt)"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            try:
+                session.close()
+            except Exception as e:
+                logger.error(f"Erreur fermeture session HTTP: {str(e)}")
+        _sessions.clear()
+
+def remaining_deadline():
+    """Secondes restantes avant l'échéance de la requête, ou None"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def set_deadline(seconds):
+    """Fixe l'échéance du contexte courant (jamais plus tard que l'actuelle)"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    return _deadline.set(deadline if current is None else min(current, deadline))
+
+def reset_deadline(token):
+    _deadline.reset(token)
+
+@contextmanager
+def deadline_scope(seconds):
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        reset_deadline(token)
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """Soumet fn à un pool en conservant le contexte de l'appelant
+    (échéance de la requête, voie de quota des hôtes Git)"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+def bounded_timeout(timeout):
+    """Réduit les timeouts (connexion, lecture) au temps restant avant l'échéance"""
+    remaining = remaining_deadline()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise DeadlineExceeded('échéance de la requête dépassée')
+    if isinstance(timeout, tuple):
+        return tuple(min(value, remaining) if value is not None else remaining for value in timeout)
+    return min(timeout, remaining) if timeout is not None else remaining
+
+def http_request(method, url, **kwargs):
+    """Exécute une requête sortante via le pool de l'hôte, avec timeouts par défaut"""
+    kwargs.setdefault('timeout', (HTTP_CONFIG['connect_timeout'], HTTP_CONFIG['read_timeout']))
+    kwargs['timeout'] = bounded_timeout(kwargs['timeout'])
+    
+    upstream = upstream_name(url)
+    breaker = get_breaker(upstream)
+    try:
+        breaker.before_call()
+    except UpstreamUnavailable:
+        inc('circuit_rejections_total', upstream=upstream)
+        raise
+    
+    started = time.perf_counter()
+    try:
+        response = get_session(url).request(method, url, **kwargs)
+    except Exception:
+        breaker.record(False)
+        record_upstream(method, url, started)
+        raise
+    breaker.record(response.status_code < 500)
+    record_upstream(method, url, started, response)
+    return response
+
+def http_get(url, **kwargs):
+    return http_request('GET', url, **kwargs)
+
+def http_post(url, **kwargs):
+    return http_request('POST', url, **kwargs)
+
+def http_patch(url, **kwargs):
+    return http_request('PATCH', url, **kwargs)
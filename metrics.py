@@ -0,0 +1,351 @@
+import os
+import hmac
+import json
+import time
+import glob
+import fcntl
+import tempfile
+import threading
+import logging
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from flask import Response, request, g
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Configuration des métriques (surchargée par init_metrics)
+METRICS_CONFIG = {
+    'enabled': True,
+    'directory': 'data/metrics',
+    'flush_interval': 10,
+    'token': None
+}
+
+# Bornes des histogrammes de latence, en secondes
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    'upstream_request_duration_seconds': 'Durée des appels sortants par service amont',
+    'upstream_responses_total': 'Réponses des services amont par code de statut',
+    'upstream_response_bytes_total': 'Octets reçus des services amont',
+    'http_request_duration_seconds': 'Durée des requêtes entrantes par route (jusqu\'aux en-têtes)',
+    'http_responses_total': 'Réponses par route et code de statut',
+    'http_response_bytes_total': 'Octets envoyés par route (réponses non streamées)',
+    'oauth_callback_step_seconds': 'Durée des étapes du callback OAuth',
+    'chat_ttft_seconds': 'Temps jusqu\'au premier token des générations, par modèle demandé',
+    'chat_provider_ttft_seconds': 'Temps jusqu\'au premier token par fournisseur (tentative gagnante)',
+    'chat_generation_seconds': 'Durée totale des générations',
+    'fragment_cache_total': 'Accès au cache de fragments (cartes et grilles de dépôts)',
+    'token_refresh_total': 'Renouvellements de tokens OAuth par le coffre',
+    'repo_snapshot_builds_total': 'Instantanés de dépôts construits (archive complète ou incrémental)',
+    'repo_snapshot_build_seconds': 'Durée de construction des instantanés de dépôts'
+}
+
+# Hôtes connus -> nom du service amont (cardinalité bornée)
+UPSTREAMS = {
+    'api.github.com': 'github',
+    'github.com': 'github',
+    'gitlab.com': 'gitlab',
+    'api.bitbucket.org': 'bitbucket',
+    'bitbucket.org': 'bitbucket',
+    'generativelanguage.googleapis.com': 'gemini'
+}
+
+class Registry:
+    """Compteurs et histogrammes du worker courant (un seul verrou, coût O(1))"""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+            for position, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram['buckets'][position] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, list(labels), list(h['buckets']), h['sum'], h['count']]
+                    for (name, labels), h in self.histograms.items()
+                ]
+            }
+
+_registry = {'pid': None, 'instance': None}
+_flusher = {'pid': None}
+_flusher_lock = threading.Lock()
+
+def registry():
+    """Registre du processus courant (recréé après fork)"""
+    if _registry['pid'] != os.getpid():
+        _registry['instance'] = Registry()
+        _registry['pid'] = os.getpid()
+    return _registry['instance']
+
+def label_tuple(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def inc(name, value=1, **labels):
+    if METRICS_CONFIG['enabled']:
+        registry().inc(name, label_tuple(labels), value)
+
+def observe(name, value, **labels):
+    if METRICS_CONFIG['enabled']:
+        registry().observe(name, label_tuple(labels), value)
+
+@contextmanager
+def timer(name, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+class StepTimer:
+    """Chronomètre d'étapes successives : chaque mark() mesure depuis la précédente"""
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self.last = time.perf_counter()
+
+    def mark(self, step):
+        now = time.perf_counter()
+        observe(self.name, now - self.last, step=step, **self.labels)
+        self.last = now
+
+def upstream_name(url):
+    host = urlsplit(url).hostname or 'unknown'
+    return UPSTREAMS.get(host, host)
+
+def record_upstream(method, url, started, response=None):
+    """Latence, statut et taille d'un appel sortant (appelé par http_client)"""
+    if not METRICS_CONFIG['enabled']:
+        return
+    upstream = upstream_name(url)
+    observe('upstream_request_duration_seconds', time.perf_counter() - started, upstream=upstream, method=method)
+    inc('upstream_responses_total', upstream=upstream, status=response.status_code if response is not None else 'error')
+    if response is not None:
+        # Réponses en flux : seule la longueur annoncée est connue à ce stade
+        size = response.headers.get('Content-Length')
+        if size is None and getattr(response, '_content_consumed', False):
+            size = len(response.content or b'')
+        if size is not None:
+            inc('upstream_response_bytes_total', int(size), upstream=upstream)
+
+def write_snapshot():
+    """Écrit l'instantané du worker (remplacement atomique du fichier)"""
+    directory = METRICS_CONFIG['directory']
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as tmp:
+        json.dump(registry().snapshot(), tmp)
+    os.replace(tmp_path, os.path.join(directory, f"worker-{os.getpid()}.json"))
+
+def flush_loop():
+    while True:
+        time.sleep(METRICS_CONFIG['flush_interval'])
+        try:
+            write_snapshot()
+        except Exception as e:
+            logger.error(f"Erreur écriture des métriques: {str(e)}")
+
+def ensure_flusher():
+    """Démarre l'écriture périodique de l'instantané dans le worker courant"""
+    if _flusher['pid'] == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher['pid'] == os.getpid():
+            return
+        _flusher['pid'] = os.getpid()
+        threading.Thread(target=flush_loop, name='metrics-flush', daemon=True).start()
+
+def read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def merge_snapshot(counters, histograms, snapshot):
+    for name, labels, value in snapshot['counters']:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, buckets, total, count in snapshot['histograms']:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        current = histograms.setdefault(key, {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+        current['buckets'] = [a + b for a, b in zip(current['buckets'], buckets)]
+        current['sum'] += total
+        current['count'] += count
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def retire_dead_workers():
+    """Cumule les instantanés des workers terminés dans retired.json puis
+    supprime leurs fichiers : les compteurs restent monotones et le nombre
+    de fichiers lus par /metrics reste borné par le nombre de workers"""
+    directory = METRICS_CONFIG['directory']
+    dead = []
+    for path in glob.glob(os.path.join(directory, 'worker-*.json')):
+        try:
+            pid = int(os.path.basename(path)[len('worker-'):-len('.json')])
+        except ValueError:
+            continue
+        if not pid_alive(pid):
+            dead.append(path)
+    if not dead:
+        return 0
+
+    # Verrou entre workers : un instantané n'est cumulé qu'une seule fois
+    with open(os.path.join(directory, 'retired.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        retired_path = os.path.join(directory, 'retired.json')
+        counters, histograms = {}, {}
+        retired = read_snapshot(retired_path)
+        if retired:
+            merge_snapshot(counters, histograms, retired)
+        folded = [path for path in dead if os.path.exists(path)]
+        for path in folded:
+            snapshot = read_snapshot(path)
+            if snapshot:
+                merge_snapshot(counters, histograms, snapshot)
+        if not folded:
+            return 0
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        with os.fdopen(fd, 'w') as tmp:
+            json.dump({
+                'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+                'histograms': [
+                    [name, list(labels), h['buckets'], h['sum'], h['count']]
+                    for (name, labels), h in histograms.items()
+                ]
+            }, tmp)
+        os.replace(tmp_path, retired_path)
+        for path in folded:
+            os.unlink(path)
+    return len(folded)
+
+def aggregate():
+    """Somme des instantanés des workers vivants et du cumul des workers
+    terminés (retired.json)"""
+    try:
+        retire_dead_workers()
+    except OSError as e:
+        logger.error(f"Erreur cumul des métriques des workers terminés: {str(e)}")
+    counters = {}
+    histograms = {}
+    paths = glob.glob(os.path.join(METRICS_CONFIG['directory'], 'worker-*.json'))
+    paths.append(os.path.join(METRICS_CONFIG['directory'], 'retired.json'))
+    for path in paths:
+        snapshot = read_snapshot(path)
+        if snapshot:
+            merge_snapshot(counters, histograms, snapshot)
+    return counters, histograms
+
+def flush_on_exit():
+    """Dernier instantané d'un worker qui s'arrête (hook worker_exit de gunicorn)"""
+    if METRICS_CONFIG['enabled'] and _registry['pid'] == os.getpid():
+        write_snapshot()
+
+def format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in pairs) + '}'
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def render_prometheus(counters, histograms):
+    """Format d'exposition texte de Prometheus"""
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, 'counter')
+        lines.append(f"{name}{format_labels(labels)} {value}")
+    for (name, labels), h in sorted(histograms.items()):
+        header(name, 'histogram')
+        cumulative = 0
+        for bound, count in zip(BUCKETS, h['buckets']):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_labels(labels, ('le', bound))} {cumulative}")
+        lines.append(f"{name}_bucket{format_labels(labels, ('le', '+Inf'))} {h['count']}")
+        lines.append(f"{name}_sum{format_labels(labels)} {h['sum']}")
+        lines.append(f"{name}_count{format_labels(labels)} {h['count']}")
+    return '\n'.join(lines) + '\n'
+
+def init_metrics(app):
+    """Instrumente les requêtes entrantes et expose /metrics"""
+    METRICS_CONFIG['enabled'] = app.config.get('METRICS_ENABLED', METRICS_CONFIG['enabled'])
+    METRICS_CONFIG['directory'] = app.config.get('METRICS_DIR', METRICS_CONFIG['directory'])
+    METRICS_CONFIG['flush_interval'] = app.config.get('METRICS_FLUSH_INTERVAL', METRICS_CONFIG['flush_interval'])
+    METRICS_CONFIG['token'] = app.config.get('METRICS_TOKEN')
+
+    baserow_host = urlsplit(app.config.get('BASEROW_API_URL') or '').hostname
+    if baserow_host:
+        UPSTREAMS[baserow_host] = 'baserow'
+
+    if not METRICS_CONFIG['enabled']:
+        return
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        ensure_flusher()
+
+    @app.after_request
+    def record_request(response):
+        started = getattr(g, 'metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            observe('http_request_duration_seconds', time.perf_counter() - started, route=route, method=request.method)
+            inc('http_responses_total', route=route, status=response.status_code)
+            if not response.is_streamed and response.content_length:
+                inc('http_response_bytes_total', response.content_length, route=route)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Métriques agrégées de tous les workers (format Prometheus)"""
+        # Fermé tant qu'aucun METRICS_TOKEN n'est configuré (routes et trafic amont exposés)
+        token = METRICS_CONFIG['token']
+        if not token or not hmac.compare_digest(
+            request.headers.get('Authorization', '').encode('utf-8'), f"Bearer {token}".encode('utf-8')
+        ):
+            return Response('forbidden\n', status=403, mimetype='text/plain')
+        write_snapshot()
+        counters, histograms = aggregate()
+        return Response(render_prometheus(counters, histograms), mimetype='text/plain; version=0.0.4')
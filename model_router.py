@@ -0,0 +1,226 @@
+import json
+import time
+import queue
+import threading
+import logging
+from collections import deque
+
+from chat_providers import ChatProvider, ProviderError, get_provider
+from metrics import observe
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Configuration du routage (surchargée par init_model_router)
+ROUTER_CONFIG = {
+    'hedge_enabled': True,
+    'default_hedge_delay': 2.0,
+    'min_hedge_delay': 0.3,
+    'max_hedge_delay': 10.0,
+    'min_samples': 20,
+    'window': 200,
+    'poll_interval': 0.1,
+    # Modèle affiché dans l'interface -> chaîne de fournisseurs (primaire, secours...)
+    'routes': {}
+}
+
+class LatencyTracker:
+    """Temps jusqu'au premier token récents, par fournisseur (fenêtre glissante)"""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def record_ttft(self, name, seconds):
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def record_error(self, name):
+        with self._lock:
+            self._errors[name] = self._errors.get(name, 0) + 1
+
+    def percentile(self, name, fraction):
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def sample_count(self, name):
+        with self._lock:
+            return len(self._samples.get(name, ()))
+
+    def hedge_delay(self, name):
+        """Délai avant la requête de secours : p95 du fournisseur, borné"""
+        if self.sample_count(name) < ROUTER_CONFIG['min_samples']:
+            return ROUTER_CONFIG['default_hedge_delay']
+        p95 = self.percentile(name, 0.95)
+        return min(max(p95, ROUTER_CONFIG['min_hedge_delay']), ROUTER_CONFIG['max_hedge_delay'])
+
+    def stats(self):
+        with self._lock:
+            names = set(self._samples) | set(self._errors)
+            errors = dict(self._errors)
+        return {
+            name: {
+                'samples': self.sample_count(name),
+                'p50_ms': ms(self.percentile(name, 0.5)),
+                'p95_ms': ms(self.percentile(name, 0.95)),
+                'errors': errors.get(name, 0)
+            }
+            for name in names
+        }
+
+def ms(seconds):
+    return round(seconds * 1000) if seconds is not None else None
+
+TRACKER = LatencyTracker(ROUTER_CONFIG['window'])
+
+def run_attempt(index, provider, prompt, history, events, cancel_event):
+    """Thread d'une tentative : pousse ses événements, étiquetés, dans la file commune"""
+    try:
+        generator = provider.stream(prompt, history, cancel_event)
+        try:
+            for text in generator:
+                if cancel_event.is_set():
+                    return
+                events.put((index, 'CHUNK', text))
+        finally:
+            generator.close()
+        events.put((index, 'END', None))
+    except Exception as e:
+        events.put((index, 'ERROR', str(e)))
+
+class RoutedProvider(ChatProvider):
+    """Fournisseur composite : requêtes couvertes (hedging) et chaîne de secours
+
+    La primaire est lancée seule ; si elle n'a produit aucun token après son
+    p95 observé, la suivante de la chaîne est lancée en parallèle et le
+    premier flux qui démarre l'emporte (l'autre est annulé). Une tentative
+    qui échoue avant son premier token passe la main au fournisseur suivant.
+    """
+
+    name = 'router'
+
+    def __init__(self, model, providers, tracker=None, hedge_enabled=None):
+        self.model = model
+        self.providers = providers
+        self.tracker = tracker or TRACKER
+        self.hedge_enabled = ROUTER_CONFIG['hedge_enabled'] if hedge_enabled is None else hedge_enabled
+        # Fournisseur dont le flux l'a emporté (une instance par requête)
+        self.served_by = None
+
+    @property
+    def served_by_fallback(self):
+        """Réponse produite par un autre fournisseur que la primaire de la route"""
+        return self.served_by is not None and self.served_by != self.providers[0].name
+
+    def stream(self, prompt, history, cancel_event):
+        events = queue.Queue()
+        attempts = []
+        pending = list(self.providers)
+        winner = None
+        failures = []
+
+        def launch():
+            provider = pending.pop(0)
+            attempt_cancel = threading.Event()
+            started = time.monotonic()
+            thread = threading.Thread(
+                target=run_attempt,
+                args=(len(attempts), provider, prompt, history, events, attempt_cancel),
+                name=f"route-{provider.name}",
+                daemon=True
+            )
+            # Délai de couverture au lancement : plancher des échantillons censurés
+            delay = self.tracker.hedge_delay(provider.name)
+            attempts.append({'provider': provider, 'cancel': attempt_cancel, 'started': started, 'done': False, 'delay': delay})
+            thread.start()
+            return delay
+
+        hedge_at = time.monotonic() + launch()
+        try:
+            while True:
+                if cancel_event.is_set():
+                    return
+                if winner is None and self.hedge_enabled and pending and hedge_at is not None and time.monotonic() >= hedge_at:
+                    logger.info(f"Route {self.model}: pas de premier token de {attempts[0]['provider'].name}, requête couverte")
+                    launch()
+                    hedge_at = None
+
+                try:
+                    index, kind, value = events.get(timeout=ROUTER_CONFIG['poll_interval'])
+                except queue.Empty:
+                    continue
+
+                attempt = attempts[index]
+                if winner is not None and index != winner:
+                    continue
+
+                if kind == 'CHUNK':
+                    if winner is None:
+                        winner = index
+                        self.served_by = attempt['provider'].name
+                        ttft = time.monotonic() - attempt['started']
+                        self.tracker.record_ttft(attempt['provider'].name, ttft)
+                        observe('chat_provider_ttft_seconds', ttft, provider=attempt['provider'].name, hedged='true' if len(attempts) > 1 else 'false')
+                        for other in attempts:
+                            if other is not attempt:
+                                other['cancel'].set()
+                                if not other['done']:
+                                    # Tentative annulée sans premier token : son TTFT vaut au
+                                    # moins le temps écoulé (échantillon censuré) ; sans lui, le
+                                    # p95 d'une primaire lente dériverait vers le bas
+                                    elapsed = time.monotonic() - other['started']
+                                    self.tracker.record_ttft(other['provider'].name, max(elapsed, other['delay']))
+                    yield value
+                elif kind == 'END':
+                    if winner is None:
+                        # Réponse vide : elle l'emporte quand même
+                        self.served_by = attempt['provider'].name
+                        self.tracker.record_ttft(attempt['provider'].name, time.monotonic() - attempt['started'])
+                    return
+                else:
+                    attempt['done'] = True
+                    self.tracker.record_error(attempt['provider'].name)
+                    if winner is not None:
+                        # Des tokens ont déjà été transmis : pas de reprise possible
+                        raise ProviderError(value)
+                    failures.append(f"{attempt['provider'].name}: {value}")
+                    logger.warning(f"Route {self.model}: échec de {attempt['provider'].name} ({value})")
+                    running = any(not other['done'] for other in attempts)
+                    if not running:
+                        if not pending:
+                            raise ProviderError('Tous les fournisseurs ont échoué: ' + '; '.join(failures))
+                        hedge_at = time.monotonic() + launch()
+        finally:
+            for attempt in attempts:
+                attempt['cancel'].set()
+
+def route_for(model):
+    """Chaîne de fournisseurs du modèle demandé (route 'default' sinon)"""
+    routes = ROUTER_CONFIG['routes']
+    names = routes.get(model) or routes.get('default') or []
+    if not names:
+        raise ProviderError(f"Aucune route pour le modèle: {model}")
+    return [get_provider(name) for name in names]
+
+def get_routed_provider(model):
+    # Modèle non routé : route par défaut (le nom sert aussi d'étiquette de métrique)
+    if model not in ROUTER_CONFIG['routes']:
+        model = 'default'
+    return RoutedProvider(model, route_for(model))
+
+def router_stats():
+    return TRACKER.stats()
+
+def init_model_router(app):
+    """Configure les routes modèle -> fournisseurs et le seuil de couverture"""
+    ROUTER_CONFIG['hedge_enabled'] = app.config.get('CHAT_HEDGE_ENABLED', ROUTER_CONFIG['hedge_enabled'])
+    ROUTER_CONFIG['default_hedge_delay'] = app.config.get('CHAT_HEDGE_DEFAULT_DELAY', ROUTER_CONFIG['default_hedge_delay'])
+    routes = app.config.get('CHAT_MODEL_ROUTES')
+    if isinstance(routes, str):
+        routes = json.loads(routes)
+    ROUTER_CONFIG['routes'] = routes or {'default': [app.config.get('CHAT_PROVIDER', 'gemini')]}
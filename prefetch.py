@@ -0,0 +1,116 @@
+import os
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from ttl_cache import TTLCache
+from rate_limits import background_lane
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Configuration du préchargement (surchargée par init_prefetch)
+PREFETCH_CONFIG = {
+    'enabled': True,
+    'workers': 2,
+    'max_pending': 100,
+    'wait_timeout': 5
+}
+
+# Compteurs exposés par prefetch_stats()
+_stats = {
+    'scheduled': 0,
+    'deduplicated': 0,
+    'rejected': 0,
+    'completed': 0,
+    'failed': 0,
+    'hits': 0,
+    'misses': 0
+}
+
+_inflight = {}
+# Clés préchargées pas encore consultées (bornées pour les utilisateurs qui ne reviennent pas)
+_warmed = TTLCache(max_entries=10000, ttl=3600)
+_lock = threading.Lock()
+_executor = {'pool': None, 'pid': None}
+
+def init_prefetch(app):
+    """Configure le pool de préchargement"""
+    PREFETCH_CONFIG['enabled'] = app.config.get('PREFETCH_ENABLED', PREFETCH_CONFIG['enabled'])
+    PREFETCH_CONFIG['workers'] = app.config.get('PREFETCH_WORKERS', PREFETCH_CONFIG['workers'])
+    PREFETCH_CONFIG['max_pending'] = app.config.get('PREFETCH_MAX_PENDING', PREFETCH_CONFIG['max_pending'])
+    PREFETCH_CONFIG['wait_timeout'] = app.config.get('PREFETCH_WAIT_TIMEOUT', PREFETCH_CONFIG['wait_timeout'])
+
+def get_executor():
+    if _executor['pid'] != os.getpid():
+        _executor['pool'] = ThreadPoolExecutor(
+            max_workers=PREFETCH_CONFIG['workers'],
+            thread_name_prefix='prefetch'
+        )
+        _executor['pid'] = os.getpid()
+        _inflight.clear()
+    return _executor['pool']
+
+def schedule_prefetch(key, task):
+    """Lance task() en arrière-plan, une seule fois par clé à la fois"""
+    if not PREFETCH_CONFIG['enabled']:
+        return False
+    executor = get_executor()
+    with _lock:
+        if key in _inflight:
+            _stats['deduplicated'] += 1
+            return False
+        if len(_inflight) >= PREFETCH_CONFIG['max_pending']:
+            _stats['rejected'] += 1
+            return False
+        _stats['scheduled'] += 1
+        _inflight[key] = executor.submit(run_prefetch, key, task)
+    return True
+
+def run_prefetch(key, task):
+    try:
+        # Voie d'arrière-plan : le préchargement cède le quota aux pages
+        with background_lane():
+            task()
+        with _lock:
+            _stats['completed'] += 1
+            _warmed.set(key, True)
+    except Exception as e:
+        with _lock:
+            _stats['failed'] += 1
+        logger.error(f"Erreur préchargement {key}: {str(e)}")
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+def wait_for_prefetch(key, timeout=None):
+    """Attend un préchargement en cours pour éviter un second appel amont"""
+    future = _inflight.get(key)
+    if future is None:
+        return
+    try:
+        future.result(timeout=PREFETCH_CONFIG['wait_timeout'] if timeout is None else timeout)
+    except FutureTimeoutError:
+        logger.warning(f"Préchargement {key} toujours en cours, chargement direct")
+    except Exception:
+        pass
+
+def record_access(key, cached):
+    """Comptabilise le premier accès à une clé préchargée (hit si déjà en cache)"""
+    with _lock:
+        if key in _inflight:
+            _stats['misses'] += 1
+            return
+        if not _warmed.get(key):
+            return
+        _warmed.delete(key)
+        if cached:
+            _stats['hits'] += 1
+        else:
+            _stats['misses'] += 1
+
+def prefetch_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['inflight'] = len(_inflight)
+    return stats
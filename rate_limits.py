@@ -0,0 +1,165 @@
+import time
+import hashlib
+import threading
+import contextvars
+import logging
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from http_client import http_get
+from ttl_cache import TTLCache
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Budgets d'appels vers les hôtes Git (surchargés par init_rate_limits)
+RATE_LIMIT_CONFIG = {
+    'burst': 20,
+    'max_rate': 20.0,
+    'min_rate': 0.2,
+    'background_reserve': 0.2,
+    'max_wait': {'interactive': 2.0, 'background': 30.0}
+}
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+# Voie de la tâche courante (propagée aux pools via http_client.submit_with_context)
+_lane = contextvars.ContextVar('rate_limit_lane', default=INTERACTIVE)
+
+# Budgets par (hôte, empreinte du token)
+_budgets = TTLCache(max_entries=5000, ttl=7200)
+_budgets_lock = threading.Lock()
+
+class RateLimited(Exception):
+    """Quota de l'hôte épuisé (ou réservé aux requêtes interactives)"""
+
+    def __init__(self, host, retry_at):
+        super().__init__(f"quota {host} indisponible jusqu'à {int(retry_at)}")
+        self.host = host
+        self.retry_at = retry_at
+
+class Budget:
+    """Seau à jetons d'un (hôte, token), calé sur les en-têtes de quota
+
+    Le débit de remplissage répartit le quota restant jusqu'à sa remise à
+    zéro ; la voie d'arrière-plan s'arrête quand il ne reste plus que la
+    réserve, laissée aux chargements de pages.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.tokens = RATE_LIMIT_CONFIG['burst']
+        self.last_refill = time.monotonic()
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.lock = threading.Lock()
+
+    def rate(self, now):
+        if self.remaining is None or self.reset_at is None or self.reset_at <= now:
+            return RATE_LIMIT_CONFIG['max_rate']
+        spread = self.remaining / (self.reset_at - now)
+        return min(max(spread, RATE_LIMIT_CONFIG['min_rate']), RATE_LIMIT_CONFIG['max_rate'])
+
+    def refill(self):
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        self.tokens = min(RATE_LIMIT_CONFIG['burst'], self.tokens + elapsed * self.rate(time.time()))
+
+    def blocked_until(self, lane):
+        """Instant jusqu'auquel la voie est bloquée, ou None"""
+        now = time.time()
+        if self.remaining is None or self.reset_at is None or self.reset_at <= now:
+            return None
+        if self.remaining <= 0:
+            return self.reset_at
+        if lane == BACKGROUND and self.limit and self.remaining <= self.limit * RATE_LIMIT_CONFIG['background_reserve']:
+            return self.reset_at
+        return None
+
+    def acquire(self, lane):
+        deadline = time.monotonic() + RATE_LIMIT_CONFIG['max_wait'][lane]
+        while True:
+            with self.lock:
+                blocked = self.blocked_until(lane)
+                if blocked:
+                    raise RateLimited(self.host, blocked)
+                self.refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    if self.remaining is not None:
+                        # Décompte anticipé, corrigé par les en-têtes de la réponse
+                        self.remaining -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate(time.time())
+            if time.monotonic() + wait > deadline:
+                raise RateLimited(self.host, time.time() + wait)
+            time.sleep(wait)
+
+    def update(self, response):
+        """Lit les en-têtes de quota (GitHub X-RateLimit-*, GitLab RateLimit-*)"""
+        headers = response.headers
+        remaining = headers.get('X-RateLimit-Remaining', headers.get('RateLimit-Remaining'))
+        limit = headers.get('X-RateLimit-Limit', headers.get('RateLimit-Limit'))
+        reset = headers.get('X-RateLimit-Reset', headers.get('RateLimit-Reset'))
+        retry_after = headers.get('Retry-After')
+        now = time.time()
+        with self.lock:
+            try:
+                if remaining is not None:
+                    self.remaining = int(remaining)
+                if limit is not None:
+                    self.limit = int(limit)
+                if reset is not None:
+                    reset = float(reset)
+                    # Horodatage absolu (GitHub, GitLab) ou délai en secondes (brouillon IETF)
+                    self.reset_at = reset if reset > 1e9 else now + reset
+            except ValueError:
+                pass
+            if response.status_code == 429 or (response.status_code == 403 and self.remaining == 0):
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else 60
+                self.remaining = 0
+                self.reset_at = max(self.reset_at or 0, now + delay)
+
+def token_fingerprint(access_token):
+    return hashlib.sha256((access_token or '').encode('utf-8')).hexdigest()[:16]
+
+def get_budget(host, access_token):
+    key = (host, token_fingerprint(access_token))
+    budget = _budgets.get(key)
+    if budget is None:
+        with _budgets_lock:
+            budget = _budgets.get(key)
+            if budget is None:
+                budget = Budget(host)
+                _budgets.set(key, budget)
+    return budget
+
+def current_lane():
+    return _lane.get()
+
+@contextmanager
+def background_lane():
+    """Exécute le bloc dans la voie d'arrière-plan (préchargement, revalidation)"""
+    token = _lane.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+def rate_limited_get(url, access_token, **kwargs):
+    """GET vers un hôte Git, rythmé par le budget du token sur cet hôte"""
+    budget = get_budget(urlsplit(url).netloc, access_token)
+    budget.acquire(current_lane())
+    response = http_get(url, **kwargs)
+    budget.update(response)
+    return response
+
+def init_rate_limits(app):
+    """Configure les budgets d'appels vers les hôtes Git"""
+    RATE_LIMIT_CONFIG['burst'] = app.config.get('RATE_LIMIT_BURST', RATE_LIMIT_CONFIG['burst'])
+    RATE_LIMIT_CONFIG['max_rate'] = app.config.get('RATE_LIMIT_MAX_RATE', RATE_LIMIT_CONFIG['max_rate'])
+    RATE_LIMIT_CONFIG['background_reserve'] = app.config.get('RATE_LIMIT_BACKGROUND_RESERVE', RATE_LIMIT_CONFIG['background_reserve'])
+    _budgets.clear()
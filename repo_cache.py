@@ -0,0 +1,162 @@
+import os
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from ttl_cache import TTLCache, SqliteCacheBackend
+from rate_limits import background_lane, RateLimited
+from repo_index import listing_digest
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Configuration du cache des listes de dépôts (surchargée par init_repo_cache)
+REPO_CACHE_CONFIG = {
+    'fresh_seconds': 60,
+    'stale_seconds': 600,
+    'full_refresh_seconds': 3600,
+    'max_entries': 2000,
+    'refresh_workers': 2,
+    'sqlite_path': None
+}
+
+_entries = TTLCache(REPO_CACHE_CONFIG['max_entries'], REPO_CACHE_CONFIG['full_refresh_seconds'])
+_shared_entries = None
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+_executor = {'pool': None, 'pid': None}
+
+def init_repo_cache(app):
+    """Configure le cache des dépôts (mémoire + SQLite partagé optionnel)"""
+    global _entries, _shared_entries
+    REPO_CACHE_CONFIG['fresh_seconds'] = app.config.get('REPO_CACHE_FRESH_SECONDS', REPO_CACHE_CONFIG['fresh_seconds'])
+    REPO_CACHE_CONFIG['stale_seconds'] = app.config.get('REPO_CACHE_STALE_SECONDS', REPO_CACHE_CONFIG['stale_seconds'])
+    REPO_CACHE_CONFIG['full_refresh_seconds'] = app.config.get('REPO_CACHE_FULL_REFRESH_SECONDS', REPO_CACHE_CONFIG['full_refresh_seconds'])
+    REPO_CACHE_CONFIG['max_entries'] = app.config.get('REPO_CACHE_MAX_ENTRIES', REPO_CACHE_CONFIG['max_entries'])
+    REPO_CACHE_CONFIG['sqlite_path'] = app.config.get('REPO_CACHE_SQLITE_PATH')
+
+    _entries = TTLCache(REPO_CACHE_CONFIG['max_entries'], entry_ttl())
+    _shared_entries = None
+    if REPO_CACHE_CONFIG['sqlite_path']:
+        try:
+            _shared_entries = SqliteCacheBackend(REPO_CACHE_CONFIG['sqlite_path'], table='repo_listings')
+            _shared_entries.purge_expired()
+        except Exception as e:
+            logger.error(f"Cache dépôts SQLite indisponible: {str(e)}")
+            _shared_entries = None
+
+def entry_ttl():
+    # Une entrée reste utile pour une revalidation conditionnelle tant qu'un
+    # rechargement complet n'est pas dû
+    return max(REPO_CACHE_CONFIG['full_refresh_seconds'],
+               REPO_CACHE_CONFIG['fresh_seconds'] + REPO_CACHE_CONFIG['stale_seconds'])
+
+def get_refresh_executor():
+    if _executor['pid'] != os.getpid():
+        _executor['pool'] = ThreadPoolExecutor(
+            max_workers=REPO_CACHE_CONFIG['refresh_workers'],
+            thread_name_prefix='repo-cache'
+        )
+        _executor['pid'] = os.getpid()
+    return _executor['pool']
+
+def get_entry(cache_key):
+    entry = _entries.get(cache_key)
+    if entry is None and _shared_entries is not None:
+        entry = _shared_entries.get(cache_key)
+        if entry is not None:
+            _entries.set(cache_key, entry)
+    return entry
+
+def has_entry(cache_key):
+    return get_entry(cache_key) is not None
+
+def store_entry(cache_key, entry):
+    _entries.set(cache_key, entry)
+    if _shared_entries is not None:
+        _shared_entries.set(cache_key, entry, entry_ttl())
+
+def invalidate(cache_key):
+    _entries.delete(cache_key)
+    if _shared_entries is not None:
+        _shared_entries.delete(cache_key)
+
+def revalidate(cache_key, fetch, entry):
+    """Recharge une liste, en requête conditionnelle si l'entrée le permet
+
+    fetch(validators) retourne (dépôts, validateurs) ; dépôts vaut None
+    quand l'amont répond 304. La revalidation ne porte que sur la première
+    page : un rechargement complet est donc forcé après full_refresh_seconds.
+    """
+    now = time.time()
+    validators = None
+    if entry and now - entry['full_fetched_at'] < REPO_CACHE_CONFIG['full_refresh_seconds']:
+        validators = entry.get('validators')
+
+    repositories, new_validators = fetch(validators)
+
+    if repositories is None and entry:
+        entry = dict(entry)
+        entry['validated_at'] = now
+        if new_validators:
+            entry['validators'] = new_validators
+    else:
+        entry = {
+            'repositories': repositories or [],
+            'digest': listing_digest(repositories or []),
+            'validators': new_validators,
+            'validated_at': now,
+            'full_fetched_at': now
+        }
+    store_entry(cache_key, entry)
+    return entry
+
+def background_revalidate(cache_key, fetch, entry):
+    """Revalide en arrière-plan, une seule fois par clé à la fois"""
+    with _refreshing_lock:
+        if cache_key in _refreshing:
+            return False
+        _refreshing.add(cache_key)
+
+    def run():
+        try:
+            with background_lane():
+                revalidate(cache_key, fetch, entry)
+        except RateLimited as e:
+            logger.warning(f"Revalidation dépôts {cache_key} reportée: {str(e)}")
+        except Exception as e:
+            logger.error(f"Erreur revalidation dépôts {cache_key}: {str(e)}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(cache_key)
+
+    get_refresh_executor().submit(run)
+    return True
+
+def get_repositories(cache_key, fetch):
+    """Retourne la liste de dépôts en cache, revalidée selon sa fraîcheur
+
+    - fraîche : servie telle quelle ;
+    - périmée depuis moins de stale_seconds : servie, revalidée en arrière-plan ;
+    - sinon : revalidée avant de répondre (la copie périmée sert de secours,
+      notamment quand le quota de l'hôte est épuisé).
+    """
+    entry = get_entry(cache_key)
+    if entry:
+        age = time.time() - entry['validated_at']
+        if age < REPO_CACHE_CONFIG['fresh_seconds']:
+            return entry['repositories']
+        if age < REPO_CACHE_CONFIG['fresh_seconds'] + REPO_CACHE_CONFIG['stale_seconds']:
+            background_revalidate(cache_key, fetch, entry)
+            return entry['repositories']
+
+    try:
+        return revalidate(cache_key, fetch, entry)['repositories']
+    except RateLimited as e:
+        # Quota épuisé : la copie périmée est servie sans solliciter l'hôte
+        logger.warning(f"Dépôts {cache_key} servis depuis le cache: {str(e)}")
+        return entry['repositories'] if entry else []
+    except Exception as e:
+        logger.error(f"Erreur récupération dépôts {cache_key}: {str(e)}")
+        return entry['repositories'] if entry else []
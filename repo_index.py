@@ -0,0 +1,130 @@
+import base64
+import hashlib
+import logging
+
+from ttl_cache import TTLCache
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Tris disponibles : clé de tri des dépôts (ordre décroissant)
+SORT_KEYS = {
+    'updated': lambda repo: repo.get('updated_at') or '',
+    'stars': lambda repo: repo.get('stars') or 0,
+    'size': lambda repo: repo.get('size') or 0
+}
+
+# Index construits, un par liste de dépôts (clé : empreinte de la liste)
+_indexes = TTLCache(max_entries=500, ttl=3600)
+
+class InvalidCursor(ValueError):
+    """Curseur illisible ou émis pour une autre version de la liste"""
+
+def listing_digest(repositories):
+    """Empreinte d'une liste de dépôts (identité et date de mise à jour)"""
+    digest = hashlib.sha1()
+    for repo in repositories:
+        digest.update(f"{repo.get('platform')}:{repo.get('id')}:{repo.get('updated_at')}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+class RepositoryIndex:
+    """Index mémoire d'une liste de dépôts : filtres, tris et statistiques
+
+    Construit une seule fois par liste : les positions sont regroupées par
+    plateforme, langage, visibilité et fork, et les ordres de tri sont
+    précalculés. Une page coûte alors O(taille de page + éléments écartés).
+    """
+
+    def __init__(self, repositories, digest=None):
+        self.repositories = repositories
+        self.digest = digest or listing_digest(repositories)
+        self.by_platform = {}
+        self.by_language = {}
+        self.by_visibility = {'public': set(), 'private': set()}
+        self.by_fork = {True: set(), False: set()}
+        self.stats = {'total': len(repositories), 'public': 0, 'private': 0, 'languages': {}}
+
+        # Un seul passage pour les index et les statistiques
+        for position, repo in enumerate(repositories):
+            self.by_platform.setdefault(repo.get('platform'), set()).add(position)
+            # GitHub envoie language: null (langage non détecté)
+            language = repo.get('language') or 'N/A'
+            self.by_language.setdefault(language, set()).add(position)
+            self.stats['languages'][language] = self.stats['languages'].get(language, 0) + 1
+            if repo.get('private', False):
+                self.by_visibility['private'].add(position)
+                self.stats['private'] += 1
+            else:
+                self.by_visibility['public'].add(position)
+                self.stats['public'] += 1
+            self.by_fork[bool(repo.get('fork'))].add(position)
+
+        self.orders = {}
+        for name, key in SORT_KEYS.items():
+            descending = sorted(range(len(repositories)), key=lambda p: key(repositories[p]), reverse=True)
+            self.orders[f"{name}:desc"] = descending
+            self.orders[f"{name}:asc"] = descending[::-1]
+
+    def matching_positions(self, platform=None, language=None, visibility=None, fork=None):
+        """Positions correspondant aux filtres, ou None si aucun filtre"""
+        candidates = []
+        if platform:
+            candidates.append(self.by_platform.get(platform, set()))
+        if language:
+            candidates.append(self.by_language.get(language, set()))
+        if visibility:
+            candidates.append(self.by_visibility.get(visibility, set()))
+        if fork is not None:
+            candidates.append(self.by_fork[fork])
+        if not candidates:
+            return None
+        candidates.sort(key=len)
+        return set(candidates[0]).intersection(*candidates[1:])
+
+    def encode_cursor(self, sort, position):
+        raw = f"{self.digest}|{sort}|{position}".encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    def decode_cursor(self, cursor, sort):
+        try:
+            digest, cursor_sort, position = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+            position = int(position)
+        except Exception:
+            raise InvalidCursor('curseur illisible')
+        if digest != self.digest or cursor_sort != sort:
+            raise InvalidCursor('la liste a changé depuis ce curseur')
+        return position
+
+    def query(self, platform=None, language=None, visibility=None, fork=None,
+              sort='updated', ascending=False, cursor=None, limit=30):
+        """Retourne (dépôts, curseur suivant, total filtré)"""
+        if sort not in SORT_KEYS:
+            sort = 'updated'
+        sort_name = f"{sort}:{'asc' if ascending else 'desc'}"
+        order = self.orders[sort_name]
+
+        matching = self.matching_positions(platform, language, visibility, fork)
+        total = len(self.repositories) if matching is None else len(matching)
+
+        start = self.decode_cursor(cursor, sort_name) if cursor else 0
+        items = []
+        position = start
+        while position < len(order) and len(items) < limit:
+            index = order[position]
+            if matching is None or index in matching:
+                items.append(self.repositories[index])
+            position += 1
+
+        next_cursor = None
+        if position < len(order) and (matching is None or len(items) == limit):
+            next_cursor = self.encode_cursor(sort_name, position)
+        return items, next_cursor, total
+
+def get_index(repositories, digest=None):
+    """Index d'une liste, construit à la première demande puis réutilisé"""
+    digest = digest or listing_digest(repositories)
+    index = _indexes.get(digest)
+    if index is None:
+        index = RepositoryIndex(repositories, digest)
+        _indexes.set(digest, index)
+    return index
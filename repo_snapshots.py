@@ -0,0 +1,444 @@
+import os
+import re
+import json
+import mmap
+import time
+import tarfile
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from blob_store import get_blob_store
+from http_client import HTTP_CONFIG
+from metrics import inc, observe
+from rate_limits import rate_limited_get, background_lane
+from ttl_cache import TTLCache, SqliteCacheBackend
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Instantanés des dépôts pour le contexte Forge (surchargé par init_repo_snapshots)
+SNAPSHOT_CONFIG = {
+    'enabled': True,
+    'sqlite_path': 'data/repo_snapshots.db',
+    'record_ttl': 30 * 24 * 3600,
+    # Délai entre deux vérifications de la branche par défaut
+    'head_ttl': 120,
+    'workers': 2,
+    'max_file_size': 512 * 1024,
+    'max_archive_bytes': 200 * 1024 * 1024,
+    'max_files': 20000,
+    'max_incremental_files': 200,
+    'archive_read_timeout': 60,
+    'context_max_bytes': 200 * 1024,
+    'context_max_file_bytes': 32 * 1024,
+    'context_max_tree_entries': 500,
+    'max_open_maps': 256
+}
+
+# Fichiers décrivant le projet, placés en tête du contexte
+KEY_FILES = (
+    'readme', 'readme.md', 'readme.rst', 'package.json', 'requirements.txt', 'pyproject.toml',
+    'setup.py', 'dockerfile', 'go.mod', 'cargo.toml', 'pom.xml', 'build.gradle', 'composer.json', 'gemfile'
+)
+
+# Répertoires jamais inclus dans le contexte (dépendances, artefacts)
+SKIPPED_DIRS = frozenset(['node_modules', 'vendor', 'dist', 'build', '.git', '__pycache__', '.venv', 'venv'])
+
+class SnapshotError(Exception):
+    """Échec de construction d'un instantané (archive, comparaison, fichier)"""
+
+class Snapshot:
+    """Arbre d'un dépôt à un commit : chemin -> (empreinte, taille, texte)
+
+    Les contenus restent dans le stockage adressé par contenu et sont lus
+    par mmap, fichier par fichier, sans charger l'arbre en mémoire.
+    """
+
+    def __init__(self, key, sha, files):
+        self.key = key
+        self.sha = sha
+        self.files = files
+
+    def paths(self):
+        return sorted(self.files)
+
+    def read(self, path, offset=0, length=None):
+        digest, size, _ = self.files[path]
+        if size == 0 or offset >= size:
+            return b''
+        end = size if length is None else min(size, offset + length)
+        return read_mapped(digest, offset, end)
+
+    def text(self, path, limit=None):
+        return self.read(path, 0, limit).decode('utf-8', errors='replace')
+
+# Projections mémoire ouvertes, par empreinte (LRU : chacune garde un descripteur)
+_maps = OrderedDict()
+_maps_lock = threading.Lock()
+
+def read_mapped(digest, offset, end):
+    """Copie d'une tranche d'un contenu ; la copie est faite sous le verrou
+    pour qu'une éviction concurrente ne ferme pas la projection entre-temps"""
+    with _maps_lock:
+        mapped = _maps.get(digest)
+        if mapped is not None:
+            _maps.move_to_end(digest)
+            return mapped[offset:end]
+    with get_blob_store().open(digest) as blob:
+        mapped = mmap.mmap(blob.fileno(), 0, access=mmap.ACCESS_READ)
+    with _maps_lock:
+        existing = _maps.get(digest)
+        if existing is not None:
+            # Projeté entre-temps par une autre requête
+            mapped.close()
+            mapped = existing
+            _maps.move_to_end(digest)
+        else:
+            _maps[digest] = mapped
+        data = mapped[offset:end]
+        while len(_maps) > SNAPSHOT_CONFIG['max_open_maps']:
+            _, evicted = _maps.popitem(last=False)
+            evicted.close()
+    return data
+
+_index = {'backend': None}
+# Instantanés chargés par worker
+_loaded = TTLCache(max_entries=64, ttl=3600)
+_builds = {}
+_builds_lock = threading.Lock()
+_executor = {'pool': None, 'pid': None}
+
+def get_index():
+    if _index['backend'] is None:
+        _index['backend'] = SqliteCacheBackend(SNAPSHOT_CONFIG['sqlite_path'], table='repo_snapshots')
+    return _index['backend']
+
+def repo_key(repo):
+    return f"{repo['platform']}:{repo['id']}"
+
+def auth_headers(platform, access_token):
+    if platform == 'github':
+        return {'Authorization': f'token {access_token}', 'Accept': 'application/vnd.github+json'}
+    return {'Authorization': f'Bearer {access_token}'}
+
+def api_get(url, platform, access_token, **kwargs):
+    headers = auth_headers(platform, access_token)
+    headers.update(kwargs.pop('headers', {}))
+    response = rate_limited_get(url, access_token, headers=headers, **kwargs)
+    if response.status_code != 200:
+        response.close()
+        raise SnapshotError(f"{platform} {response.status_code} sur {url}")
+    return response
+
+def gitlab_project(repo):
+    return f"https://gitlab.com/api/v4/projects/{repo['id']}"
+
+def resolve_head(repo, access_token):
+    """SHA du dernier commit de la branche par défaut"""
+    platform = repo['platform']
+    branch = quote(repo.get('default_branch') or 'main', safe='')
+    if platform == 'github':
+        url = f"https://api.github.com/repos/{repo['full_name']}/commits/{branch}"
+        return api_get(url, platform, access_token, headers={'Accept': 'application/vnd.github.sha'}).text.strip()
+    if platform == 'gitlab':
+        url = f"{gitlab_project(repo)}/repository/branches/{branch}"
+        return api_get(url, platform, access_token).json()['commit']['id']
+    if platform == 'bitbucket':
+        url = f"https://api.bitbucket.org/2.0/repositories/{repo['full_name']}/refs/branches/{branch}"
+        return api_get(url, platform, access_token).json()['target']['hash']
+    raise SnapshotError(f"Plateforme non supportée: {platform}")
+
+def archive_url(repo, sha):
+    if repo['platform'] == 'github':
+        return f"https://api.github.com/repos/{repo['full_name']}/tarball/{sha}"
+    if repo['platform'] == 'gitlab':
+        return f"{gitlab_project(repo)}/repository/archive.tar.gz?sha={sha}"
+    return f"https://bitbucket.org/{repo['full_name']}/get/{sha}.tar.gz"
+
+def raw_file_url(repo, sha, path):
+    if repo['platform'] == 'github':
+        return f"https://api.github.com/repos/{repo['full_name']}/contents/{quote(path)}?ref={sha}"
+    if repo['platform'] == 'gitlab':
+        return f"{gitlab_project(repo)}/repository/files/{quote(path, safe='')}/raw?ref={sha}"
+    return f"https://api.bitbucket.org/2.0/repositories/{repo['full_name']}/src/{sha}/{quote(path)}"
+
+def ingest(blob_store, data):
+    """Stocke un contenu (dédupliqué entre commits) ; retourne son entrée de manifeste"""
+    return [blob_store.put_bytes(data), len(data), b'\x00' not in data[:8192]]
+
+def read_limited(response, limit):
+    """Corps d'une réponse en flux, ou None s'il dépasse limit octets"""
+    data = bytearray()
+    for chunk in response.iter_content(64 * 1024):
+        data.extend(chunk)
+        if len(data) > limit:
+            response.close()
+            return None
+    return bytes(data)
+
+def download_archive(repo, sha, access_token):
+    """Télécharge l'archive du commit et stocke chaque fichier texte ou binaire
+    (taille bornée) ; l'archive est lue en flux, jamais écrite sur disque"""
+    blob_store = get_blob_store()
+    response = api_get(
+        archive_url(repo, sha), repo['platform'], access_token,
+        stream=True, timeout=(HTTP_CONFIG['connect_timeout'], SNAPSHOT_CONFIG['archive_read_timeout'])
+    )
+    files = {}
+    total = 0
+    try:
+        response.raw.decode_content = True
+        with tarfile.open(fileobj=response.raw, mode='r|*') as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                # Premier composant : répertoire racine ajouté par l'hôte (owner-repo-sha/)
+                path = member.name.split('/', 1)[1] if '/' in member.name else member.name
+                total += member.size
+                if total > SNAPSHOT_CONFIG['max_archive_bytes'] or len(files) >= SNAPSHOT_CONFIG['max_files']:
+                    logger.warning(f"Instantané {repo_key(repo)}@{sha[:8]} tronqué (limite atteinte)")
+                    break
+                if member.size > SNAPSHOT_CONFIG['max_file_size']:
+                    continue
+                files[path] = ingest(blob_store, archive.extractfile(member).read())
+    except tarfile.TarError as e:
+        raise SnapshotError(f"Archive illisible: {str(e)}")
+    finally:
+        response.close()
+    return files
+
+def compare_changes(repo, base, head, access_token):
+    """Fichiers modifiés entre deux commits : liste de (statut, chemin, ancien chemin),
+    ou None si la comparaison directe n'est pas exploitable (historique réécrit,
+    trop de fichiers)"""
+    platform = repo['platform']
+    limit = SNAPSHOT_CONFIG['max_incremental_files']
+    changes = []
+    if platform == 'github':
+        url = f"https://api.github.com/repos/{repo['full_name']}/compare/{base}...{head}"
+        data = api_get(url, platform, access_token).json()
+        # La comparaison part de la base de fusion : seul un historique linéaire convient
+        if data.get('status') not in ('ahead', 'identical') or len(data.get('files', [])) >= 300:
+            return None
+        for item in data.get('files', []):
+            status = {'removed': 'removed', 'renamed': 'renamed'}.get(item['status'], 'modified')
+            changes.append((status, item['filename'], item.get('previous_filename')))
+    elif platform == 'gitlab':
+        url = f"{gitlab_project(repo)}/repository/compare"
+        data = api_get(url, platform, access_token, params={'from': base, 'to': head, 'straight': 'true'}).json()
+        if data.get('compare_timeout') or data.get('overflow'):
+            return None
+        for item in data.get('diffs', []):
+            if item.get('deleted_file'):
+                changes.append(('removed', item['old_path'], None))
+            elif item.get('renamed_file'):
+                changes.append(('renamed', item['new_path'], item['old_path']))
+            else:
+                changes.append(('modified', item['new_path'], None))
+    elif platform == 'bitbucket':
+        url = f"https://api.bitbucket.org/2.0/repositories/{repo['full_name']}/diffstat/{head}..{base}"
+        params = {'topic': 'false', 'pagelen': 100}
+        while url:
+            data = api_get(url, platform, access_token, params=params).json()
+            params = None
+            for item in data.get('values', []):
+                old_path = (item.get('old') or {}).get('path')
+                new_path = (item.get('new') or {}).get('path')
+                if item['status'] == 'removed':
+                    changes.append(('removed', old_path, None))
+                elif item['status'] == 'renamed':
+                    changes.append(('renamed', new_path, old_path))
+                else:
+                    changes.append(('modified', new_path, None))
+            if len(changes) > limit:
+                return None
+            url = data.get('next')
+    else:
+        return None
+    return changes if len(changes) <= limit else None
+
+def apply_changes(repo, previous, sha, changes, access_token):
+    """Nouveau manifeste à partir du précédent : seuls les fichiers modifiés
+    sont téléchargés, les autres contenus sont réutilisés tels quels"""
+    blob_store = get_blob_store()
+    files = dict(previous.files)
+    for status, path, old_path in changes:
+        if old_path:
+            files.pop(old_path, None)
+        if status == 'removed':
+            files.pop(path, None)
+            continue
+        headers = {'Accept': 'application/vnd.github.raw'} if repo['platform'] == 'github' else {}
+        response = api_get(raw_file_url(repo, sha, path), repo['platform'], access_token, stream=True, headers=headers)
+        data = read_limited(response, SNAPSHOT_CONFIG['max_file_size'])
+        if data is None:
+            files.pop(path, None)
+        else:
+            files[path] = ingest(blob_store, data)
+    return files
+
+def save_snapshot(key, sha, files):
+    manifest = get_blob_store().put_bytes(json.dumps(files, sort_keys=True).encode('utf-8'))
+    get_index().set(f"snapshot:{key}:{sha}", {'manifest': manifest, 'files': len(files), 'created_at': time.time()}, SNAPSHOT_CONFIG['record_ttl'])
+    snapshot = Snapshot(key, sha, files)
+    _loaded.set((key, sha), snapshot)
+    return snapshot
+
+def load_snapshot(key, sha):
+    """Instantané déjà construit (mémoire du worker, puis manifeste stocké)"""
+    snapshot = _loaded.get((key, sha))
+    if snapshot is not None:
+        return snapshot
+    record = get_index().get(f"snapshot:{key}:{sha}")
+    if not record:
+        return None
+    files = json.loads(get_blob_store().read(record['manifest']))
+    snapshot = Snapshot(key, sha, files)
+    _loaded.set((key, sha), snapshot)
+    return snapshot
+
+def build_snapshot(repo, access_token):
+    """Met l'instantané du dépôt à jour avec la branche par défaut
+
+    Un commit déjà connu ne coûte qu'un appel ; sinon le précédent est mis à
+    jour par comparaison, et l'archive complète n'est téléchargée qu'en
+    l'absence d'instantané ou si la comparaison est inexploitable.
+    """
+    key = repo_key(repo)
+    started = time.perf_counter()
+    sha = resolve_head(repo, access_token)
+    snapshot = load_snapshot(key, sha)
+    mode = None
+
+    if snapshot is None:
+        previous = current_snapshot(key)
+        if previous is not None:
+            changes = compare_changes(repo, previous.sha, sha, access_token)
+            if changes is not None:
+                snapshot = save_snapshot(key, sha, apply_changes(repo, previous, sha, changes, access_token))
+                mode = 'incremental'
+                logger.info(f"Instantané {key}@{sha[:8]} mis à jour ({len(changes)} fichiers modifiés)")
+        if snapshot is None:
+            snapshot = save_snapshot(key, sha, download_archive(repo, sha, access_token))
+            mode = 'archive'
+            logger.info(f"Instantané {key}@{sha[:8]} construit ({len(snapshot.files)} fichiers)")
+        inc('repo_snapshot_builds_total', platform=repo['platform'], mode=mode)
+        observe('repo_snapshot_build_seconds', time.perf_counter() - started, mode=mode)
+
+    # La tête n'avance qu'une fois son instantané enregistré
+    set_head(key, sha)
+    return snapshot
+
+def set_head(key, sha):
+    get_index().set(f"head:{key}", {'sha': sha, 'checked_at': time.time()}, SNAPSHOT_CONFIG['record_ttl'])
+
+def current_head(key):
+    return get_index().get(f"head:{key}")
+
+def current_snapshot(key):
+    head = current_head(key)
+    return load_snapshot(key, head['sha']) if head and head['sha'] else None
+
+def get_executor():
+    if _executor['pid'] != os.getpid():
+        _executor['pool'] = ThreadPoolExecutor(
+            max_workers=SNAPSHOT_CONFIG['workers'],
+            thread_name_prefix='repo-snapshot'
+        )
+        _executor['pid'] = os.getpid()
+        _builds.clear()
+    return _executor['pool']
+
+def run_build(key, repo, access_token):
+    try:
+        with background_lane():
+            build_snapshot(repo, access_token)
+    except Exception as e:
+        inc('repo_snapshot_builds_total', platform=repo['platform'], mode='error')
+        logger.error(f"Erreur instantané {key}: {str(e)}")
+        # Nouvel essai après head_ttl seulement ; l'instantané précédent reste servi
+        head = current_head(key)
+        set_head(key, head['sha'] if head else None)
+    finally:
+        with _builds_lock:
+            _builds.pop(key, None)
+
+def schedule_snapshot(repo, access_token):
+    """Construit ou met à jour l'instantané en arrière-plan (une fois par dépôt à la fois)"""
+    if not SNAPSHOT_CONFIG['enabled']:
+        return False
+    executor = get_executor()
+    key = repo_key(repo)
+    with _builds_lock:
+        if key in _builds:
+            return False
+        _builds[key] = executor.submit(run_build, key, repo, access_token)
+    return True
+
+def get_snapshot(repo, access_token):
+    """Dernier instantané connu du dépôt, sans appel réseau
+
+    Si la branche par défaut n'a pas été vérifiée depuis head_ttl (ou si
+    aucun instantané n'existe), une mise à jour est lancée en arrière-plan
+    et l'instantané précédent est servi en attendant.
+    """
+    if not SNAPSHOT_CONFIG['enabled']:
+        return None
+    key = repo_key(repo)
+    head = current_head(key)
+    if head is None or time.time() - head['checked_at'] > SNAPSHOT_CONFIG['head_ttl']:
+        schedule_snapshot(repo, access_token)
+    return current_snapshot(key)
+
+def snapshot_status(repo):
+    key = repo_key(repo)
+    snapshot = current_snapshot(key)
+    return {
+        'repository': key,
+        'ready': snapshot is not None,
+        'sha': snapshot.sha if snapshot else None,
+        'files': len(snapshot.files) if snapshot else 0,
+        'building': key in _builds
+    }
+
+def context_priority(path, words):
+    """Rang d'un fichier dans le contexte : fichiers clés, puis fichiers cités
+    par le prompt, puis les moins profonds"""
+    name = path.rsplit('/', 1)[-1].lower()
+    if name in KEY_FILES and '/' not in path:
+        return (0, 0, 0, path)
+    mentioned = sum(1 for part in re.split(r'[/._-]', path.lower()) if part in words)
+    return (1 if mentioned else 2, -mentioned, path.count('/'), path)
+
+def repository_context(snapshot, prompt):
+    """Contexte du dépôt pour le prompt : arborescence puis contenus des
+    fichiers les plus pertinents, dans la limite de context_max_bytes"""
+    words = set(word for word in re.split(r'\W+', (prompt or '').lower()) if len(word) > 2)
+    paths = sorted(path for path in snapshot.files if not SKIPPED_DIRS.intersection(path.split('/')[:-1]))
+    tree = paths[:SNAPSHOT_CONFIG['context_max_tree_entries']]
+    sections = [f"Dépôt {snapshot.key} (commit {snapshot.sha[:12]}), {len(snapshot.files)} fichiers :\n" + '\n'.join(tree)]
+    budget = SNAPSHOT_CONFIG['context_max_bytes'] - len(sections[0])
+    for path in sorted((path for path in paths if snapshot.files[path][2]), key=lambda p: context_priority(p, words)):
+        size = snapshot.files[path][1]
+        limit = min(size, SNAPSHOT_CONFIG['context_max_file_bytes'], budget - len(path) - 32)
+        if limit <= 0:
+            break
+        truncated = '\n[...tronqué]' if size > limit else ''
+        section = f"Fichier : {path}\n```\n{snapshot.text(path, limit)}{truncated}\n```"
+        sections.append(section)
+        budget -= len(section) + 2
+    return '\n\n'.join(sections)
+
+def init_repo_snapshots(app):
+    """Configure les instantanés de dépôts (index SQLite, limites, contexte)"""
+    SNAPSHOT_CONFIG['enabled'] = app.config.get('REPO_SNAPSHOTS_ENABLED', SNAPSHOT_CONFIG['enabled'])
+    SNAPSHOT_CONFIG['sqlite_path'] = app.config.get('REPO_SNAPSHOTS_SQLITE_PATH', SNAPSHOT_CONFIG['sqlite_path'])
+    SNAPSHOT_CONFIG['head_ttl'] = app.config.get('REPO_SNAPSHOTS_HEAD_TTL', SNAPSHOT_CONFIG['head_ttl'])
+    SNAPSHOT_CONFIG['max_file_size'] = app.config.get('REPO_SNAPSHOTS_MAX_FILE_SIZE', SNAPSHOT_CONFIG['max_file_size'])
+    SNAPSHOT_CONFIG['max_archive_bytes'] = app.config.get('REPO_SNAPSHOTS_MAX_ARCHIVE_BYTES', SNAPSHOT_CONFIG['max_archive_bytes'])
+    SNAPSHOT_CONFIG['context_max_bytes'] = app.config.get('REPO_CONTEXT_MAX_BYTES', SNAPSHOT_CONFIG['context_max_bytes'])
+    _index['backend'] = None
+    _loaded.clear()
@@ -0,0 +1,156 @@
+import json
+import hashlib
+import threading
+import unicodedata
+import logging
+from collections import OrderedDict
+
+from ttl_cache import SqliteCacheBackend
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Configuration du cache des réponses (surchargée par init_response_cache)
+RESPONSE_CACHE_CONFIG = {
+    'enabled': True,
+    'max_bytes': 64 * 1024 * 1024,
+    'max_entries': 5000,
+    'disk_ttl': 7 * 24 * 3600,
+    'disk_max_rows': 20000,
+    'sqlite_path': 'data/response_cache.db',
+    'replay_chunk_size': 48,
+    'purge_every': 500
+}
+
+_memory = {'cache': None}
+_disk = {'backend': None}
+_stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0}
+_stats_lock = threading.Lock()
+
+class BoundedLRU:
+    """Cache mémoire LRU borné en nombre d'entrées et en octets"""
+
+    def __init__(self, max_bytes, max_entries):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.total_bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous.encode('utf-8'))
+            self._data[key] = value
+            self.total_bytes += size
+            while self._data and (self.total_bytes > self.max_bytes or len(self._data) > self.max_entries):
+                _, evicted = self._data.popitem(last=False)
+                self.total_bytes -= len(evicted.encode('utf-8'))
+
+    def __len__(self):
+        return len(self._data)
+
+def normalize_prompt(prompt):
+    """Forme canonique d'un prompt : NFC, fins de ligne et espaces de bord"""
+    text = unicodedata.normalize('NFC', prompt or '').replace('\r\n', '\n')
+    return '\n'.join(line.rstrip() for line in text.strip().split('\n'))
+
+def context_digest(history):
+    """Empreinte des tours précédents transmis comme contexte"""
+    digest = hashlib.sha256()
+    for turn in history or []:
+        digest.update(json.dumps([turn['prompt'], turn['response']], ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+def response_key(model, prompt, history=None, file_hashes=None):
+    """Clé adressée par contenu : modèle, prompt normalisé, contexte, fichiers"""
+    material = json.dumps({
+        'model': model,
+        'prompt': normalize_prompt(prompt),
+        'context': context_digest(history),
+        'files': sorted(file_hashes or [])
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+def init_response_cache(app):
+    """Configure le cache des réponses (mémoire + disque partagé entre workers)"""
+    RESPONSE_CACHE_CONFIG['enabled'] = app.config.get('RESPONSE_CACHE_ENABLED', RESPONSE_CACHE_CONFIG['enabled'])
+    RESPONSE_CACHE_CONFIG['max_bytes'] = app.config.get('RESPONSE_CACHE_MAX_BYTES', RESPONSE_CACHE_CONFIG['max_bytes'])
+    RESPONSE_CACHE_CONFIG['disk_ttl'] = app.config.get('RESPONSE_CACHE_DISK_TTL', RESPONSE_CACHE_CONFIG['disk_ttl'])
+    RESPONSE_CACHE_CONFIG['disk_max_rows'] = app.config.get('RESPONSE_CACHE_DISK_MAX_ROWS', RESPONSE_CACHE_CONFIG['disk_max_rows'])
+    RESPONSE_CACHE_CONFIG['sqlite_path'] = app.config.get('RESPONSE_CACHE_SQLITE_PATH', RESPONSE_CACHE_CONFIG['sqlite_path'])
+
+    _memory['cache'] = BoundedLRU(RESPONSE_CACHE_CONFIG['max_bytes'], RESPONSE_CACHE_CONFIG['max_entries'])
+    _disk['backend'] = None
+    if RESPONSE_CACHE_CONFIG['enabled'] and RESPONSE_CACHE_CONFIG['sqlite_path']:
+        try:
+            _disk['backend'] = SqliteCacheBackend(RESPONSE_CACHE_CONFIG['sqlite_path'], table='llm_responses')
+        except Exception as e:
+            logger.error(f"Cache disque des réponses indisponible: {str(e)}")
+
+def count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+def get_cached_response(key):
+    """Réponse en cache (mémoire puis disque), ou None"""
+    if not RESPONSE_CACHE_CONFIG['enabled'] or _memory['cache'] is None:
+        return None
+    text = _memory['cache'].get(key)
+    if text is not None:
+        count('memory_hits')
+        return text
+    if _disk['backend'] is not None:
+        try:
+            text = _disk['backend'].get(key)
+        except Exception as e:
+            logger.error(f"Erreur lecture cache disque des réponses: {str(e)}")
+            text = None
+        if text is not None:
+            # Promotion dans le cache mémoire du worker
+            _memory['cache'].set(key, text)
+            count('disk_hits')
+            return text
+    count('misses')
+    return None
+
+def cache_response(key, text):
+    """Enregistre une réponse complète dans les deux niveaux"""
+    if not RESPONSE_CACHE_CONFIG['enabled'] or _memory['cache'] is None or not text:
+        return
+    _memory['cache'].set(key, text)
+    if _disk['backend'] is not None:
+        try:
+            _disk['backend'].set(key, text, RESPONSE_CACHE_CONFIG['disk_ttl'])
+            count('writes')
+            # Niveau disque borné par son TTL et son nombre de lignes : purge
+            # périodique des expirés puis des plus anciennes
+            if _stats['writes'] % RESPONSE_CACHE_CONFIG['purge_every'] == 0:
+                _disk['backend'].purge_expired(RESPONSE_CACHE_CONFIG['disk_max_rows'])
+        except Exception as e:
+            logger.error(f"Erreur écriture cache disque des réponses: {str(e)}")
+
+def replay_chunks(text):
+    """Découpe une réponse en cache en fragments pour la rejouer en flux"""
+    size = RESPONSE_CACHE_CONFIG['replay_chunk_size']
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+def response_cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    cache = _memory['cache']
+    stats['entries'] = len(cache) if cache else 0
+    stats['bytes'] = cache.total_bytes if cache else 0
+    return stats
@@ -1,15 +1,36 @@
-from flask import render_template, redirect, url_for, session, request, jsonify, abort
+from flask import render_template, redirect, url_for, session, request, jsonify, abort, g
 from functools import wraps
 import os
-import requests
 import secrets
 import hashlib
 import hmac
 import logging
 from datetime import datetime, timedelta
-from urllib.parse import urlencode
+from urllib.parse import urlencode, urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+import time
+import threading
 import json
 
+from metrics import StepTimer
+from requests.exceptions import RequestException
+from http_client import http_get, http_post, http_patch, submit_with_context, set_deadline, reset_deadline
+from circuit_breaker import UpstreamUnavailable
+from rate_limits import rate_limited_get, RateLimited
+from user_cache import (
+    get_cached_user_by_platform, get_cached_user_by_email,
+    cache_user_row, invalidate_user_row,
+    get_row_id, forget_row_id
+)
+from baserow_writer import enqueue_row_update, LOGIN_METADATA_FIELDS, TOKEN_FIELDS
+import repo_cache
+from repo_index import get_index, InvalidCursor
+from prefetch import schedule_prefetch, wait_for_prefetch, record_access, prefetch_stats
+from static_pages import serve_static_page
+from fragment_cache import render_repo_cards
+from token_vault import store_tokens, get_access_token, set_token_refresher, baserow_token_copy, TokenRefreshError
+from repo_snapshots import schedule_snapshot, snapshot_status
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -44,6 +65,50 @@ OAUTH_CONFIG = {
     }
 }
 
+# Configuration de la récupération des dépôts (surchargée par init_routes)
+REPOS_CONFIG = {
+    'max_repos': 2000,
+    'per_page': 100,
+    'page_workers': 4,
+    'page_size': 30
+}
+
+# Vue agrégée multi-plateformes (surchargée par init_routes)
+AGGREGATE_CONFIG = {
+    'timeout': 4,
+    'workers': 6
+}
+
+# Configuration du callback OAuth (surchargée par init_routes)
+CALLBACK_CONFIG = {
+    'deadline': 10,
+    'workers': 8,
+    'redirect_base': 'http://localhost:5000'
+}
+
+# Échéance par défaut d'une requête entrante, respectée par les appels sortants
+REQUEST_CONFIG = {
+    'deadline': 25
+}
+
+# Codes d'erreur ayant un message dédié sur la page de connexion
+CONNECT_ERRORS = frozenset(['access_denied', 'token_error', 'userinfo_error', 'database_error', 'server_error'])
+
+# Pools de threads par (nom, processus)
+EXECUTORS = {}
+EXECUTORS_LOCK = threading.Lock()
+
+class ReauthRequired(Exception):
+    """Aucun token dans le coffre pour l'identité principale (coffre perdu,
+    token révoqué) : l'utilisateur doit repasser par OAuth"""
+
+    def __init__(self, platform):
+        super().__init__(platform)
+        self.platform = platform
+
+class RepositoryFetchError(Exception):
+    """Échec de récupération d'une page de dépôts (la liste serait tronquée)"""
+
 def generate_state_token():
     """Génère un token d'état pour la sécurité OAuth"""
     return secrets.token_urlsafe(32)
@@ -65,6 +130,11 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def reauth_url(platform):
+    """URL de reconnexion OAuth ; la session (sans token utilisable) est fermée"""
+    session.clear()
+    return url_for('oauth_login', platform=platform) if platform in OAUTH_CONFIG else url_for('connect')
+
 def get_baserow_headers(app):
     """Retourne les headers pour l'API Baserow"""
     return {
@@ -74,6 +144,10 @@ def get_baserow_headers(app):
 
 def find_user_by_platform_id(app, platform, platform_id):
     """Recherche un utilisateur dans Baserow par sa plateforme et son ID"""
+    cached_user = get_cached_user_by_platform(platform, platform_id)
+    if cached_user:
+        return cached_user
+    
     try:
         url = app.config['BASEROW_API_URL']
         
@@ -83,7 +157,7 @@ def find_user_by_platform_id(app, platform, platform_id):
             'filters__Plateforme__equal': platform
         }
         
-        response = requests.get(
+        response = http_get(
             url,
             headers=get_baserow_headers(app),
             params=params
@@ -92,7 +166,9 @@ def find_user_by_platform_id(app, platform, platform_id):
         if response.status_code == 200:
             data = response.json()
             results = data.get('results', [])
-            return results[0] if results else None
+            user = results[0] if results else None
+            cache_user_row(user, platform)
+            return user
         else:
             logger.error(f"Erreur recherche utilisateur: {response.status_code} - {response.text}")
             return None
@@ -101,29 +177,140 @@ def find_user_by_platform_id(app, platform, platform_id):
         logger.error(f"Exception recherche utilisateur: {str(e)}")
         return None
 
+def find_user_by_email(app, email, platform):
+    """Recherche un utilisateur dans Baserow par son email et sa plateforme"""
+    cached_user = get_cached_user_by_email(email, platform)
+    if cached_user:
+        return cached_user
+    
+    try:
+        params = {
+            'filters__Email__equal': email,
+            'filters__Plateforme__equal': platform
+        }
+        
+        response = http_get(
+            app.config['BASEROW_API_URL'],
+            headers=get_baserow_headers(app),
+            params=params
+        )
+        
+        if response.status_code == 200:
+            results = response.json().get('results', [])
+            user = results[0] if results else None
+            cache_user_row(user, platform)
+            return user
+        else:
+            logger.error(f"Erreur recherche utilisateur par email: {response.status_code} - {response.text}")
+            return None
+            
+    except Exception as e:
+        logger.error(f"Exception recherche utilisateur par email: {str(e)}")
+        return None
+
+def build_baserow_user_data(user_data, platform):
+    """Prépare les champs Baserow d'un utilisateur à partir des données OAuth
+    (tokens inclus seulement si la copie Baserow du coffre est activée)"""
+    data = {
+        'Email': user_data.get('email', ''),
+        'Nom': user_data.get('name', user_data.get('username', '')),
+        'Pseudo': user_data.get('username', ''),
+        'Plateforme': platform,
+        'ID_Plateforme': user_data.get('platform_id', ''),
+        'Avatar_URL': user_data.get('avatar_url', ''),
+        'Profil_URL': user_data.get('profile_url', ''),
+        'Derniere_Connexion': datetime.utcnow().isoformat(),
+        'Est_Actif': True
+    }
+    if baserow_token_copy():
+        data['Access_Token'] = user_data.get('access_token', '')
+        data['Refresh_Token'] = user_data.get('refresh_token', '')
+    return data
+
+def login_metadata_fields():
+    """Champs de connexion écrits en différé (tokens selon la copie Baserow)"""
+    return LOGIN_METADATA_FIELDS + TOKEN_FIELDS if baserow_token_copy() else LOGIN_METADATA_FIELDS
+
+def profile_changed(existing_user, baserow_data):
+    """Indique si les champs de profil (hors métadonnées de connexion) ont changé"""
+    for field, value in baserow_data.items():
+        if field in login_metadata_fields():
+            continue
+        if (existing_user.get(field) or '') != (value or ''):
+            return True
+    return False
+
+def queue_user_update(user, baserow_data, platform, error):
+    """Baserow indisponible : écriture mise en file, connexion sur la copie locale
+    
+    Retourne la ligne fusionnée, ou None si la file d'écriture est pleine.
+    """
+    logger.warning(f"Baserow indisponible ({str(error)}), écriture différée pour la ligne {user['id']}")
+    if not enqueue_row_update(user['id'], baserow_data):
+        logger.error(f"File d'écriture Baserow pleine, ligne {user['id']} non mise à jour")
+        return None
+    updated_user = dict(user)
+    updated_user.update(baserow_data)
+    cache_user_row(updated_user, platform)
+    return updated_user
+
 def create_or_update_user(app, user_data, platform):
-    """Crée ou met à jour un utilisateur dans Baserow"""
+    """Crée ou met à jour un utilisateur dans Baserow (upsert)
+    
+    Un utilisateur dont l'id de ligne est connu est mis à jour directement
+    par un PATCH ; la recherche puis création n'a lieu qu'en cas d'absence
+    de correspondance ou de 404. Si seul le suivi de connexion change,
+    l'écriture est différée et regroupée par baserow_writer.
+    """
     try:
-        # Vérifier si l'utilisateur existe déjà
-        existing_user = find_user_by_platform_id(app, platform, user_data.get('platform_id'))
+        platform_id = user_data.get('platform_id')
         
         # URL de l'API Baserow
         base_url = app.config['BASEROW_API_URL']
         
         # Préparer les données pour Baserow
-        baserow_data = {
-            'Email': user_data.get('email', ''),
-            'Nom': user_data.get('name', user_data.get('username', '')),
-            'Pseudo': user_data.get('username', ''),
-            'Plateforme': platform,
-            'ID_Plateforme': user_data.get('platform_id', ''),
-            'Avatar_URL': user_data.get('avatar_url', ''),
-            'Profil_URL': user_data.get('profile_url', ''),
-            'Access_Token': user_data.get('access_token', ''),
-            'Refresh_Token': user_data.get('refresh_token', ''),
-            'Derniere_Connexion': datetime.utcnow().isoformat(),
-            'Est_Actif': True
-        }
+        baserow_data = build_baserow_user_data(user_data, platform)
+        
+        # Chemin rapide : id de ligne déjà connu, un seul aller-retour
+        row_id = get_row_id(platform, platform_id)
+        if row_id:
+            cached_user = get_cached_user_by_platform(platform, platform_id)
+            
+            # Profil inchangé : seules les métadonnées de connexion changent,
+            # elles partent dans la file d'écriture différée
+            if cached_user and cached_user.get('id') == row_id and not profile_changed(cached_user, baserow_data):
+                metadata = {field: baserow_data[field] for field in login_metadata_fields()}
+                if enqueue_row_update(row_id, metadata):
+                    updated_user = dict(cached_user)
+                    updated_user.update(metadata)
+                    cache_user_row(updated_user, platform)
+                    return updated_user
+            
+            try:
+                response = http_patch(
+                    f"{base_url}{row_id}/",
+                    headers=get_baserow_headers(app),
+                    json=baserow_data
+                )
+            except (UpstreamUnavailable, RequestException) as e:
+                return queue_user_update(cached_user or {'id': row_id}, baserow_data, platform, e)
+            
+            if response.status_code == 200:
+                updated_user = response.json()
+                invalidate_user_row(cached_user, platform)
+                cache_user_row(updated_user, platform)
+                return updated_user
+            elif response.status_code == 404:
+                # Ligne supprimée côté Baserow : on repasse par la recherche
+                logger.warning(f"Ligne Baserow {row_id} introuvable pour {platform}:{platform_id}")
+                forget_row_id(platform, platform_id)
+                invalidate_user_row(cached_user, platform)
+            else:
+                logger.error(f"Erreur mise à jour Baserow: {response.status_code} - {response.text}")
+                return cached_user or {'id': row_id}
+        
+        # Vérifier si l'utilisateur existe déjà
+        existing_user = find_user_by_platform_id(app, platform, platform_id)
         
         # Ajouter la date de création si c'est un nouvel utilisateur
         if not existing_user:
@@ -134,27 +321,35 @@ def create_or_update_user(app, user_data, platform):
             row_id = existing_user['id']
             update_url = f"{base_url}{row_id}/"
             
-            response = requests.patch(
-                update_url,
-                headers=get_baserow_headers(app),
-                json=baserow_data
-            )
+            try:
+                response = http_patch(
+                    update_url,
+                    headers=get_baserow_headers(app),
+                    json=baserow_data
+                )
+            except (UpstreamUnavailable, RequestException) as e:
+                return queue_user_update(existing_user, baserow_data, platform, e)
             
             if response.status_code == 200:
-                return response.json()
+                updated_user = response.json()
+                invalidate_user_row(existing_user, platform)
+                cache_user_row(updated_user, platform)
+                return updated_user
             else:
                 logger.error(f"Erreur mise à jour Baserow: {response.status_code} - {response.text}")
                 return existing_user
         else:
             # Création
-            response = requests.post(
+            response = http_post(
                 base_url,
                 headers=get_baserow_headers(app),
                 json=baserow_data
             )
             
             if response.status_code in [200, 201]:
-                return response.json()
+                created_user = response.json()
+                cache_user_row(created_user, platform)
+                return created_user
             else:
                 logger.error(f"Erreur création Baserow: {response.status_code} - {response.text}")
                 return None
@@ -167,8 +362,9 @@ def get_user_email(platform, access_token):
     """Récupère l'email de l'utilisateur depuis la plateforme"""
     try:
         if platform == 'github':
-            emails_response = requests.get(
+            emails_response = rate_limited_get(
                 OAUTH_CONFIG['github']['emails_url'],
+                access_token,
                 headers={'Authorization': f'token {access_token}'}
             )
             if emails_response.status_code == 200:
@@ -183,8 +379,9 @@ def get_user_email(platform, access_token):
                         return email.get('email')
                         
         elif platform == 'bitbucket':
-            emails_response = requests.get(
+            emails_response = rate_limited_get(
                 OAUTH_CONFIG['bitbucket']['emails_url'],
+                access_token,
                 headers={'Authorization': f'Bearer {access_token}'}
             )
             if emails_response.status_code == 200:
@@ -195,131 +392,503 @@ def get_user_email(platform, access_token):
                         
         return None
         
+    except RateLimited as e:
+        logger.warning(f"Email {platform} non récupéré: {str(e)}")
+        return None
     except Exception as e:
         logger.error(f"Erreur récupération email {platform}: {str(e)}")
         return None
 
+def normalize_github_repo(repo):
+    """Convertit un dépôt GitHub au format commun"""
+    return {
+        'id': repo['id'],
+        'name': repo['name'],
+        'full_name': repo['full_name'],
+        'description': repo['description'],
+        'url': repo['html_url'],
+        'private': repo['private'],
+        'fork': repo['fork'],
+        'language': repo['language'] or 'N/A',
+        'stars': repo['stargazers_count'],
+        'forks': repo['forks_count'],
+        'updated_at': repo['updated_at'],
+        'created_at': repo['created_at'],
+        'default_branch': repo['default_branch'],
+        'size': repo['size'],
+        'platform': 'github',
+        'avatar_url': repo.get('owner', {}).get('avatar_url', '')
+    }
+
+def normalize_gitlab_repo(repo):
+    """Convertit un projet GitLab au format commun"""
+    return {
+        'id': repo['id'],
+        'name': repo['name'],
+        'full_name': repo['path_with_namespace'],
+        'description': repo['description'],
+        'url': repo['web_url'],
+        'private': repo['visibility'] == 'private',
+        'fork': repo.get('forked_from_project', False),
+        'language': repo.get('primary_language') or 'N/A',
+        'stars': repo['star_count'],
+        'forks': repo['forks_count'],
+        'updated_at': repo['last_activity_at'],
+        'created_at': repo['created_at'],
+        'default_branch': repo.get('default_branch', 'main'),
+        'size': repo.get('statistics', {}).get('repository_size', 0),
+        'platform': 'gitlab',
+        'avatar_url': repo.get('avatar_url', '')
+    }
+
+def normalize_bitbucket_repo(repo):
+    """Convertit un dépôt Bitbucket au format commun"""
+    # Récupérer le language principal
+    main_language = 'N/A'
+    if repo.get('language'):
+        main_language = repo['language']
+    elif repo.get('mainbranch', {}).get('name'):
+        main_language = repo['mainbranch']['name']
+    
+    return {
+        'id': repo['uuid'],
+        'name': repo['name'],
+        'full_name': repo['full_name'],
+        'description': repo.get('description', ''),
+        'url': repo['links']['html']['href'],
+        'private': repo.get('is_private', False),
+        'fork': False,
+        'language': main_language,
+        'stars': 0,  # Bitbucket n'a pas de stars
+        'forks': 0,
+        'updated_at': repo.get('updated_on'),
+        'created_at': repo.get('created_on'),
+        'default_branch': repo.get('mainbranch', {}).get('name', 'main'),
+        'size': repo.get('size', 0),
+        'platform': 'bitbucket',
+        'avatar_url': repo.get('owner', {}).get('links', {}).get('avatar', {}).get('href', '')
+    }
+
+def get_executor(name, max_workers):
+    """Pool de threads borné par nom, recréé dans chaque worker après fork"""
+    key = (name, os.getpid())
+    executor = EXECUTORS.get(key)
+    if executor is None:
+        with EXECUTORS_LOCK:
+            executor = EXECUTORS.get(key)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+                EXECUTORS[key] = executor
+    return executor
+
+def max_pages():
+    """Nombre de pages nécessaires pour atteindre le plafond de dépôts"""
+    return max(1, -(-REPOS_CONFIG['max_repos'] // REPOS_CONFIG['per_page']))
+
+def fetch_json_page(url, access_token, headers, params):
+    """Récupère une page JSON ; RepositoryFetchError en cas d'erreur"""
+    response = rate_limited_get(url, access_token, headers=headers, params=params)
+    if response.status_code != 200:
+        logger.error(f"Erreur page {url} {params.get('page', '')}: {response.status_code}")
+        raise RepositoryFetchError(f"page {params.get('page', '')} {response.status_code}")
+    return response.json()
+
+def fetch_remaining_pages(url, access_token, headers, params, last_page):
+    """Récupère en parallèle les pages 2..last_page, dans l'ordre
+    
+    Une page en échec ou un quota épuisé interrompt le chargement
+    (RepositoryFetchError, RateLimited) plutôt que de produire une liste
+    tronquée, qui serait ensuite revalidée en 304 sous les validateurs de
+    la première page : la copie complète en cache reste alors servie.
+    """
+    futures = []
+    executor = get_executor('repo-pages', REPOS_CONFIG['page_workers'])
+    for page in range(2, min(last_page, max_pages()) + 1):
+        page_params = dict(params)
+        page_params['page'] = page
+        futures.append(submit_with_context(executor, fetch_json_page, url, access_token, headers, page_params))
+    
+    pages = []
+    try:
+        for future in futures:
+            pages.append(future.result() or [])
+    except Exception:
+        for future in futures:
+            future.cancel()
+        raise
+    return pages
+
+def page_from_url(url):
+    """Extrait le paramètre page d'une URL de pagination"""
+    values = parse_qs(urlsplit(url).query).get('page')
+    return int(values[0]) if values else 1
+
+def conditional_headers(headers, validators):
+    """Ajoute les en-têtes de requête conditionnelle (ETag / Last-Modified)"""
+    if not validators:
+        return headers
+    headers = dict(headers)
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+def response_validators(response):
+    """Extrait les validateurs de cache d'une réponse"""
+    return {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified')
+    }
+
+def fetch_github_repositories(access_token, validators=None):
+    """Récupère tous les dépôts GitHub (pages suivantes via l'en-tête Link)"""
+    # Récupérer les dépôts GitHub (y compris ceux où l'utilisateur contribue)
+    repos_url = 'https://api.github.com/user/repos'
+    headers = {
+        'Authorization': f'token {access_token}',
+        'Accept': 'application/vnd.github.v3+json'
+    }
+    params = {
+        'sort': 'updated',
+        'per_page': REPOS_CONFIG['per_page'],
+        'affiliation': 'owner,collaborator,organization_member'
+    }
+    
+    response = rate_limited_get(repos_url, access_token, headers=conditional_headers(headers, validators), params=params)
+    if response.status_code == 304:
+        return None, response_validators(response)
+    if response.status_code != 200:
+        raise RepositoryFetchError(f"github {response.status_code}")
+    
+    pages = [response.json()]
+    last_url = response.links.get('last', {}).get('url')
+    if last_url:
+        pages.extend(fetch_remaining_pages(repos_url, access_token, headers, params, page_from_url(last_url)))
+    
+    return [normalize_github_repo(repo) for page in pages for repo in page], response_validators(response)
+
+def fetch_gitlab_repositories(access_token, validators=None):
+    """Récupère tous les projets GitLab (pages suivantes via X-Total-Pages)"""
+    repos_url = 'https://gitlab.com/api/v4/projects'
+    headers = {'Authorization': f'Bearer {access_token}'}
+    params = {
+        'membership': True,
+        'per_page': REPOS_CONFIG['per_page'],
+        'order_by': 'updated_at',
+        'sort': 'desc'
+    }
+    
+    response = rate_limited_get(repos_url, access_token, headers=conditional_headers(headers, validators), params=params)
+    if response.status_code == 304:
+        return None, response_validators(response)
+    if response.status_code != 200:
+        raise RepositoryFetchError(f"gitlab {response.status_code}")
+    
+    pages = [response.json()]
+    total_pages = response.headers.get('X-Total-Pages')
+    if total_pages:
+        pages.extend(fetch_remaining_pages(repos_url, access_token, headers, params, int(total_pages)))
+    else:
+        # Au-delà de 10 000 résultats GitLab omet le total : on suit X-Next-Page
+        next_page = response.headers.get('X-Next-Page')
+        while next_page and len(pages) < max_pages():
+            page_params = dict(params)
+            page_params['page'] = int(next_page)
+            next_response = rate_limited_get(repos_url, access_token, headers=headers, params=page_params)
+            if next_response.status_code != 200:
+                logger.error(f"Erreur page dépôts gitlab {next_page}: {next_response.status_code}")
+                break
+            pages.append(next_response.json())
+            next_page = next_response.headers.get('X-Next-Page')
+    
+    return [normalize_gitlab_repo(repo) for page in pages for repo in page], response_validators(response)
+
+def fetch_bitbucket_repositories(access_token, validators=None):
+    """Récupère tous les dépôts Bitbucket en suivant les liens next"""
+    repos_url = 'https://api.bitbucket.org/2.0/repositories'
+    params = {
+        'role': 'member',
+        'pagelen': REPOS_CONFIG['per_page'],
+        'sort': '-updated_on'
+    }
+    headers = {'Authorization': f'Bearer {access_token}'}
+    
+    response = rate_limited_get(repos_url, access_token, headers=conditional_headers(headers, validators), params=params)
+    if response.status_code == 304:
+        return None, response_validators(response)
+    if response.status_code != 200:
+        raise RepositoryFetchError(f"bitbucket {response.status_code}")
+    
+    data = response.json()
+    repositories = [normalize_bitbucket_repo(repo) for repo in data.get('values', [])]
+    pages_fetched = 1
+    next_url = data.get('next')
+    while next_url and pages_fetched < max_pages():
+        # Les liens next contiennent déjà tous les paramètres
+        next_response = rate_limited_get(next_url, access_token, headers=headers)
+        if next_response.status_code != 200:
+            logger.error(f"Erreur page dépôts bitbucket: {next_response.status_code}")
+            raise RepositoryFetchError(f"bitbucket page {pages_fetched + 1} {next_response.status_code}")
+        data = next_response.json()
+        repositories.extend(normalize_bitbucket_repo(repo) for repo in data.get('values', []))
+        next_url = data.get('next')
+        pages_fetched += 1
+    
+    return repositories, response_validators(response)
+
+def fetch_user_repositories(platform, access_token, validators=None):
+    """Récupère les dépôts d'une plateforme ; retourne (dépôts, validateurs)
+    
+    Les dépôts valent None quand l'amont confirme (304) que la liste
+    correspondant aux validateurs fournis n'a pas changé.
+    """
+    if platform == 'github':
+        repositories, validators = fetch_github_repositories(access_token, validators)
+    elif platform == 'gitlab':
+        repositories, validators = fetch_gitlab_repositories(access_token, validators)
+    elif platform == 'bitbucket':
+        repositories, validators = fetch_bitbucket_repositories(access_token, validators)
+    else:
+        return [], None
+    
+    if repositories is not None and len(repositories) > REPOS_CONFIG['max_repos']:
+        logger.warning(f"Dépôts {platform} tronqués à {REPOS_CONFIG['max_repos']} (sur {len(repositories)})")
+        repositories = repositories[:REPOS_CONFIG['max_repos']]
+    
+    return repositories, validators
+
 def get_user_repositories(platform, access_token, username):
     """Récupère tous les dépôts de l'utilisateur selon la plateforme"""
     try:
-        repositories = []
-        
-        if platform == 'github':
-            # Récupérer les dépôts GitHub (y compris ceux où l'utilisateur contribue)
-            repos_url = 'https://api.github.com/user/repos'
-            headers = {
-                'Authorization': f'token {access_token}',
-                'Accept': 'application/vnd.github.v3+json'
-            }
-            params = {
-                'sort': 'updated',
-                'per_page': 100,
-                'affiliation': 'owner,collaborator,organization_member'
-            }
-            
-            response = requests.get(repos_url, headers=headers, params=params)
-            if response.status_code == 200:
-                repos = response.json()
-                for repo in repos:
-                    repositories.append({
-                        'id': repo['id'],
-                        'name': repo['name'],
-                        'full_name': repo['full_name'],
-                        'description': repo['description'],
-                        'url': repo['html_url'],
-                        'private': repo['private'],
-                        'fork': repo['fork'],
-                        'language': repo['language'],
-                        'stars': repo['stargazers_count'],
-                        'forks': repo['forks_count'],
-                        'updated_at': repo['updated_at'],
-                        'created_at': repo['created_at'],
-                        'default_branch': repo['default_branch'],
-                        'size': repo['size'],
-                        'platform': 'github',
-                        'avatar_url': repo.get('owner', {}).get('avatar_url', '')
-                    })
-                    
-        elif platform == 'gitlab':
-            # Récupérer les projets GitLab
-            repos_url = 'https://gitlab.com/api/v4/projects'
-            headers = {'Authorization': f'Bearer {access_token}'}
-            params = {
-                'membership': True,
-                'per_page': 100,
-                'order_by': 'updated_at',
-                'sort': 'desc'
-            }
-            
-            response = requests.get(repos_url, headers=headers, params=params)
-            if response.status_code == 200:
-                repos = response.json()
-                for repo in repos:
-                    repositories.append({
-                        'id': repo['id'],
-                        'name': repo['name'],
-                        'full_name': repo['path_with_namespace'],
-                        'description': repo['description'],
-                        'url': repo['web_url'],
-                        'private': repo['visibility'] == 'private',
-                        'fork': repo.get('forked_from_project', False),
-                        'language': repo.get('primary_language', 'N/A'),
-                        'stars': repo['star_count'],
-                        'forks': repo['forks_count'],
-                        'updated_at': repo['last_activity_at'],
-                        'created_at': repo['created_at'],
-                        'default_branch': repo.get('default_branch', 'main'),
-                        'size': repo.get('statistics', {}).get('repository_size', 0),
-                        'platform': 'gitlab',
-                        'avatar_url': repo.get('avatar_url', '')
-                    })
-                    
-        elif platform == 'bitbucket':
-            # Récupérer les dépôts Bitbucket
-            repos_url = 'https://api.bitbucket.org/2.0/repositories'
-            params = {
-                'role': 'member',
-                'pagelen': 100,
-                'sort': '-updated_on'
-            }
-            headers = {'Authorization': f'Bearer {access_token}'}
-            
-            response = requests.get(repos_url, headers=headers, params=params)
-            if response.status_code == 200:
-                data = response.json()
-                for repo in data.get('values', []):
-                    # Récupérer le language principal
-                    main_language = 'N/A'
-                    if repo.get('language'):
-                        main_language = repo['language']
-                    elif repo.get('mainbranch', {}).get('name'):
-                        main_language = repo['mainbranch']['name']
-                    
-                    repositories.append({
-                        'id': repo['uuid'],
-                        'name': repo['name'],
-                        'full_name': repo['full_name'],
-                        'description': repo.get('description', ''),
-                        'url': repo['links']['html']['href'],
-                        'private': repo.get('is_private', False),
-                        'fork': False,
-                        'language': main_language,
-                        'stars': 0,  # Bitbucket n'a pas de stars
-                        'forks': 0,
-                        'updated_at': repo.get('updated_on'),
-                        'created_at': repo.get('created_on'),
-                        'default_branch': repo.get('mainbranch', {}).get('name', 'main'),
-                        'size': repo.get('size', 0),
-                        'platform': 'bitbucket',
-                        'avatar_url': repo.get('owner', {}).get('links', {}).get('avatar', {}).get('href', '')
-                    })
-        
+        repositories, _ = fetch_user_repositories(platform, access_token)
         return repositories
         
     except Exception as e:
         logger.error(f"Erreur récupération dépôts {platform}: {str(e)}")
         return []
 
+def repositories_cache_key(platform, user_id):
+    return f"{platform}:{user_id}"
+
+def get_cached_user_repositories(platform, access_token, user_id):
+    """Récupère les dépôts via le cache (revalidation conditionnelle ETag)"""
+    return repo_cache.get_repositories(
+        repositories_cache_key(platform, user_id),
+        lambda validators: fetch_user_repositories(platform, access_token, validators)
+    )
+
+def remaining_time(deadline):
+    """Temps restant avant l'échéance (jamais négatif)"""
+    return max(0.0, deadline - time.monotonic())
+
+def fetch_user_info(platform, access_token, timeout=None):
+    """Récupère le profil de l'utilisateur auprès de la plateforme"""
+    config = OAUTH_CONFIG[platform]
+    if platform == 'bitbucket':
+        authorization = f'Bearer {access_token}'
+    else:
+        authorization = f'token {access_token}'
+    kwargs = {'timeout': timeout} if timeout else {}
+    return rate_limited_get(config['userinfo_url'], access_token, headers={'Authorization': authorization}, **kwargs)
+
+def extract_user_data(platform, user_info, access_token, refresh_token):
+    """Extrait les données utilisateur selon la plateforme"""
+    user_data = {}
+    
+    if platform == 'github':
+        user_data = {
+            'platform_id': str(user_info.get('id')),
+            'username': user_info.get('login'),
+            'name': user_info.get('name'),
+            'email': user_info.get('email'),
+            'avatar_url': user_info.get('avatar_url'),
+            'profile_url': user_info.get('html_url'),
+            'access_token': access_token,
+            'refresh_token': refresh_token
+        }
+        
+    elif platform == 'gitlab':
+        user_data = {
+            'platform_id': str(user_info.get('id')),
+            'username': user_info.get('username'),
+            'name': user_info.get('name'),
+            'email': user_info.get('email'),
+            'avatar_url': user_info.get('avatar_url'),
+            'profile_url': user_info.get('web_url'),
+            'access_token': access_token,
+            'refresh_token': refresh_token
+        }
+        
+    elif platform == 'bitbucket':
+        user_data = {
+            'platform_id': user_info.get('uuid'),
+            'username': user_info.get('username'),
+            'name': user_info.get('display_name'),
+            'avatar_url': user_info.get('links', {}).get('avatar', {}).get('href'),
+            'profile_url': user_info.get('links', {}).get('html', {}).get('href'),
+            'access_token': access_token,
+            'refresh_token': refresh_token
+        }
+    
+    return user_data
+
+def session_linked_accounts():
+    """Identités liées à l'utilisateur courant (la principale en premier)"""
+    accounts = session.get('linked_accounts')
+    if accounts:
+        return accounts
+    # Sessions ouvertes avant la liaison multi-plateformes
+    return [{
+        'platform': session.get('user_platform'),
+        'platform_id': None,
+        'user_id': session.get('user_id'),
+        'email': session.get('user_email'),
+        'username': session.get('user_name')
+    }]
+
+def link_account(accounts, account):
+    """Ajoute ou remplace une identité dans la liste des comptes liés"""
+    accounts = [a for a in accounts if (a['platform'], a['platform_id']) != (account['platform'], account['platform_id'])]
+    accounts.append(account)
+    return accounts
+
+def account_access_token(app, account):
+    """Token d'une identité, lu uniquement dans le coffre (jamais dans les
+    lignes Baserow ni dans le cache utilisateur)"""
+    return get_access_token(account.get('user_id'))
+
+def find_session_repository(app, repository):
+    """Dépôt 'plateforme:id' d'une identité de la session et son token
+    (depuis le cache des listes de dépôts), ou (None, None)"""
+    platform, _, repo_id = (repository or '').partition(':')
+    for account in session_linked_accounts():
+        if account['platform'] != platform:
+            continue
+        entry = repo_cache.get_entry(repositories_cache_key(platform, account['user_id']))
+        for repo in (entry or {}).get('repositories', []):
+            if str(repo['id']) == repo_id:
+                return repo, account_access_token(app, account)
+    return None, None
+
+def load_account_repositories(app, account):
+    """Dépôts d'une identité liée, via le cache de dépôts"""
+    access_token = account_access_token(app, account)
+    if not access_token:
+        logger.warning(f"Token non trouvé pour {account['platform']}:{account.get('user_id')}")
+        return []
+    return get_cached_user_repositories(account['platform'], access_token, account['user_id'])
+
+def merge_repositories(repository_lists):
+    """Fusionne plusieurs listes de dépôts, sans doublons, plus récents en premier"""
+    merged = {}
+    for repositories in repository_lists:
+        for repo in repositories:
+            merged.setdefault((repo['platform'], repo['id']), repo)
+    return sorted(merged.values(), key=lambda r: r.get('updated_at') or '', reverse=True)
+
+def get_aggregated_repositories(app, accounts):
+    """Interroge toutes les plateformes liées en parallèle
+    
+    Retourne (dépôts, plateformes en attente). Une plateforme qui ne répond
+    pas dans le délai est servie depuis son cache s'il existe, et son
+    chargement continue en arrière-plan pour la visite suivante.
+    """
+    executor = get_executor('aggregate', AGGREGATE_CONFIG['workers'])
+    futures = {submit_with_context(executor, load_account_repositories, app, account): account for account in accounts}
+    done, not_done = wait(futures, timeout=AGGREGATE_CONFIG['timeout'])
+    
+    repository_lists = []
+    pending = []
+    for future, account in futures.items():
+        if future in done:
+            try:
+                repository_lists.append(future.result())
+            except Exception as e:
+                logger.error(f"Erreur dépôts {account['platform']}: {str(e)}")
+                pending.append(account['platform'])
+        else:
+            entry = repo_cache.get_entry(repositories_cache_key(account['platform'], account['user_id']))
+            if entry:
+                repository_lists.append(entry['repositories'])
+            pending.append(account['platform'])
+    
+    return merge_repositories(repository_lists), sorted(set(pending))
+
+def load_session_repositories(app, view=None):
+    """Liste de dépôts de la session courante, avec son index
+    
+    Retourne un dictionnaire : index, comptes liés, mode agrégé et
+    plateformes encore en attente.
+    """
+    accounts = session_linked_accounts()
+    aggregated = view == 'all' and len(accounts) > 1
+    pending_platforms = []
+    digest = None
+    platform = session.get('user_platform')
+    
+    # Token de l'identité principale, lu dans le coffre
+    access_token = account_access_token(app, {'platform': platform, 'user_id': session.get('user_id')})
+    if not access_token:
+        logger.warning(f"Token absent du coffre pour {session.get('user_email')}, reconnexion requise")
+        raise ReauthRequired(platform)
+    
+    if aggregated:
+        # Toutes les plateformes liées, interrogées en parallèle
+        repositories, pending_platforms = get_aggregated_repositories(app, accounts)
+    else:
+        # Profiter d'un préchargement en cours ou terminé
+        cache_key = repositories_cache_key(platform, session.get('user_id'))
+        wait_for_prefetch(cache_key)
+        record_access(cache_key, repo_cache.has_entry(cache_key))
+        
+        # Récupérer les dépôts
+        repositories = get_cached_user_repositories(platform, access_token, session.get('user_id'))
+        entry = repo_cache.get_entry(cache_key)
+        if entry and entry['repositories'] is repositories:
+            digest = entry.get('digest')
+    
+    return {
+        'index': get_index(repositories, digest),
+        'accounts': accounts,
+        'aggregated': aggregated,
+        'pending_platforms': pending_platforms
+    }
+
+def refresh_access_token(platform, refresh_token):
+    """Échange un Refresh_Token contre de nouveaux tokens (appelé par le coffre)"""
+    config = OAUTH_CONFIG[platform]
+    data = {
+        'grant_type': 'refresh_token',
+        'refresh_token': refresh_token,
+        'redirect_uri': f"{CALLBACK_CONFIG['redirect_base']}/auth/{platform}/callback"
+    }
+    
+    # Format spécifique pour Bitbucket (identifiants en Basic Auth)
+    if platform == 'bitbucket':
+        response = http_post(config['token_url'], data=data, headers={'Accept': 'application/json'},
+                             auth=(config['client_id'], config['client_secret']))
+    else:
+        data['client_id'] = config['client_id']
+        data['client_secret'] = config['client_secret']
+        response = http_post(config['token_url'], data=data, headers={'Accept': 'application/json'})
+    
+    if response.status_code in (400, 401):
+        raise TokenRefreshError(f"{platform}: {response.status_code} {response.text[:200]}")
+    response.raise_for_status()
+    token_json = response.json()
+    if not token_json.get('access_token'):
+        # GitHub répond 200 avec un champ error
+        raise TokenRefreshError(f"{platform}: {token_json.get('error', 'pas de token')}")
+    return token_json
+
+def prefetch_user_repositories(platform, access_token, user_id):
+    """Précharge en arrière-plan la liste des dépôts juste après la connexion"""
+    return schedule_prefetch(
+        repositories_cache_key(platform, user_id),
+        lambda: get_cached_user_repositories(platform, access_token, user_id)
+    )
+
 def init_routes(app):
     """Initialise toutes les routes de l'application"""
     
@@ -331,34 +900,66 @@ def init_routes(app):
     OAUTH_CONFIG['bitbucket']['client_id'] = app.config['BITBUCKET_CLIENT_ID']
     OAUTH_CONFIG['bitbucket']['client_secret'] = app.config['BITBUCKET_CLIENT_SECRET']
     
-    # Routes publiques
+    # Configuration de la pagination des dépôts
+    REPOS_CONFIG['max_repos'] = app.config.get('REPOS_MAX_COUNT', REPOS_CONFIG['max_repos'])
+    REPOS_CONFIG['page_workers'] = app.config.get('REPOS_PAGE_WORKERS', REPOS_CONFIG['page_workers'])
+    REPOS_CONFIG['page_size'] = app.config.get('REPOS_PAGE_SIZE', REPOS_CONFIG['page_size'])
+    
+    # Vue agrégée multi-plateformes
+    AGGREGATE_CONFIG['timeout'] = app.config.get('AGGREGATE_TIMEOUT', AGGREGATE_CONFIG['timeout'])
+    
+    # Échéance et parallélisme du callback OAuth
+    CALLBACK_CONFIG['deadline'] = app.config.get('OAUTH_CALLBACK_DEADLINE', CALLBACK_CONFIG['deadline'])
+    CALLBACK_CONFIG['workers'] = app.config.get('OAUTH_CALLBACK_WORKERS', CALLBACK_CONFIG['workers'])
+    CALLBACK_CONFIG['redirect_base'] = app.config['OAUTH_REDIRECT_BASE']
+    REQUEST_CONFIG['deadline'] = app.config.get('REQUEST_DEADLINE', REQUEST_CONFIG['deadline'])
+    
+    # Renouvellement proactif des tokens du coffre
+    set_token_refresher(refresh_access_token)
+    
+    @app.before_request
+    def start_request_deadline():
+        """Échéance de la requête : les appels sortants ne la dépassent jamais"""
+        g.deadline_token = set_deadline(REQUEST_CONFIG['deadline'])
+    
+    @app.teardown_request
+    def clear_request_deadline(exc):
+        token = g.pop('deadline_token', None)
+        if token is not None:
+            reset_deadline(token)
+    
+    # Routes publiques (pages sans contexte, servies depuis la mémoire)
     @app.route('/')
     def index():
-        return render_template('index.html')
+        return serve_static_page(app, 'index.html')
     
     @app.route('/terme')
     def terme():
-        return render_template('terme.html')
+        return serve_static_page(app, 'terme.html')
     
     @app.route('/privacy')
     def privacy():
-        return render_template('privacy.html')
+        return serve_static_page(app, 'privacy.html')
     
     @app.route('/notice')
     def notice():
-        return render_template('notice.html')
+        return serve_static_page(app, 'notice.html')
     
     @app.route('/about')
     def about():
-        return render_template('about.html')
+        return serve_static_page(app, 'about.html')
     
     @app.route('/pricing')
     def pricing():
-        return render_template('pricing.html')
+        return serve_static_page(app, 'pricing.html')
     
     @app.route('/connect')
     def connect():
-        return render_template('conect.html')
+        # Une variante par message d'erreur affiché (codes inconnus : message générique)
+        error = request.args.get('error')
+        if error and error not in CONNECT_ERRORS:
+            error = 'other'
+        return serve_static_page(app, 'conect.html', variant=error)
     
     # Routes OAuth
     @app.route('/auth/<platform>')
@@ -371,6 +972,12 @@ def init_routes(app):
         state = generate_state_token()
         session['oauth_state'] = state
         
+        # Liaison d'une identité supplémentaire pour un utilisateur déjà connecté
+        if request.args.get('link') and session.get('logged_in'):
+            session['oauth_link'] = True
+        else:
+            session.pop('oauth_link', None)
+        
         # Construire l'URL de redirection
         config = OAUTH_CONFIG[platform]
         redirect_uri = f"{app.config['OAUTH_REDIRECT_BASE']}/auth/{platform}/callback"
@@ -416,6 +1023,12 @@ def init_routes(app):
             logger.error(f"État OAuth invalide pour {platform}")
             return redirect(url_for('connect', error='invalid_state'))
         
+        # Le temps total du callback est borné par le chemin critique ;
+        # l'échéance s'applique aussi à tous les appels sortants
+        deadline = time.monotonic() + CALLBACK_CONFIG['deadline']
+        set_deadline(CALLBACK_CONFIG['deadline'])
+        steps = StepTimer('oauth_callback_step_seconds', platform=platform)
+        
         try:
             config = OAUTH_CONFIG[platform]
             redirect_uri = f"{app.config['OAUTH_REDIRECT_BASE']}/auth/{platform}/callback"
@@ -433,19 +1046,22 @@ def init_routes(app):
             
             # Format spécifique pour Bitbucket
             if platform == 'bitbucket':
-                token_response = requests.post(
+                token_response = http_post(
                     config['token_url'],
                     data=token_data,
                     headers=headers,
-                    auth=(config['client_id'], config['client_secret'])
+                    auth=(config['client_id'], config['client_secret']),
+                    timeout=remaining_time(deadline)
                 )
             else:
-                token_response = requests.post(
+                token_response = http_post(
                     config['token_url'],
                     data=token_data,
-                    headers=headers
+                    headers=headers,
+                    timeout=remaining_time(deadline)
                 )
             
+            steps.mark('token_exchange')
             if token_response.status_code != 200:
                 logger.error(f"Erreur récupération token {platform}: {token_response.text}")
                 return redirect(url_for('connect', error='token_error'))
@@ -458,18 +1074,21 @@ def init_routes(app):
                 logger.error(f"Pas de token d'accès pour {platform}")
                 return redirect(url_for('connect', error='no_token'))
             
-            # Récupérer les informations de l'utilisateur
-            if platform == 'bitbucket':
-                user_response = requests.get(
-                    config['userinfo_url'],
-                    headers={'Authorization': f'Bearer {access_token}'}
-                )
-            else:
-                user_response = requests.get(
-                    config['userinfo_url'],
-                    headers={'Authorization': f'token {access_token}'}
-                )
+            # Profil et emails partent en parallèle dès que le token est connu ;
+            # la recherche Baserow démarre dès que l'ID plateforme est connu
+            executor = get_executor('oauth-callback', CALLBACK_CONFIG['workers'])
+            user_future = submit_with_context(executor, fetch_user_info, platform, access_token, remaining_time(deadline))
+            email_future = None
+            if 'emails_url' in config:
+                email_future = submit_with_context(executor, get_user_email, platform, access_token)
             
+            try:
+                user_response = user_future.result(timeout=remaining_time(deadline))
+            except FutureTimeoutError:
+                logger.error(f"Délai dépassé récupération user {platform}")
+                return redirect(url_for('connect', error='timeout'))
+            
+            steps.mark('user_info')
             if user_response.status_code != 200:
                 logger.error(f"Erreur récupération user {platform}: {user_response.text}")
                 return redirect(url_for('connect', error='userinfo_error'))
@@ -477,51 +1096,55 @@ def init_routes(app):
             user_info = user_response.json()
             
             # Extraire les données selon la plateforme
-            user_data = {}
+            user_data = extract_user_data(platform, user_info, access_token, refresh_token)
             
-            if platform == 'github':
-                user_data = {
-                    'platform_id': str(user_info.get('id')),
-                    'username': user_info.get('login'),
-                    'name': user_info.get('name'),
-                    'avatar_url': user_info.get('avatar_url'),
-                    'profile_url': user_info.get('html_url'),
-                    'access_token': access_token,
-                    'refresh_token': refresh_token
-                }
-                # Récupérer l'email
-                user_data['email'] = get_user_email(platform, access_token)
-                
-            elif platform == 'gitlab':
-                user_data = {
-                    'platform_id': str(user_info.get('id')),
-                    'username': user_info.get('username'),
-                    'name': user_info.get('name'),
-                    'email': user_info.get('email'),
-                    'avatar_url': user_info.get('avatar_url'),
-                    'profile_url': user_info.get('web_url'),
-                    'access_token': access_token,
-                    'refresh_token': refresh_token
-                }
-                
-            elif platform == 'bitbucket':
-                user_data = {
-                    'platform_id': user_info.get('uuid'),
-                    'username': user_info.get('username'),
-                    'name': user_info.get('display_name'),
-                    'avatar_url': user_info.get('links', {}).get('avatar', {}).get('href'),
-                    'profile_url': user_info.get('links', {}).get('html', {}).get('href'),
-                    'access_token': access_token,
-                    'refresh_token': refresh_token
-                }
-                # Récupérer l'email
-                user_data['email'] = get_user_email(platform, access_token)
+            lookup_future = None
+            if not get_row_id(platform, user_data.get('platform_id')):
+                lookup_future = submit_with_context(executor, find_user_by_platform_id, app, platform, user_data.get('platform_id'))
+            
+            # Récupérer l'email (à défaut, l'email public du profil est conservé)
+            if email_future:
+                try:
+                    email = email_future.result(timeout=remaining_time(deadline))
+                    if email:
+                        user_data['email'] = email
+                except FutureTimeoutError:
+                    logger.warning(f"Délai dépassé récupération email {platform}")
+                steps.mark('email')
+            
+            # Le résultat de la recherche alimente le cache utilisé par l'upsert
+            if lookup_future:
+                try:
+                    lookup_future.result(timeout=remaining_time(deadline))
+                except FutureTimeoutError:
+                    logger.warning(f"Délai dépassé recherche Baserow {platform}")
+                steps.mark('baserow_lookup')
             
             # Créer ou mettre à jour l'utilisateur dans Baserow
             baserow_user = create_or_update_user(app, user_data, platform)
+            steps.mark('baserow_upsert')
             
             if baserow_user:
+                # Tokens chiffrés dans le coffre, lus ensuite sans passer par Baserow
+                store_tokens(baserow_user.get('id'), platform, access_token, refresh_token, token_json.get('expires_in'))
+                
+                account = {
+                    'platform': platform,
+                    'platform_id': user_data.get('platform_id'),
+                    'user_id': baserow_user.get('id'),
+                    'email': user_data.get('email'),
+                    'username': user_data.get('username')
+                }
+                
+                # Liaison : l'identité principale de la session est conservée
+                if session.pop('oauth_link', False) and session.get('logged_in'):
+                    session['linked_accounts'] = link_account(session_linked_accounts(), account)
+                    logger.info(f"Identité {platform} liée pour {session.get('user_email')}")
+                    prefetch_user_repositories(platform, access_token, baserow_user.get('id'))
+                    return redirect(url_for('all_project', view='all'))
+                
                 # Stocker les informations dans la session
+                session['linked_accounts'] = [account]
                 session['user_id'] = baserow_user.get('id')
                 session['user_email'] = user_data.get('email')
                 session['user_name'] = user_data.get('name', user_data.get('username'))
@@ -532,6 +1155,9 @@ def init_routes(app):
                 
                 logger.info(f"Connexion réussie: {user_data.get('email')} via {platform}")
                 
+                # Préchauffer la liste des dépôts pour le premier /all_project
+                prefetch_user_repositories(platform, access_token, baserow_user.get('id'))
+                
                 # Rediriger vers le dashboard
                 return redirect(app.config['DASHBOARD_URL'])
             else:
@@ -580,58 +1206,26 @@ def init_routes(app):
                 'username': session.get('username')
             }
             
-            # Récupérer l'utilisateur de Baserow pour obtenir le token
-            baserow_url = app.config['BASEROW_API_URL']
-            headers = {'Authorization': f"Token {app.config['BASEROW_TOKEN']}"}
+            listing = load_session_repositories(app, request.args.get('view'))
+            index = listing['index']
             
-            # Chercher l'utilisateur dans Baserow
-            params = {
-                'filters__Email__equal': user_info['email'],
-                'filters__Plateforme__equal': user_info['platform']
-            }
-            
-            response = requests.get(baserow_url, headers=headers, params=params)
-            access_token = None
-            
-            if response.status_code == 200:
-                data = response.json()
-                results = data.get('results', [])
-                if results:
-                    access_token = results[0].get('Access_Token')
-            
-            if access_token:
-                # Récupérer les dépôts
-                repositories = get_user_repositories(
-                    user_info['platform'], 
-                    access_token,
-                    user_info.get('username')
-                )
-            else:
-                repositories = []
-                logger.warning(f"Token non trouvé pour {user_info['email']}")
-            
-            # Statistiques
-            stats = {
-                'total': len(repositories),
-                'public': len([r for r in repositories if not r.get('private', True)]),
-                'private': len([r for r in repositories if r.get('private', False)]),
-                'languages': {}
-            }
-            
-            # Compter les languages
-            for repo in repositories:
-                lang = repo.get('language', 'N/A')
-                if lang not in stats['languages']:
-                    stats['languages'][lang] = 0
-                stats['languages'][lang] += 1
+            # Premier écran seulement, la suite est chargée par /api/repositories
+            repositories, next_cursor, _ = index.query(limit=REPOS_CONFIG['page_size'])
             
             return render_template(
                 'all_project.html', 
                 user=user_info,
                 repositories=repositories,
-                stats=stats
+                repo_cards=render_repo_cards(app, repositories),
+                stats=index.stats,
+                next_cursor=next_cursor,
+                linked_platforms=[a['platform'] for a in listing['accounts']],
+                aggregated=listing['aggregated'],
+                pending_platforms=listing['pending_platforms']
             )
             
+        except ReauthRequired as e:
+            return redirect(reauth_url(e.platform))
         except Exception as e:
             logger.error(f"Erreur dans all_project: {str(e)}")
             return render_template('all_project.html', user=user_info, repositories=[], stats={'total': 0, 'public': 0, 'private': 0, 'languages': {}})
@@ -672,6 +1266,67 @@ def init_routes(app):
         }
         return render_template('api_docs.html', user=user_info)
     
+    @app.route('/api/repositories')
+    @login_required
+    def api_repositories():
+        """Dépôts filtrés, triés et paginés par curseur (JSON ou fragments HTML)"""
+        try:
+            listing = load_session_repositories(app, request.args.get('view'))
+        except ReauthRequired as e:
+            return jsonify({'error': 'reauth_required', 'login_url': reauth_url(e.platform)}), 401
+        index = listing['index']
+        
+        fork = request.args.get('fork')
+        try:
+            limit = min(int(request.args.get('limit', REPOS_CONFIG['page_size'])), 100)
+        except ValueError:
+            return jsonify({'error': 'invalid_limit'}), 400
+        
+        try:
+            repositories, next_cursor, total = index.query(
+                platform=request.args.get('platform'),
+                language=request.args.get('language'),
+                visibility=request.args.get('visibility'),
+                fork=None if fork is None else fork.lower() == 'true',
+                sort=request.args.get('sort', 'updated'),
+                ascending=request.args.get('order') == 'asc',
+                cursor=request.args.get('cursor'),
+                limit=max(1, limit)
+            )
+        except InvalidCursor as e:
+            return jsonify({'error': 'invalid_cursor', 'message': str(e)}), 400
+        
+        payload = {
+            'total': total,
+            'next_cursor': next_cursor,
+            'stats': index.stats,
+            'pending_platforms': listing['pending_platforms']
+        }
+        if request.args.get('format') == 'html':
+            payload['html'] = str(render_repo_cards(app, repositories))
+        else:
+            payload['repositories'] = repositories
+        return jsonify(payload)
+    
+    @app.route('/api/repositories/snapshot', methods=['POST'])
+    @login_required
+    def api_repository_snapshot():
+        """Lance (si besoin) l'instantané d'un dépôt pour le contexte Forge"""
+        data = request.get_json(silent=True) or {}
+        repo, access_token = find_session_repository(app, data.get('repository'))
+        if not repo:
+            return jsonify({'error': 'unknown_repository'}), 404
+        if not access_token:
+            return jsonify({'error': 'missing_token'}), 409
+        schedule_snapshot(repo, access_token)
+        return jsonify(snapshot_status(repo)), 202
+    
+    @app.route('/api/prefetch-stats')
+    @login_required
+    def prefetch_status():
+        """Compteurs du préchargement des dépôts (hits / misses)"""
+        return jsonify(prefetch_stats())
+    
     # Route pour vérifier l'état de la session (API)
     @app.route('/api/session-status')
     def session_status():
@@ -0,0 +1,137 @@
+import gzip
+import hashlib
+import threading
+import logging
+
+from flask import Response, request, session, render_template
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Configuration des pages statiques (surchargée par init_static_pages)
+STATIC_PAGES_CONFIG = {
+    'enabled': True,
+    'max_age': 3600,
+    # Mode développement : une page est re-rendue quand son template change
+    'auto_reload': False,
+    'gzip_level': 9,
+    'brotli_quality': 11
+}
+
+# Encodages proposés, par ordre de préférence
+ENCODINGS = ('br', 'gzip')
+
+# Pages sans contexte rendues d'avance au démarrage (voir fast_start)
+PAGES = ('index.html', 'terme.html', 'privacy.html', 'notice.html', 'about.html', 'pricing.html', 'conect.html')
+
+# Import différé de brotli (module natif), au premier rendu seulement
+_brotli = {'loaded': False, 'module': None}
+
+def brotli_module():
+    if not _brotli['loaded']:
+        try:
+            import brotli
+            _brotli['module'] = brotli
+        except ImportError:
+            logger.info("Module brotli absent : pages statiques servies en gzip uniquement")
+        _brotli['loaded'] = True
+    return _brotli['module']
+
+class RenderedPage:
+    """Page rendue une fois, avec ses variantes compressées et leurs ETag"""
+
+    def __init__(self, template, body):
+        self.template = template
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.bodies = {'identity': body}
+        self.bodies['gzip'] = gzip.compress(body, STATIC_PAGES_CONFIG['gzip_level'], mtime=0)
+        brotli = brotli_module()
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(body, quality=STATIC_PAGES_CONFIG['brotli_quality'])
+        # ETag forts : une valeur par représentation (octets différents)
+        self.etags = {
+            encoding: f'{digest}-{encoding}' if encoding != 'identity' else digest
+            for encoding in self.bodies
+        }
+
+    def is_stale(self):
+        return STATIC_PAGES_CONFIG['auto_reload'] and not self.template.is_up_to_date
+
+_pages = {}
+_pages_lock = threading.Lock()
+
+def render_page(app, name):
+    template = app.jinja_env.get_or_select_template(name)
+    body = render_template(template).encode('utf-8')
+    return RenderedPage(template, body)
+
+def get_page(app, name, variant=None):
+    """Page rendue du worker, rendue au premier accès (une fois par déploiement)"""
+    key = (name, variant)
+    page = _pages.get(key)
+    if page is None or page.is_stale():
+        with _pages_lock:
+            page = _pages.get(key)
+            if page is None or page.is_stale():
+                page = render_page(app, name)
+                _pages[key] = page
+                sizes = ', '.join(f"{encoding}={len(body)}" for encoding, body in page.bodies.items())
+                logger.info(f"Page statique {name} rendue ({sizes} octets)")
+    return page
+
+def negotiate_encoding(page):
+    """Meilleur encodage accepté par le client parmi les variantes disponibles"""
+    accepted = request.accept_encodings
+    for encoding in ENCODINGS:
+        if encoding in page.bodies and accepted[encoding] > 0:
+            return encoding
+    return 'identity'
+
+def serve_static_page(app, name, variant=None):
+    """Sert une page sans contexte depuis la mémoire : compression négociée,
+    ETag fort et 304 si le client a déjà cette représentation"""
+    if not STATIC_PAGES_CONFIG['enabled']:
+        return render_template(name)
+
+    page = get_page(app, name, variant)
+    encoding = negotiate_encoding(page)
+    etag = page.etags[encoding]
+
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(page.bodies[encoding], mimetype='text/html')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding, Cookie'
+    # Avec une session, Flask renvoie son cookie (session permanente) : la
+    # réponse ne doit jamais être stockée par un cache partagé
+    if session or app.config['SESSION_COOKIE_NAME'] in request.cookies:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.cache_control.max_age = STATIC_PAGES_CONFIG['max_age']
+    return response
+
+def warm_static_pages(app):
+    """Rend d'avance les pages sans contexte (hors variantes d'erreur)"""
+    if not STATIC_PAGES_CONFIG['enabled']:
+        return 0
+    with app.test_request_context('/'):
+        for name in PAGES:
+            get_page(app, name)
+    return len(PAGES)
+
+def clear_static_pages():
+    with _pages_lock:
+        _pages.clear()
+
+def init_static_pages(app):
+    """Configure le service des pages statiques"""
+    STATIC_PAGES_CONFIG['enabled'] = app.config.get('STATIC_PAGES_ENABLED', STATIC_PAGES_CONFIG['enabled'])
+    STATIC_PAGES_CONFIG['max_age'] = app.config.get('STATIC_PAGES_MAX_AGE', STATIC_PAGES_CONFIG['max_age'])
+    STATIC_PAGES_CONFIG['auto_reload'] = app.config.get('STATIC_PAGES_AUTO_RELOAD', STATIC_PAGES_CONFIG['auto_reload'])
+    if STATIC_PAGES_CONFIG['auto_reload']:
+        app.jinja_env.auto_reload = True
+    clear_static_pages()
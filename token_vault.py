@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import sqlite3
+import threading
+import logging
+
+from metrics import inc
+from rate_limits import background_lane
+from ttl_cache import TTLCache
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Coffre des tokens OAuth (surchargé par init_token_vault)
+TOKEN_VAULT_CONFIG = {
+    'path': 'data/token_vault.db',
+    'keys': [],
+    'memory_ttl': 300,
+    'max_entries': 5000,
+    # Renouvellement quand il reste moins de refresh_margin secondes
+    'refresh_margin': 600,
+    'refresh_interval': 60,
+    'claim_seconds': 60,
+    # Copie des tokens en clair dans Baserow : retour arrière uniquement,
+    # le coffre fait foi
+    'baserow_copy': False
+}
+
+class TokenRefreshError(Exception):
+    """Échec du renouvellement d'un token par son Refresh_Token"""
+
+# Fonction de renouvellement (platform, refresh_token) -> réponse JSON du
+# fournisseur, fournie par init_routes (qui porte la configuration OAuth)
+_refresher = {'fn': None}
+
+# Tokens déchiffrés par worker : user_id -> entrée du coffre
+_memory = TTLCache(TOKEN_VAULT_CONFIG['max_entries'], TOKEN_VAULT_CONFIG['memory_ttl'])
+
+_vault = {'instance': None}
+_refresh_thread = {'pid': None, 'thread': None}
+_refresh_lock = threading.Lock()
+
+class TokenVault:
+    """Tokens chiffrés (Fernet) dans un fichier SQLite partagé entre workers,
+    une ligne par user_id (id de ligne Baserow de l'identité)"""
+
+    def __init__(self, path, keys):
+        self.path = path
+        # Import différé : cryptography n'est chargé qu'à l'ouverture du coffre
+        from cryptography.fernet import Fernet, MultiFernet
+        self.fernet = MultiFernet([Fernet(key) for key in keys])
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS tokens ("
+            "user_id TEXT PRIMARY KEY, platform TEXT NOT NULL, payload BLOB NOT NULL, "
+            "expires_at REAL, refreshable INTEGER NOT NULL, claimed_until REAL NOT NULL DEFAULT 0, "
+            "updated_at REAL NOT NULL)"
+        )
+        self._connect().execute(
+            "CREATE INDEX IF NOT EXISTS tokens_expiry ON tokens (refreshable, expires_at)"
+        )
+
+    def _connect(self):
+        # Une connexion par thread et par processus (pas de partage après fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def put(self, user_id, entry):
+        payload = self.fernet.encrypt(json.dumps(entry).encode('utf-8'))
+        self._connect().execute(
+            "INSERT OR REPLACE INTO tokens "
+            "(user_id, platform, payload, expires_at, refreshable, claimed_until, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, 0, ?)",
+            (str(user_id), entry['platform'], payload, entry.get('expires_at'),
+             1 if entry.get('refresh_token') else 0, time.time())
+        )
+
+    def get(self, user_id):
+        row = self._connect().execute(
+            "SELECT payload FROM tokens WHERE user_id = ?", (str(user_id),)
+        ).fetchone()
+        if not row:
+            return None
+        from cryptography.fernet import InvalidToken
+        try:
+            return json.loads(self.fernet.decrypt(row[0]))
+        except InvalidToken:
+            logger.error(f"Token illisible pour {user_id} (clé du coffre changée ?)")
+            return None
+
+    def delete(self, user_id):
+        self._connect().execute("DELETE FROM tokens WHERE user_id = ?", (str(user_id),))
+
+    def expiring(self, before):
+        rows = self._connect().execute(
+            "SELECT user_id FROM tokens WHERE refreshable = 1 AND expires_at IS NOT NULL "
+            "AND expires_at < ? AND claimed_until < ?",
+            (before, time.time())
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def claim(self, user_id, seconds):
+        """Réserve le renouvellement d'un token à ce worker (les Refresh_Token
+        GitLab et Bitbucket sont à usage unique : un seul worker les échange)"""
+        now = time.time()
+        cursor = self._connect().execute(
+            "UPDATE tokens SET claimed_until = ? WHERE user_id = ? AND claimed_until < ?",
+            (now + seconds, str(user_id), now)
+        )
+        return cursor.rowcount == 1
+
+    def release(self, user_id):
+        self._connect().execute("UPDATE tokens SET claimed_until = 0 WHERE user_id = ?", (str(user_id),))
+
+def derive_key(secret):
+    """Clé Fernet dérivée de SECRET_KEY (à défaut de TOKEN_VAULT_KEY)"""
+    digest = hashlib.sha256(b'mindus-token-vault:' + secret.encode('utf-8')).digest()
+    return base64.urlsafe_b64encode(digest)
+
+def get_vault():
+    if _vault['instance'] is None:
+        _vault['instance'] = TokenVault(TOKEN_VAULT_CONFIG['path'], TOKEN_VAULT_CONFIG['keys'])
+    return _vault['instance']
+
+def memory_ttl(entry):
+    """Durée en mémoire : jamais au-delà du moment où le token doit être renouvelé"""
+    if entry.get('expires_at') is None:
+        return TOKEN_VAULT_CONFIG['memory_ttl']
+    until_refresh = entry['expires_at'] - TOKEN_VAULT_CONFIG['refresh_margin'] - time.time()
+    return max(0, min(TOKEN_VAULT_CONFIG['memory_ttl'], until_refresh))
+
+def store_tokens(user_id, platform, access_token, refresh_token=None, expires_in=None):
+    """Enregistre les tokens d'une identité (callback OAuth, renouvellement)"""
+    if not user_id or not access_token:
+        return None
+    entry = {
+        'platform': platform,
+        'access_token': access_token,
+        'refresh_token': refresh_token or None,
+        'expires_at': time.time() + float(expires_in) if expires_in else None
+    }
+    try:
+        get_vault().put(user_id, entry)
+    except (sqlite3.Error, ValueError) as e:
+        logger.error(f"Erreur écriture coffre des tokens: {str(e)}")
+    _memory.set(user_id, entry, memory_ttl(entry))
+    if entry['refresh_token'] and entry['expires_at']:
+        ensure_refresher()
+    return entry
+
+def get_access_token(user_id):
+    """Token d'accès d'une identité : mémoire du worker, puis coffre sur disque
+
+    Un token déjà expiré est renouvelé sur place ; les autres le sont en
+    arrière-plan avant leur échéance (jamais de 401 suivi d'un refresh).
+    """
+    if not user_id:
+        return None
+    entry = _memory.get(user_id)
+    if entry is None:
+        try:
+            entry = get_vault().get(user_id)
+        except sqlite3.Error as e:
+            logger.error(f"Erreur lecture coffre des tokens: {str(e)}")
+            return None
+        if entry is None:
+            return None
+        _memory.set(user_id, entry, memory_ttl(entry))
+        if entry.get('refresh_token') and entry.get('expires_at'):
+            ensure_refresher()
+    if entry.get('expires_at') and entry['expires_at'] <= time.time() and entry.get('refresh_token'):
+        entry = refresh_entry(user_id) or entry
+    return entry['access_token']
+
+def forget_tokens(user_id):
+    _memory.delete(user_id)
+    try:
+        get_vault().delete(user_id)
+    except sqlite3.Error as e:
+        logger.error(f"Erreur suppression coffre des tokens: {str(e)}")
+
+def refresh_entry(user_id):
+    """Renouvelle le token d'une identité ; retourne la nouvelle entrée, ou None
+    si un autre worker s'en charge ou si le fournisseur refuse"""
+    vault = get_vault()
+    if _refresher['fn'] is None or not vault.claim(user_id, TOKEN_VAULT_CONFIG['claim_seconds']):
+        return None
+    entry = vault.get(user_id)
+    try:
+        if not entry or not entry.get('refresh_token'):
+            return None
+        token_json = _refresher['fn'](entry['platform'], entry['refresh_token'])
+        entry = store_tokens(
+            user_id,
+            entry['platform'],
+            token_json['access_token'],
+            # Sans nouveau Refresh_Token (GitHub), l'ancien reste valable
+            token_json.get('refresh_token') or entry['refresh_token'],
+            token_json.get('expires_in')
+        )
+        inc('token_refresh_total', platform=entry['platform'], result='ok')
+        return entry
+    except TokenRefreshError as e:
+        # Refresh_Token révoqué ou expiré : inutile de réessayer avant la prochaine connexion
+        inc('token_refresh_total', platform=entry['platform'], result='rejected')
+        logger.warning(f"Token {user_id} non renouvelable, retiré du coffre: {str(e)}")
+        forget_tokens(user_id)
+        return None
+    except Exception as e:
+        inc('token_refresh_total', platform=entry['platform'] if entry else 'unknown', result='error')
+        logger.warning(f"Renouvellement du token {user_id} impossible: {str(e)}")
+        return None
+    finally:
+        vault.release(user_id)
+
+def refresh_loop():
+    while True:
+        time.sleep(TOKEN_VAULT_CONFIG['refresh_interval'])
+        try:
+            expiring = get_vault().expiring(time.time() + TOKEN_VAULT_CONFIG['refresh_margin'])
+            with background_lane():
+                for user_id in expiring:
+                    refresh_entry(user_id)
+        except Exception as e:
+            logger.error(f"Erreur renouvellement des tokens: {str(e)}")
+
+def ensure_refresher():
+    """Démarre le renouvellement périodique dans le processus courant (après fork)"""
+    if _refresh_thread['pid'] == os.getpid() and _refresh_thread['thread'] and _refresh_thread['thread'].is_alive():
+        return
+    with _refresh_lock:
+        if _refresh_thread['pid'] == os.getpid() and _refresh_thread['thread'] and _refresh_thread['thread'].is_alive():
+            return
+        thread = threading.Thread(target=refresh_loop, name='token-refresh', daemon=True)
+        _refresh_thread['thread'] = thread
+        _refresh_thread['pid'] = os.getpid()
+        thread.start()
+
+def set_token_refresher(fn):
+    _refresher['fn'] = fn
+
+def baserow_token_copy():
+    return TOKEN_VAULT_CONFIG['baserow_copy']
+
+def init_token_vault(app):
+    """Configure le coffre des tokens (chemin, clés de chiffrement, renouvellement)"""
+    global _memory
+    TOKEN_VAULT_CONFIG['path'] = app.config.get('TOKEN_VAULT_PATH', TOKEN_VAULT_CONFIG['path'])
+    TOKEN_VAULT_CONFIG['refresh_margin'] = app.config.get('TOKEN_REFRESH_MARGIN', TOKEN_VAULT_CONFIG['refresh_margin'])
+    TOKEN_VAULT_CONFIG['refresh_interval'] = app.config.get('TOKEN_REFRESH_INTERVAL', TOKEN_VAULT_CONFIG['refresh_interval'])
+    TOKEN_VAULT_CONFIG['baserow_copy'] = app.config.get('TOKEN_VAULT_BASEROW_COPY', TOKEN_VAULT_CONFIG['baserow_copy'])
+
+    # Plusieurs clés séparées par des virgules : la première chiffre, toutes déchiffrent
+    keys = [key.strip() for key in (app.config.get('TOKEN_VAULT_KEY') or '').split(',') if key.strip()]
+    if not keys:
+        logger.warning("TOKEN_VAULT_KEY absent : clé du coffre dérivée de SECRET_KEY")
+        keys = [derive_key(app.config['SECRET_KEY'])]
+    TOKEN_VAULT_CONFIG['keys'] = keys
+
+    _memory = TTLCache(TOKEN_VAULT_CONFIG['max_entries'], TOKEN_VAULT_CONFIG['memory_ttl'])
+    _vault['instance'] = None
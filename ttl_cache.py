@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+class TTLCache:
+    """Cache mémoire LRU avec expiration par entrée, sûr entre threads"""
+
+    def __init__(self, max_entries=1000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class SqliteCacheBackend:
+    """Cache clé/valeur JSON partagé entre workers via un fichier SQLite local"""
+
+    def __init__(self, path, table='cache'):
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_expires ON {self.table} (expires_at)")
+        conn.commit()
+
+    def _connect(self):
+        # Une connexion par thread et par processus (pas de partage après fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, default=None):
+        try:
+            row = self._connect().execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Erreur lecture cache SQLite: {str(e)}")
+            return default
+        if not row or row[1] <= time.time():
+            return default
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        try:
+            self._connect().execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl)
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Erreur écriture cache SQLite: {str(e)}")
+
+    def delete(self, key):
+        try:
+            self._connect().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.error(f"Erreur suppression cache SQLite: {str(e)}")
+
+    def purge_expired(self, max_rows=None):
+        """Supprime les entrées expirées puis, au-delà de max_rows, les plus
+        anciennes (échéance la plus proche d'abord)"""
+        try:
+            conn = self._connect()
+            conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),))
+            if max_rows is not None:
+                conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (max_rows,)
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Erreur purge cache SQLite: {str(e)}")
@@ -0,0 +1,181 @@
+import hashlib
+import tempfile
+import logging
+
+from werkzeug.http import parse_options_header
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Limites des envois de fichiers (surchargées par init_uploads)
+UPLOAD_CONFIG = {
+    'chunk_size': 64 * 1024,
+    'spool_threshold': 1024 * 1024,
+    'max_file_size': 20 * 1024 * 1024,
+    'max_request_size': 50 * 1024 * 1024,
+    'max_files': 10,
+    'max_field_size': 512 * 1024,
+    'max_inline_bytes': 200 * 1024
+}
+
+class UploadError(Exception):
+    """Envoi refusé ; code et statut HTTP renvoyés au client"""
+
+    def __init__(self, code, status=400):
+        super().__init__(code)
+        self.code = code
+        self.status = status
+
+class UploadTooLarge(UploadError):
+    def __init__(self, code):
+        super().__init__(code, 413)
+
+class SpooledUpload:
+    """Fichier reçu en flux : haché à la volée, en mémoire puis sur disque"""
+
+    def __init__(self, filename, content_type):
+        self.filename = filename
+        self.content_type = content_type or 'application/octet-stream'
+        self.size = 0
+        self.sha256 = None
+        self._hasher = hashlib.sha256()
+        self.file = tempfile.SpooledTemporaryFile(max_size=UPLOAD_CONFIG['spool_threshold'])
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > UPLOAD_CONFIG['max_file_size']:
+            raise UploadTooLarge('file_too_large')
+        self._hasher.update(data)
+        self.file.write(data)
+
+    def finish(self):
+        self.sha256 = self._hasher.hexdigest()
+        self.file.seek(0)
+
+    def close(self):
+        self.file.close()
+
+def parse_multipart_stream(stream, content_type, content_length=None):
+    """Lit un corps multipart/form-data par blocs, sans le charger en mémoire
+
+    Les champs texte sont décodés (taille bornée), les fichiers sont
+    hachés et recopiés dans des fichiers temporaires au fil de la lecture.
+    Les limites par fichier et par requête sont vérifiées à chaque bloc.
+    Retourne (champs, fichiers).
+    """
+    mimetype, options = parse_options_header(content_type or '')
+    boundary = options.get('boundary')
+    if mimetype != 'multipart/form-data' or not boundary:
+        raise UploadError('invalid_content_type', 415)
+    if content_length and content_length > UPLOAD_CONFIG['max_request_size']:
+        raise UploadTooLarge('request_too_large')
+
+    # Import différé : seules les requêtes avec fichiers joints en ont besoin
+    from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+
+    decoder = MultipartDecoder(boundary.encode('latin-1'), max_form_memory_size=UPLOAD_CONFIG['max_field_size'])
+    fields = {}
+    uploads = []
+    current = None
+    field_name = None
+    field_parts = []
+    received = 0
+
+    try:
+        while True:
+            chunk = stream.read(UPLOAD_CONFIG['chunk_size'])
+            received += len(chunk)
+            if received > UPLOAD_CONFIG['max_request_size']:
+                raise UploadTooLarge('request_too_large')
+            decoder.receive_data(chunk or None)
+
+            event = decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)):
+                if isinstance(event, Field):
+                    current = None
+                    field_name = event.name
+                    field_parts = []
+                elif isinstance(event, File):
+                    if len(uploads) >= UPLOAD_CONFIG['max_files']:
+                        raise UploadError('too_many_files')
+                    field_name = None
+                    current = SpooledUpload(event.filename, event.headers.get('Content-Type'))
+                    uploads.append(current)
+                elif isinstance(event, Data):
+                    if current is not None:
+                        current.write(event.data)
+                        if not event.more_data:
+                            current.finish()
+                    elif field_name is not None:
+                        field_parts.append(event.data)
+                        if sum(len(part) for part in field_parts) > UPLOAD_CONFIG['max_field_size']:
+                            raise UploadTooLarge('field_too_large')
+                        if not event.more_data:
+                            fields[field_name] = b''.join(field_parts).decode('utf-8', errors='replace')
+                event = decoder.next_event()
+
+            if isinstance(event, Epilogue):
+                break
+            if not chunk:
+                raise UploadError('truncated_body')
+    except RequestEntityTooLarge:
+        close_uploads(uploads)
+        raise UploadTooLarge('field_too_large')
+    except ValueError:
+        close_uploads(uploads)
+        raise UploadError('invalid_multipart')
+    except Exception:
+        close_uploads(uploads)
+        raise
+
+    # Fichiers vides : aucun bloc de données n'a été reçu
+    for upload in uploads:
+        if upload.sha256 is None:
+            upload.finish()
+    return fields, uploads
+
+def close_uploads(uploads):
+    for upload in uploads:
+        upload.close()
+
+def store_uploads(blob_store, chat_store, user_id, conversation_id, uploads):
+    """Range les fichiers dans le stockage par contenu, dédupliqués par conversation"""
+    attachments = []
+    for upload in uploads:
+        new_blob = blob_store.put_file(upload.sha256, upload.file)
+        first_in_conversation = chat_store.add_attachment(
+            user_id, conversation_id, upload.sha256, upload.filename, upload.content_type, upload.size
+        )
+        attachments.append({
+            'name': upload.filename,
+            'sha256': upload.sha256,
+            'size': upload.size,
+            'content_type': upload.content_type,
+            'deduplicated': not first_in_conversation
+        })
+        if not new_blob:
+            logger.debug(f"Contenu {upload.sha256[:12]} déjà présent, écriture évitée")
+    return attachments
+
+def attachment_context(blob_store, prompt, attachments):
+    """Ajoute au prompt le contenu texte des pièces jointes (taille bornée)"""
+    sections = []
+    for attachment in attachments:
+        data = blob_store.read(attachment['sha256'], UPLOAD_CONFIG['max_inline_bytes'])
+        if b'\x00' in data:
+            sections.append(f"[Fichier binaire joint : {attachment['name']}, {attachment['size']} octets]")
+            continue
+        text = data.decode('utf-8', errors='replace')
+        truncated = '\n[...tronqué]' if attachment['size'] > len(data) else ''
+        sections.append(f"Fichier : {attachment['name']}\n```\n{text}{truncated}\n```")
+    if not sections:
+        return prompt
+    return '\n\n'.join(sections) + '\n\n' + prompt
+
+def init_uploads(app):
+    """Configure les limites des envois de fichiers"""
+    UPLOAD_CONFIG['spool_threshold'] = app.config.get('UPLOAD_SPOOL_THRESHOLD', UPLOAD_CONFIG['spool_threshold'])
+    UPLOAD_CONFIG['max_file_size'] = app.config.get('UPLOAD_MAX_FILE_SIZE', UPLOAD_CONFIG['max_file_size'])
+    UPLOAD_CONFIG['max_request_size'] = app.config.get('UPLOAD_MAX_REQUEST_SIZE', UPLOAD_CONFIG['max_request_size'])
+    UPLOAD_CONFIG['max_files'] = app.config.get('UPLOAD_MAX_FILES', UPLOAD_CONFIG['max_files'])
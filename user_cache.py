@@ -0,0 +1,128 @@
+import logging
+
+from ttl_cache import TTLCache, SqliteCacheBackend
+
+# Configuration du logging
+logger = logging.getLogger(__name__)
+
+# Configuration du cache des lignes utilisateur Baserow (surchargée par init_user_cache)
+USER_CACHE_CONFIG = {
+    'ttl': 300,
+    'max_entries': 5000,
+    'row_id_ttl': 7 * 24 * 3600,
+    'sqlite_path': None
+}
+
+# Champs jamais mis en cache : les tokens ne se lisent que dans le coffre (token_vault)
+SECRET_FIELDS = ('Access_Token', 'Refresh_Token')
+
+_local_cache = TTLCache(USER_CACHE_CONFIG['max_entries'], USER_CACHE_CONFIG['ttl'])
+_shared_cache = None
+
+# Correspondance (plateforme, ID plateforme) -> id de ligne Baserow, stable dans le temps
+_row_ids = TTLCache(USER_CACHE_CONFIG['max_entries'], USER_CACHE_CONFIG['row_id_ttl'])
+_shared_row_ids = None
+
+def init_user_cache(app):
+    """Configure le cache utilisateur (mémoire + SQLite partagé optionnel)"""
+    global _local_cache, _shared_cache, _row_ids, _shared_row_ids
+    USER_CACHE_CONFIG['ttl'] = app.config.get('USER_CACHE_TTL', USER_CACHE_CONFIG['ttl'])
+    USER_CACHE_CONFIG['max_entries'] = app.config.get('USER_CACHE_MAX_ENTRIES', USER_CACHE_CONFIG['max_entries'])
+    USER_CACHE_CONFIG['row_id_ttl'] = app.config.get('USER_ROW_ID_TTL', USER_CACHE_CONFIG['row_id_ttl'])
+    USER_CACHE_CONFIG['sqlite_path'] = app.config.get('USER_CACHE_SQLITE_PATH')
+
+    _local_cache = TTLCache(USER_CACHE_CONFIG['max_entries'], USER_CACHE_CONFIG['ttl'])
+    _row_ids = TTLCache(USER_CACHE_CONFIG['max_entries'], USER_CACHE_CONFIG['row_id_ttl'])
+    _shared_cache = None
+    _shared_row_ids = None
+    if USER_CACHE_CONFIG['sqlite_path']:
+        try:
+            _shared_cache = SqliteCacheBackend(USER_CACHE_CONFIG['sqlite_path'], table='user_rows')
+            _shared_row_ids = SqliteCacheBackend(USER_CACHE_CONFIG['sqlite_path'], table='user_row_ids')
+            _shared_cache.purge_expired()
+            _shared_row_ids.purge_expired()
+        except Exception as e:
+            logger.error(f"Cache utilisateur SQLite indisponible: {str(e)}")
+            _shared_cache = None
+            _shared_row_ids = None
+
+def platform_key(platform, platform_id):
+    return f"platform:{platform}:{platform_id}"
+
+def email_key(email, platform):
+    return f"email:{(email or '').lower()}:{platform}"
+
+def get_cached_row(key):
+    """Lecture du cache : mémoire locale, puis cache partagé entre workers"""
+    row = _local_cache.get(key)
+    if row is not None:
+        return row
+    if _shared_cache is not None:
+        row = _shared_cache.get(key)
+        if row is not None:
+            _local_cache.set(key, row)
+            return row
+    return None
+
+def get_cached_user_by_platform(platform, platform_id):
+    return get_cached_row(platform_key(platform, platform_id))
+
+def get_cached_user_by_email(email, platform):
+    if not email:
+        return None
+    return get_cached_row(email_key(email, platform))
+
+def row_keys(row, platform=None):
+    """Clés sous lesquelles une ligne utilisateur est indexée"""
+    platform = platform or row.get('Plateforme')
+    keys = []
+    if row.get('ID_Plateforme'):
+        keys.append(platform_key(platform, row['ID_Plateforme']))
+    if row.get('Email'):
+        keys.append(email_key(row['Email'], platform))
+    return keys
+
+def cache_user_row(row, platform=None):
+    """Écrit une ligne utilisateur dans le cache sous toutes ses clés (sans tokens)"""
+    if not row:
+        return
+    row = {field: value for field, value in row.items() if field not in SECRET_FIELDS}
+    for key in row_keys(row, platform):
+        _local_cache.set(key, row)
+        if _shared_cache is not None:
+            _shared_cache.set(key, row, USER_CACHE_CONFIG['ttl'])
+    if row.get('id') and row.get('ID_Plateforme'):
+        remember_row_id(platform or row.get('Plateforme'), row['ID_Plateforme'], row['id'])
+
+def invalidate_user_row(row, platform=None):
+    """Retire une ligne utilisateur du cache"""
+    if not row:
+        return
+    for key in row_keys(row, platform):
+        _local_cache.delete(key)
+        if _shared_cache is not None:
+            _shared_cache.delete(key)
+
+def remember_row_id(platform, platform_id, row_id):
+    """Mémorise l'id de ligne Baserow d'une identité (plateforme, ID plateforme)"""
+    key = platform_key(platform, platform_id)
+    _row_ids.set(key, row_id)
+    if _shared_row_ids is not None:
+        _shared_row_ids.set(key, row_id, USER_CACHE_CONFIG['row_id_ttl'])
+
+def get_row_id(platform, platform_id):
+    """Retourne l'id de ligne Baserow connu pour une identité, ou None"""
+    key = platform_key(platform, platform_id)
+    row_id = _row_ids.get(key)
+    if row_id is None and _shared_row_ids is not None:
+        row_id = _shared_row_ids.get(key)
+        if row_id is not None:
+            _row_ids.set(key, row_id)
+    return row_id
+
+def forget_row_id(platform, platform_id):
+    """Oublie l'id de ligne d'une identité (ligne supprimée côté Baserow)"""
+    key = platform_key(platform, platform_id)
+    _row_ids.delete(key)
+    if _shared_row_ids is not None:
+        _shared_row_ids.delete(key)